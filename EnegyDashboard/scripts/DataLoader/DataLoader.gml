@@ -1,6 +1,16 @@
 /// @function load_energy_data()
-/// @description Loads the initial dataset from the included JSON file.
+/// @description Loads the initial dataset, preferring the packed binary export over JSON.
 function load_energy_data() {
+    var _binary = "gamemaker_export.bin";
+    if (file_exists(_binary)) {
+        var _bin_data = load_energy_binary(_binary);
+        if (!is_undefined(_bin_data)) {
+            populate_energy_history(_bin_data);
+            return;
+        }
+        show_debug_message("⚠️ Could not read " + _binary + ", falling back to JSON");
+    }
+
     var _filename = "gamemaker_export.json";
     
     if (file_exists(_filename)) {
@@ -10,25 +20,7 @@ function load_energy_data() {
         
         try {
             var _data = json_parse(_json_string);
-            global.energy_data = _data; // <--- CRITICAL FIX: Store the data globally!
-            global.current_run_index = 0;
-            
-            // Populate History from the loaded file
-            if (variable_struct_exists(_data, "runs")) {
-                var _runs = _data.runs;
-                for (var i = 0; i < array_length(_runs); i++) {
-                    var _r = _runs[i];
-                    if (_r.backend == "cpu") global.history_cpu = _r;
-                    if (_r.backend == "gpu") global.history_gpu = _r;
-                    array_push(global.all_runs, _r); // Add to history list
-                }
-                
-                // Set current run to one of them so the graph isn't empty
-                if (variable_global_exists("history_gpu")) global.current_run = global.history_gpu;
-                else if (variable_global_exists("history_cpu")) global.current_run = global.history_cpu;
-                
-                show_debug_message("✅ Data loaded. History populated.");
-            }
+            populate_energy_history(_data);
         } catch (_e) {
             show_debug_message("❌ Error parsing JSON: " + _e.message);
         }
@@ -37,6 +29,138 @@ function load_energy_data() {
     }
 }
 
+/// @function populate_energy_history(_data)
+/// @description Stores a loaded export ({runs: [...]}) globally and fills the history lists.
+function populate_energy_history(_data) {
+    global.energy_data = _data; // <--- CRITICAL FIX: Store the data globally!
+    global.current_run_index = 0;
+    
+    // Populate History from the loaded file
+    if (variable_struct_exists(_data, "runs")) {
+        var _runs = _data.runs;
+        for (var i = 0; i < array_length(_runs); i++) {
+            var _r = _runs[i];
+            if (_r.backend == "cpu") global.history_cpu = _r;
+            if (_r.backend == "gpu") global.history_gpu = _r;
+            array_push(global.all_runs, _r); // Add to history list
+        }
+        
+        // Set current run to one of them so the graph isn't empty
+        if (variable_global_exists("history_gpu")) global.current_run = global.history_gpu;
+        else if (variable_global_exists("history_cpu")) global.current_run = global.history_cpu;
+        
+        show_debug_message("✅ Data loaded. History populated.");
+    }
+}
+
+// Binary export layout: see src/interface/binary_export.py
+#macro ENERGY_EXPORT_MAGIC 0x58454145 // "EAEX" little-endian
+#macro ENERGY_PAGE_MAGIC 0x47504145   // "EAPG" little-endian
+#macro ENERGY_EXPORT_VERSION 1
+#macro ENERGY_RUN_RECORD_SIZE 32
+#macro ENERGY_PAGE_HEADER_SIZE 16
+
+/// @function load_energy_binary(_filename)
+/// @description Reads gamemaker_export.bin into the same {runs: [...]} shape as the JSON export.
+/// @param _filename Path of the single-file binary export
+function load_energy_binary(_filename) {
+    var _buf = buffer_load(_filename);
+    if (_buf == -1) return undefined;
+    var _data = energy_binary_read(_buf);
+    buffer_delete(_buf);
+    return _data;
+}
+
+/// @function load_energy_index(_dir)
+/// @description Reads index.bin of a paged export; runs have empty traces until their page is loaded.
+/// @param _dir Directory holding index.bin and page_NNNN.bin
+function load_energy_index(_dir) {
+    var _buf = buffer_load(_dir + "/index.bin");
+    if (_buf == -1) return undefined;
+    var _data = energy_binary_read(_buf);
+    buffer_delete(_buf);
+    if (!is_undefined(_data)) _data.directory = _dir;
+    return _data;
+}
+
+/// @function load_energy_page(_data, _page)
+/// @description Fills power_trace for the runs stored in one page of a paged export.
+/// @param _data Struct returned by load_energy_index
+/// @param _page Page number (run index div page_size)
+function load_energy_page(_data, _page) {
+    var _name = _data.directory + "/page_" + string_replace_all(string_format(_page, 4, 0), " ", "0") + ".bin";
+    var _buf = buffer_load(_name);
+    if (_buf == -1) return false;
+    if (buffer_read(_buf, buffer_u32) != ENERGY_PAGE_MAGIC) {
+        buffer_delete(_buf);
+        return false;
+    }
+    buffer_read(_buf, buffer_u16); // version
+    buffer_seek(_buf, buffer_seek_relative, 2);
+    var _first = buffer_read(_buf, buffer_u32);
+    var _count = buffer_read(_buf, buffer_u32);
+    for (var i = 0; i < _count; i++) {
+        var _trace = array_create(_data.trace_len);
+        for (var j = 0; j < _data.trace_len; j++) {
+            _trace[j] = buffer_read(_buf, buffer_f32);
+        }
+        _data.runs[_first + i].power_trace = _trace;
+    }
+    buffer_delete(_buf);
+    return true;
+}
+
+/// @function energy_binary_read(_buf)
+/// @description Decodes header, run table and (if present) inline traces from an export buffer.
+function energy_binary_read(_buf) {
+    buffer_seek(_buf, buffer_seek_start, 0);
+    if (buffer_read(_buf, buffer_u32) != ENERGY_EXPORT_MAGIC) return undefined;
+    if (buffer_read(_buf, buffer_u16) > ENERGY_EXPORT_VERSION) return undefined;
+    var _header_size = buffer_read(_buf, buffer_u16);
+    var _count = buffer_read(_buf, buffer_u32);
+    var _trace_len = buffer_read(_buf, buffer_u32);
+    var _strings = buffer_read(_buf, buffer_u32);
+    buffer_read(_buf, buffer_u32); // strings size
+    var _traces = buffer_read(_buf, buffer_u32);
+    var _page_size = buffer_read(_buf, buffer_u32);
+
+    var _runs = array_create(_count);
+    for (var i = 0; i < _count; i++) {
+        buffer_seek(_buf, buffer_seek_start, _header_size + i * ENERGY_RUN_RECORD_SIZE);
+        var _run_off = buffer_read(_buf, buffer_u32);
+        var _prompt_off = buffer_read(_buf, buffer_u32);
+        var _backend = buffer_read(_buf, buffer_u8);
+        buffer_seek(_buf, buffer_seek_relative, 3);
+        var _latency = buffer_read(_buf, buffer_f64);
+        var _energy = buffer_read(_buf, buffer_f64);
+        var _trace_index = buffer_read(_buf, buffer_u32);
+
+        var _trace = [];
+        if (_traces > 0) {
+            _trace = array_create(_trace_len);
+            buffer_seek(_buf, buffer_seek_start, _traces + _trace_index * _trace_len * 4);
+            for (var j = 0; j < _trace_len; j++) {
+                _trace[j] = buffer_read(_buf, buffer_f32);
+            }
+        }
+
+        buffer_seek(_buf, buffer_seek_start, _strings + _run_off);
+        var _run_id = buffer_read(_buf, buffer_string);
+        buffer_seek(_buf, buffer_seek_start, _strings + _prompt_off);
+        var _prompt_id = buffer_read(_buf, buffer_string);
+
+        _runs[i] = {
+            run_id: _run_id,
+            prompt_id: _prompt_id,
+            backend: (_backend == 0) ? "cpu" : ((_backend == 1) ? "gpu" : "unknown"),
+            latency_ms: _latency,
+            energy_joules: _energy,
+            power_trace: _trace
+        };
+    }
+    return { runs: _runs, trace_len: _trace_len, page_size: _page_size };
+}
+
 /// @function request_inference(_prompt, _backend)
 /// @description Requests the latest available trace for the given backend.
 /// @param _prompt Unused in this mode, but kept for signature compatibility
@@ -0,0 +1,351 @@
+"""Regression gate: compare a candidate result set against a baseline.
+
+Both sides are selected from the telemetry logs (or, for the baseline, from a
+snapshot CSV written earlier with ``--snapshot``).  Rows are aligned by prompt
+and configuration: by default suite + prompt id + run id when the two sides
+share run ids, so a selector such as ``run_id=gpu-*`` pairs every configuration
+with itself instead of averaging them together.  When the sides have no run id
+in common (one configuration against another) each side must hold a single run
+id and rows are aligned by prompt alone; ``--align`` sets the columns
+explicitly.  Repeats are averaged so each prompt contributes one pair.  For
+every suite, and for all suites pooled, the relative change
+``mean(candidate) / mean(baseline) - 1`` of each metric is reported with a
+paired bootstrap confidence interval.
+
+All metrics are lower-is-better.  A metric regresses when its relative change
+exceeds its threshold *and* the interval excludes zero, so noise alone cannot
+fail the gate.  With fewer than ``stats.MIN_SAMPLES`` pairs no verdict is drawn
+and the metric is reported as ``insufficient_data``.  The verdict is printed as
+a table and written as JSON; the exit status is 0 when nothing regressed, 1 on
+a regression and 2 when the two sides have no prompts in common.
+
+Examples::
+
+    python src/analysis/compare.py --baseline cpu-t1 --candidate cpu-t4
+    python src/analysis/compare.py --baseline run_id=gpu-* --candidate since=2025-12-08T01:00
+    python src/analysis/compare.py --baseline-file data/baselines/main.csv \\
+        --candidate run_id=gpu-l22 --threshold energy_joules=0.03
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analysis.engine import AnalysisEngine, to_pandas
+from analysis.stats import (
+    DEFAULT_CONFIDENCE,
+    MIN_SAMPLES,
+    add_derived_metrics,
+    resample_relative_deltas,
+)
+
+DEFAULT_THRESHOLD = 0.05
+DEFAULT_RESAMPLES = 5000
+GATED_METRICS = ("latency_ms", "energy_joules", "j_per_token", "edp")
+ALL_SUITES = "all"
+PROMPT_KEYS = ("prompt_template", "prompt_id")
+CONFIG_KEY = "run_id"
+
+EXIT_PASS = 0
+EXIT_REGRESSION = 1
+EXIT_NO_OVERLAP = 2
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split("Examples::")[1],
+    )
+    parser.add_argument(
+        "--baseline",
+        default="",
+        help="Baseline rows: a run_id, or comma-separated COLUMN=PATTERN terms "
+             "(globs allowed; 'since=' / 'until=' select a session by time)",
+    )
+    parser.add_argument("--candidate", required=True, help="Candidate rows, same syntax")
+    parser.add_argument(
+        "--data-dir", type=Path, default=Path("data"), help="Telemetry directory to read"
+    )
+    parser.add_argument(
+        "--baseline-file",
+        type=Path,
+        help="Read the baseline from a snapshot CSV instead of the telemetry logs",
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=Path,
+        help="Also write the candidate rows to this CSV for use as a future --baseline-file",
+    )
+    parser.add_argument(
+        "--align",
+        help="Columns that identify the same prompt on both sides (default: "
+             f"{','.join(PROMPT_KEYS)} plus {CONFIG_KEY} when both sides share run ids)",
+    )
+    parser.add_argument(
+        "--metric",
+        action="append",
+        dest="metrics",
+        choices=GATED_METRICS,
+        help="Metric to gate on (repeatable; default: all that have data)",
+    )
+    parser.add_argument(
+        "--threshold",
+        action="append",
+        default=[],
+        metavar="[METRIC=]FRACTION",
+        help=f"Allowed relative increase (default {DEFAULT_THRESHOLD}); "
+             "METRIC=FRACTION sets it for one metric",
+    )
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", type=Path, help="Write the JSON verdict here (default: stdout only)"
+    )
+    parser.add_argument("--quiet", action="store_true", help="Print only the JSON verdict")
+    return parser.parse_args(argv)
+
+
+def parse_thresholds(values: Sequence[str]) -> Dict[str, float]:
+    thresholds = {metric: DEFAULT_THRESHOLD for metric in GATED_METRICS}
+    for value in values:
+        metric, sep, fraction = value.rpartition("=")
+        if not sep:
+            thresholds = {m: float(fraction) for m in thresholds}
+        elif metric in thresholds:
+            thresholds[metric] = float(fraction)
+        else:
+            raise ValueError(f"Unknown metric in --threshold: '{metric}'")
+    return thresholds
+
+
+def select(rows: pd.DataFrame, selector: str) -> pd.DataFrame:
+    """Filter rows by a selector such as ``cpu-t1`` or ``run_id=gpu-*,since=2025-12-08``."""
+    mask = pd.Series(True, index=rows.index)
+    for term in filter(None, (t.strip() for t in selector.split(","))):
+        column, sep, pattern = term.partition("=")
+        if not sep:
+            column, pattern = "run_id", term
+        if column in ("since", "until"):
+            stamps = pd.to_datetime(rows["timestamp"])
+            bound = pd.Timestamp(pattern)
+            mask &= stamps >= bound if column == "since" else stamps < bound
+            continue
+        if column not in rows.columns:
+            raise ValueError(f"Unknown column in selector: '{column}'")
+        values = rows[column].astype(object).where(rows[column].notna(), "").astype(str)
+        mask &= values.map(lambda v, p=pattern: fnmatch.fnmatchcase(v, p))
+    return rows[mask]
+
+
+def load_rows(data_dir: Path) -> pd.DataFrame:
+    # The selection is explicit, so neither the mock-data cutoff nor the
+    # dry-run filter applies; select on manifest_id to pin an environment.
+    runs = AnalysisEngine(data_dir, cutoff=None, include_dry_run=True).runs()
+    return add_derived_metrics(to_pandas(runs))
+
+
+def load_snapshot(path: Path) -> pd.DataFrame:
+    return add_derived_metrics(pd.read_csv(path, parse_dates=["timestamp"]))
+
+
+def write_snapshot(rows: pd.DataFrame, path: Path) -> None:
+    keep = [
+        c for c in ("timestamp", "run_id", "backend", "prompt_template", "prompt_id",
+                    "latency_ms", "tokens_generated", "energy_joules", "notes", "manifest_id")
+        if c in rows.columns
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows[keep].to_csv(path, index=False)
+    print(f"💾 Snapshot of {len(rows)} candidate rows written to {path}", file=sys.stderr)
+
+
+def default_keys(baseline: pd.DataFrame, candidate: pd.DataFrame) -> Optional[List[str]]:
+    """Prompt keys plus the configuration key, or None when configurations can't be paired."""
+    base_configs = set(baseline[CONFIG_KEY].dropna().astype(str))
+    cand_configs = set(candidate[CONFIG_KEY].dropna().astype(str))
+    if base_configs & cand_configs:
+        return [*PROMPT_KEYS, CONFIG_KEY]
+    if len(base_configs) <= 1 and len(cand_configs) <= 1:
+        return list(PROMPT_KEYS)
+    return None
+
+
+def align(
+    baseline: pd.DataFrame, candidate: pd.DataFrame, keys: Sequence[str], metrics: Sequence[str]
+) -> pd.DataFrame:
+    """One row per shared prompt with ``<metric>_base`` / ``<metric>_cand`` columns."""
+    def per_prompt(rows: pd.DataFrame) -> pd.DataFrame:
+        values = rows[list(keys)].astype(str).join(
+            rows[list(metrics)].apply(pd.to_numeric, errors="coerce")
+        )
+        return values.groupby(list(keys)).mean()
+
+    return per_prompt(baseline).join(
+        per_prompt(candidate), how="inner", lsuffix="_base", rsuffix="_cand"
+    ).reset_index()
+
+
+def evaluate(
+    pairs: pd.DataFrame,
+    metrics: Sequence[str],
+    thresholds: Dict[str, float],
+    suite_column: Optional[str],
+    confidence: float = DEFAULT_CONFIDENCE,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Relative deltas with bootstrap bounds and a status per suite and metric."""
+    groups = [(ALL_SUITES, pairs)]
+    if suite_column is not None and pairs[suite_column].nunique() > 1:
+        groups += list(pairs.groupby(suite_column, sort=True))
+
+    cells: List[Dict[str, object]] = []
+    bases: List[np.ndarray] = []
+    cands: List[np.ndarray] = []
+    for suite, frame in groups:
+        for metric in metrics:
+            both = frame[[f"{metric}_base", f"{metric}_cand"]].dropna()
+            cells.append({"suite": suite, "metric": metric, "n_pairs": len(both)})
+            bases.append(both.iloc[:, 0].to_numpy(dtype=float))
+            cands.append(both.iloc[:, 1].to_numpy(dtype=float))
+
+    result = pd.DataFrame(cells)
+    base_mean = np.array([b.mean() if len(b) else np.nan for b in bases])
+    cand_mean = np.array([c.mean() if len(c) else np.nan for c in cands])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rel = cand_mean / base_mean - 1.0
+    boot = resample_relative_deltas(bases, cands, n_resamples, np.random.default_rng(seed))
+    alpha = (1 - confidence) / 2
+    with np.errstate(invalid="ignore"):
+        low, high = np.nanquantile(boot, [alpha, 1 - alpha], axis=0) if len(boot) else (rel, rel)
+
+    result["baseline_mean"] = base_mean
+    result["candidate_mean"] = cand_mean
+    result["rel_delta"] = rel
+    result["ci_low"] = low
+    result["ci_high"] = high
+    result["threshold"] = result["metric"].map(thresholds)
+    status = np.select(
+        [
+            (result["n_pairs"] < MIN_SAMPLES) | ~np.isfinite(rel),
+            (rel > result["threshold"]) & (low > 0),
+            (rel < -result["threshold"]) & (high < 0),
+        ],
+        ["insufficient_data", "regression", "improvement"],
+        default="ok",
+    )
+    result["status"] = status
+    return result
+
+
+def verdict(
+    results: pd.DataFrame, args: argparse.Namespace, counts: Dict[str, int], keys: Sequence[str]
+) -> Dict[str, object]:
+    regressions = results[results["status"] == "regression"]
+    records = json.loads(results.to_json(orient="records"))
+    return {
+        "verdict": "fail" if len(regressions) else "pass",
+        "baseline": {
+            "selector": args.baseline,
+            "source": str(args.baseline_file or args.data_dir),
+            "rows": counts["baseline"],
+        },
+        "candidate": {
+            "selector": args.candidate,
+            "source": str(args.data_dir),
+            "rows": counts["candidate"],
+        },
+        "aligned_on": list(keys),
+        "prompts_compared": counts["pairs"],
+        "confidence": args.confidence,
+        "regressions": [f"{r['suite']}/{r['metric']}" for _, r in regressions.iterrows()],
+        "results": records,
+    }
+
+
+def print_table(results: pd.DataFrame) -> None:
+    print(f"{'Suite':<22} | {'Metric':<14} | {'n':>3} | {'Baseline':>10} | "
+          f"{'Candidate':>10} | {'Delta':>7} | {'CI':<17} | Status", file=sys.stderr)
+    print("-" * 112, file=sys.stderr)
+    for _, r in results.iterrows():
+        ci = f"[{r['ci_low']:+.1%}, {r['ci_high']:+.1%}]" if np.isfinite(r["ci_low"]) else "-"
+        delta = f"{r['rel_delta']:+.1%}" if np.isfinite(r["rel_delta"]) else "-"
+        print(
+            f"{r['suite']:<22} | {r['metric']:<14} | {r['n_pairs']:>3} | "
+            f"{r['baseline_mean']:>10.2f} | {r['candidate_mean']:>10.2f} | {delta:>7} | "
+            f"{ci:<17} | {r['status']}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    thresholds = parse_thresholds(args.threshold)
+    rows = load_rows(args.data_dir)
+    candidate = select(rows, args.candidate)
+    if args.baseline_file is not None:
+        baseline = select(load_snapshot(args.baseline_file), args.baseline)
+    elif args.baseline:
+        baseline = select(rows, args.baseline)
+    else:
+        raise SystemExit("Give --baseline, --baseline-file, or both")
+    if args.snapshot is not None:
+        write_snapshot(candidate, args.snapshot)
+
+    if args.align:
+        keys = [k.strip() for k in args.align.split(",") if k.strip()]
+    else:
+        keys = default_keys(baseline, candidate)
+        if keys is None:
+            print(
+                f"⚠️ Baseline and candidate span several {CONFIG_KEY}s with none in common; "
+                "select one configuration per side or pass --align",
+                file=sys.stderr,
+            )
+            return EXIT_NO_OVERLAP
+
+    metrics = args.metrics or [
+        m for m in GATED_METRICS
+        if m in baseline.columns and m in candidate.columns
+        and pd.to_numeric(baseline[m], errors="coerce").notna().any()
+        and pd.to_numeric(candidate[m], errors="coerce").notna().any()
+    ]
+    pairs = align(baseline, candidate, keys, metrics)
+    counts = {"baseline": len(baseline), "candidate": len(candidate), "pairs": len(pairs)}
+    if pairs.empty or not metrics:
+        print(
+            f"⚠️ No comparable prompts: {len(baseline)} baseline rows, "
+            f"{len(candidate)} candidate rows, aligned on {', '.join(keys)}",
+            file=sys.stderr,
+        )
+        return EXIT_NO_OVERLAP
+
+    suite_column = "prompt_template" if "prompt_template" in keys else None
+    results = evaluate(
+        pairs, metrics, thresholds, suite_column, args.confidence, args.resamples, args.seed
+    )
+    report = verdict(results, args, counts, keys)
+    if not args.quiet:
+        print_table(results)
+        icon = "❌" if report["verdict"] == "fail" else "✅"
+        print(f"{icon} {report['verdict'].upper()}: {len(report['regressions'])} regression(s) "
+              f"over {len(pairs)} prompts", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+    print(text)
+    return EXIT_REGRESSION if report["regressions"] else EXIT_PASS
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Shared analysis engine for the latency/energy reports.
+
+``get_stats.py``, ``generate_report.py`` and ``check_plot_points.py`` all need
+the same thing: latency rows joined to the energy measured for them.  Joining
+by sorted row position silently shifts every energy value as soon as one
+prompt fails or one power capture is skipped, so the join here is keyed:
+
+* every latency row is put on the shared clock timeline (``clock.Timeline``);
+  it is written when the prompt finishes, ``latency_ms`` after it started;
+* power summaries carry ``prompt=<id>`` in ``notes`` and are written just
+  before the prompt runs, or just after it when sliced from a session-long
+  trace (``power_capture.py``);
+* a latency row takes the latest power row for the same backend and prompt id
+  that was recorded inside its run window (plus ``POWER_MATCH_SLACK_S``).
+
+Rows written by a session carry the id of its environment manifest
+(``manifest.py``); the engine joins the manifest facts on, drops dry-run
+sessions, and can be restricted to chosen manifests.  Older rows without a
+manifest fall back to the ``MOCK_CUTOFF`` date filter.
+
+Queries are lazy polars plans.  Materialized frames are cached in memory and
+as parquet under ``data/.analysis_cache``, keyed by a fingerprint (size and
+mtime) of every input file, so regenerating a report after a new run rebuilds
+the join once and otherwise just reads the cached frame.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import polars as pl
+
+from clock import Timeline, stream_timeline_ns
+from manifest import load_manifests
+
+ENGINE_VERSION = 2
+CACHE_DIR = Path("data/.analysis_cache")
+# Rows before this date were produced by the mock backends during development.
+MOCK_CUTOFF = dt.datetime(2025, 11, 1)
+# Power summaries are taken right before the prompt; allow for scheduling delay.
+POWER_MATCH_SLACK_S = 10.0
+
+LATENCY_SCHEMA = {
+    "run_id": pl.Utf8,
+    "backend": pl.Utf8,
+    "prompt_id": pl.Utf8,
+    "prompt_template": pl.Utf8,
+    "notes": pl.Utf8,
+    "manifest_id": pl.Utf8,
+    "model": pl.Utf8,
+    "latency_ms": pl.Float64,
+    "energy_joules": pl.Float64,
+}
+
+
+def fingerprint(paths: Sequence[Path]) -> str:
+    """Cheap content key for a set of input files: path, size and mtime."""
+    digest = hashlib.sha1(f"v{ENGINE_VERSION}".encode())
+    for path in paths:
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        else:
+            digest.update(f"{path}:missing".encode())
+    return digest.hexdigest()[:16]
+
+
+def to_pandas(frame: pl.DataFrame):
+    """Convert to pandas without requiring pyarrow (frames here are small)."""
+    import pandas as pd
+
+    return pd.DataFrame(frame.to_dict(as_series=False))
+
+
+class AnalysisEngine:
+    """Load, join and summarize benchmark telemetry with cached intermediates."""
+
+    def __init__(
+        self,
+        data_dir: Path = Path("data"),
+        cache_dir: Optional[Path] = None,
+        cutoff: Optional[dt.datetime] = MOCK_CUTOFF,
+        manifest_ids: Optional[Sequence[str]] = None,
+        include_dry_run: bool = False,
+    ) -> None:
+        self.data_dir = Path(data_dir)
+        self.cache_dir = self.data_dir / CACHE_DIR.name if cache_dir is None else Path(cache_dir)
+        self.cutoff = cutoff
+        self.manifest_ids = list(manifest_ids) if manifest_ids else None
+        self.include_dry_run = include_dry_run
+        self._memo: Dict[Tuple[str, str], pl.DataFrame] = {}
+
+    @property
+    def latency_path(self) -> Path:
+        return self.data_dir / "latency_results.csv"
+
+    @property
+    def power_path(self) -> Path:
+        return self.data_dir / "power_logs.csv"
+
+    @property
+    def anchors_path(self) -> Path:
+        return self.data_dir / "clock_anchors.jsonl"
+
+    @property
+    def manifest_dir(self) -> Path:
+        return self.data_dir / "manifests"
+
+    def manifest_files(self) -> List[Path]:
+        return sorted(self.manifest_dir.glob("*.json"))
+
+    def timeline(self) -> Timeline:
+        return Timeline.from_file(self.anchors_path)
+
+    def _cached(
+        self, name: str, inputs: Sequence[Path], build: Callable[[], pl.DataFrame]
+    ) -> pl.DataFrame:
+        key = fingerprint(inputs)
+        if (name, key) in self._memo:
+            return self._memo[(name, key)]
+        path = self.cache_dir / f"{name}-{key}.parquet"
+        if path.exists():
+            frame = pl.read_parquet(path)
+        else:
+            frame = build()
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for stale in self.cache_dir.glob(f"{name}-*.parquet"):
+                stale.unlink()
+            tmp = path.with_suffix(".tmp")
+            frame.write_parquet(tmp)
+            tmp.replace(path)
+        self._memo[(name, key)] = frame
+        return frame
+
+    def _stamped(self, path: Path, timeline: Timeline) -> pl.LazyFrame:
+        """Read a telemetry CSV and add its timeline stamp as ``t``."""
+        frame = pl.read_csv(path, infer_schema_length=0)
+        if frame.is_empty():
+            return frame.lazy().with_columns(pl.lit(None, dtype=pl.Datetime("ns")).alias("t"))
+        stamps = stream_timeline_ns(frame, path, timeline)
+        return frame.lazy().with_columns(
+            pl.Series("t", stamps).cast(pl.Int64, strict=False).cast(pl.Datetime("ns"))
+        )
+
+    def _casts(self, frame: pl.LazyFrame) -> pl.LazyFrame:
+        names = frame.collect_schema().names()
+        return frame.with_columns(
+            pl.col(c).cast(dtype, strict=False)
+            for c, dtype in LATENCY_SCHEMA.items()
+            if c in names
+        )
+
+    def latency_plan(self, timeline: Timeline) -> pl.LazyFrame:
+        plan = self._casts(self._stamped(self.latency_path, timeline))
+        if "manifest_id" not in plan.collect_schema().names():
+            plan = plan.with_columns(pl.lit(None, dtype=pl.Utf8).alias("manifest_id"))
+        return plan.with_columns(
+            (pl.col("t") - pl.duration(milliseconds=pl.col("latency_ms").fill_null(0.0)))
+            .alias("t_start"),
+            pl.col("manifest_id").replace("", None),
+        )
+
+    def manifests(self) -> pl.DataFrame:
+        """One row per environment manifest with the facts used for grouping."""
+        rows = []
+        for record in load_manifests(self.manifest_dir):
+            models = record.get("models") or []
+            builds = record.get("llama_binaries") or {}
+            rows.append({
+                "manifest_id": record.get("manifest_id"),
+                "hostname": record.get("hostname"),
+                "cpu_model": record.get("cpu_model"),
+                "cpu_governor": record.get("cpu_governor"),
+                "power_plan": record.get("power_plan"),
+                "gpu_name": record.get("gpu_name"),
+                "gpu_driver": record.get("gpu_driver"),
+                "llama_build": ",".join(sorted(filter(None, builds.values()))) or None,
+                "model_sha256": ",".join(sorted(filter(None, (m.get("sha256") for m in models))))
+                or None,
+                "git_commit": record.get("git_commit"),
+                "dry_run": bool(record.get("dry_run", False)),
+            })
+        schema = {
+            name: pl.Boolean if name == "dry_run" else pl.Utf8
+            for name in ("manifest_id", "hostname", "cpu_model", "cpu_governor", "power_plan",
+                         "gpu_name", "gpu_driver", "llama_build", "model_sha256", "git_commit",
+                         "dry_run")
+        }
+        return pl.DataFrame(rows, schema=schema)
+
+    def power_plan(self, timeline: Timeline) -> pl.LazyFrame:
+        if not self.power_path.exists():
+            return pl.LazyFrame(
+                schema={"backend": pl.Utf8, "prompt_id": pl.Utf8, "t_power": pl.Datetime("ns"),
+                        "power_energy_joules": pl.Float64}
+            )
+        plan = self._casts(self._stamped(self.power_path, timeline))
+        return (
+            plan.with_columns(
+                pl.col("notes").str.extract(r"prompt=([^\s;]+)", 1).alias("prompt_id")
+            )
+            .filter(pl.col("prompt_id").is_not_null())
+            .select(
+                "backend",
+                "prompt_id",
+                pl.col("t").alias("t_power"),
+                pl.col("energy_joules").alias("power_energy_joules"),
+                *[c for c in ("max_temp_c", "throttled_fraction")
+                  if c in plan.collect_schema().names()],
+            )
+        )
+
+    def runs(self) -> pl.DataFrame:
+        """One row per latency measurement with its matched energy and EDP.
+
+        The cached frame holds every row; the cutoff, dry-run and manifest
+        filters are applied on top so engines with different filters share it.
+        """
+        inputs = [self.latency_path, self.power_path, self.anchors_path, *self.manifest_files()]
+        frame = self._cached("runs", inputs, self._build_runs)
+        legacy = pl.col("manifest_id").is_null()
+        keep = pl.lit(True)
+        if self.cutoff is not None:
+            keep = keep & (~legacy | (pl.col("t") > self.cutoff))
+        if not self.include_dry_run:
+            keep = keep & ~pl.col("dry_run").fill_null(False)
+        if self.manifest_ids is not None:
+            keep = keep & pl.col("manifest_id").is_in(self.manifest_ids)
+        return frame.filter(keep)
+
+    def _build_runs(self) -> pl.DataFrame:
+        if not self.latency_path.exists():
+            raise FileNotFoundError(f"{self.latency_path} not found")
+        timeline = self.timeline()
+        latency = self.latency_plan(timeline).sort("t")
+        power = self.power_plan(timeline).sort("t_power")
+        joined = latency.join_asof(
+            power,
+            left_on="t",
+            right_on="t_power",
+            by=["backend", "prompt_id"],
+            strategy="backward",
+            check_sortedness=False,
+        )
+        slack = pl.duration(seconds=POWER_MATCH_SLACK_S)
+        in_window = pl.col("t_power") >= pl.col("t_start") - slack
+        energy = pl.coalesce(
+            pl.col("energy_joules"),
+            pl.when(in_window).then(pl.col("power_energy_joules")),
+        )
+        return (
+            joined.with_columns(energy.alias("energy_joules"))
+            .with_columns(
+                (pl.col("energy_joules") * pl.col("latency_ms") / 1000.0).alias("edp"),
+                pl.col("t").alias("timestamp"),
+            )
+            .drop("power_energy_joules")
+            .join(self.manifests().lazy(), on="manifest_id", how="left")
+            .collect()
+        )
+
+    def summary(self, by: Sequence[str] = ("backend", "prompt_template")) -> pl.DataFrame:
+        """Mean latency, energy and EDP per group."""
+        return (
+            self.runs()
+            .lazy()
+            .group_by(list(by), maintain_order=True)
+            .agg(
+                pl.col("latency_ms").mean().alias("avg_latency_ms"),
+                pl.col("energy_joules").mean().alias("avg_energy_joules"),
+                pl.col("edp").mean().alias("avg_edp"),
+                pl.len().alias("n"),
+            )
+            .sort(list(by))
+            .collect()
+        )
+
+    def summary_by_run(self) -> pl.DataFrame:
+        return self.summary(by=("run_id",)).sort("avg_edp", nulls_last=True)
+
+    def unmatched(self) -> pl.DataFrame:
+        """Latency rows for which no energy measurement could be found."""
+        return self.runs().filter(pl.col("energy_joules").is_null())
+
+
+__all__ = ["AnalysisEngine", "MOCK_CUTOFF", "fingerprint", "to_pandas"]
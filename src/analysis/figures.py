@@ -0,0 +1,248 @@
+"""Cached, parallel figure rendering for the report.
+
+Each figure is a :class:`PlotTask`: a renderer (a module-level function, so it
+can be sent to a worker process), the slice of data it plots, its plotting
+parameters and the tasks it must wait for.  A task's key hashes all of these
+plus the keys of its dependencies; when the key matches the one recorded in
+``.figure_cache.json`` and the image still exists, the figure is skipped.  The
+remaining tasks run in a process pool in dependency order.  matplotlib and
+seaborn are only imported inside the renderers, so a report build where
+nothing changed never imports them.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Bump when a renderer changes so cached images are redrawn.
+RENDERER_VERSION = 1
+CACHE_FILE = ".figure_cache.json"
+
+Columns = Dict[str, List[Any]]
+
+
+@dataclass
+class PlotTask:
+    """One figure: what to draw, from which data, and after which other figures."""
+
+    name: str
+    output: Path
+    render: Callable[[Columns, Dict[str, Any], Path], None]
+    data: Columns
+    params: Dict[str, Any] = field(default_factory=dict)
+    after: Sequence[str] = ()
+
+    def key(self, dependency_keys: Sequence[str] = ()) -> str:
+        payload = json.dumps(
+            {
+                "version": RENDERER_VERSION,
+                "render": f"{self.render.__module__}.{self.render.__qualname__}",
+                "data": self.data,
+                "params": self.params,
+                "after": list(dependency_keys),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _order(tasks: Sequence[PlotTask]) -> List[PlotTask]:
+    """Topological order; raises on unknown or cyclic dependencies."""
+    by_name = {task.name: task for task in tasks}
+    ordered: List[PlotTask] = []
+    state: Dict[str, str] = {}
+
+    def visit(task: PlotTask) -> None:
+        if state.get(task.name) == "done":
+            return
+        if state.get(task.name) == "active":
+            raise ValueError(f"Figure dependency cycle at '{task.name}'")
+        state[task.name] = "active"
+        for dep in task.after:
+            if dep not in by_name:
+                raise ValueError(f"Figure '{task.name}' depends on unknown task '{dep}'")
+            visit(by_name[dep])
+        state[task.name] = "done"
+        ordered.append(task)
+
+    for task in tasks:
+        visit(task)
+    return ordered
+
+
+def _run(task: PlotTask) -> str:
+    task.output.parent.mkdir(parents=True, exist_ok=True)
+    task.render(task.data, task.params, task.output)
+    return task.name
+
+
+def render_figures(
+    tasks: Sequence[PlotTask],
+    figures_dir: Path,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, str]:
+    """Render changed figures; returns ``{name: "rendered" | "cached" | "failed"}``."""
+    cache_path = figures_dir / CACHE_FILE
+    try:
+        cache: Dict[str, str] = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        cache = {}
+
+    ordered = _order(tasks)
+    keys: Dict[str, str] = {}
+    pending: List[PlotTask] = []
+    status: Dict[str, str] = {}
+    for task in ordered:
+        keys[task.name] = task.key([keys[dep] for dep in task.after])
+        stale = force or cache.get(str(task.output)) != keys[task.name] or not task.output.exists()
+        if stale or any(dep in {t.name for t in pending} for dep in task.after):
+            pending.append(task)
+        else:
+            status[task.name] = "cached"
+
+    def finished(task: PlotTask, ok: bool) -> None:
+        status[task.name] = "rendered" if ok else "failed"
+        if ok:
+            cache[str(task.output)] = keys[task.name]
+            print(f"Saved figure: {task.output}")
+
+    if len(pending) == 1 or workers == 1:
+        for task in pending:
+            if any(status.get(dep) == "failed" for dep in task.after):
+                print(f"⚠️ Skipping {task.name}: a dependency failed")
+                status[task.name] = "failed"
+                continue
+            try:
+                _run(task)
+                finished(task, True)
+            except Exception as exc:
+                print(f"⚠️ Failed to render {task.name}: {exc}")
+                finished(task, False)
+    elif pending:
+        workers = workers or min(len(pending), os.cpu_count() or 1)
+        waiting = list(pending)
+        running: Dict[Future, PlotTask] = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while waiting or running:
+                for task in list(waiting):
+                    if all(status.get(dep) in ("rendered", "cached") for dep in task.after):
+                        waiting.remove(task)
+                        running[pool.submit(_run, task)] = task
+                    elif any(status.get(dep) == "failed" for dep in task.after):
+                        waiting.remove(task)
+                        print(f"⚠️ Skipping {task.name}: a dependency failed")
+                        status[task.name] = "failed"
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        future.result()
+                        finished(task, True)
+                    except Exception as exc:
+                        print(f"⚠️ Failed to render {task.name}: {exc}")
+                        finished(task, False)
+
+    figures_dir.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+    cached = sum(1 for value in status.values() if value == "cached")
+    if cached:
+        print(f"Reused {cached} unchanged figure(s).")
+    return status
+
+
+def _pyplot():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def render_scatter(data: Columns, params: Dict[str, Any], output: Path) -> None:
+    """Scatter plot (Figure 1: energy vs latency per run)."""
+    import pandas as pd
+    import seaborn as sns
+
+    plt = _pyplot()
+    plt.figure(figsize=(10, 6))
+    sns.scatterplot(
+        data=pd.DataFrame(data),
+        x=params["x"],
+        y=params["y"],
+        hue=params.get("hue"),
+        style=params.get("style"),
+        s=100,
+    )
+    plt.title(params["title"])
+    plt.xlabel(params["xlabel"])
+    plt.ylabel(params["ylabel"])
+    plt.grid(True, linestyle="--", alpha=0.7)
+    plt.savefig(output)
+    plt.close("all")
+
+
+def render_metric_bars(data: Columns, params: Dict[str, Any], output: Path) -> None:
+    """Side-by-side bar charts, one panel per metric (Figure 2)."""
+    import pandas as pd
+    import seaborn as sns
+
+    plt = _pyplot()
+    melted = pd.DataFrame(data).melt(
+        id_vars=params["id_vars"],
+        value_vars=params["metrics"],
+        var_name="metric",
+        value_name="value",
+    )
+    g = sns.catplot(
+        data=melted,
+        kind="bar",
+        x=params["x"],
+        y="value",
+        hue=params["hue"],
+        col="metric",
+        sharey=False,
+        height=5,
+        aspect=1.2,
+    )
+    g.set_titles("{col_name}")
+    for axis, label in zip(g.axes[0], params["ylabels"]):
+        axis.set_ylabel(label)
+    plt.savefig(output)
+    plt.close("all")
+
+
+def render_line(data: Columns, params: Dict[str, Any], output: Path) -> None:
+    """Single line plot with markers (ablation sweeps)."""
+    import pandas as pd
+    import seaborn as sns
+
+    plt = _pyplot()
+    plt.figure(figsize=(8, 5))
+    sns.lineplot(
+        data=pd.DataFrame(data), x=params["x"], y=params["y"], marker="o", color=params.get("color")
+    )
+    plt.title(params["title"])
+    plt.xlabel(params["xlabel"])
+    plt.ylabel(params["ylabel"])
+    plt.grid(True, linestyle="--", alpha=0.5)
+    plt.savefig(output)
+    plt.close("all")
+
+
+__all__ = [
+    "PlotTask",
+    "render_figures",
+    "render_line",
+    "render_metric_bars",
+    "render_scatter",
+]
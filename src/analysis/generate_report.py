@@ -1,57 +1,168 @@
-import pandas as pd
+import argparse
 from pathlib import Path
 
-def generate_report():
-    # Load data
-    latency_df = pd.read_csv("data/latency_results.csv")
-    power_df = pd.read_csv("data/power_logs.csv")
+import pandas as pd
 
-    # Convert timestamps to datetime
-    latency_df["timestamp"] = pd.to_datetime(latency_df["timestamp"])
-    power_df["timestamp"] = pd.to_datetime(power_df["timestamp"])
+from analysis.engine import AnalysisEngine, to_pandas
+from analysis.figures import (
+    PlotTask,
+    render_figures,
+    render_line,
+    render_metric_bars,
+    render_scatter,
+)
+from analysis.stats import bootstrap_summary, paired_comparisons
+from clock import Timeline, raw_trace_files, read_power_trace, stream_timeline_ns
+from quantization import QUALITY_LOG, quantization_of
 
-    # Filter out mock data
-    cutoff_date = pd.Timestamp("2025-11-01")
-    latency_df = latency_df[latency_df["timestamp"] > cutoff_date]
-    power_df = power_df[power_df["timestamp"] > cutoff_date]
+# Rough roofline ridge point for consumer desktop CPUs (instructions per DRAM byte).
+# Below it, decode throughput is limited by memory bandwidth rather than cores.
+MEMORY_BOUND_INTENSITY = 4.0
 
-    print(f"Loaded {len(latency_df)} latency records and {len(power_df)} power records.")
 
-    # --- 1. Latency Analysis ---
-    # --- 2. Energy Analysis ---
-    # Since we have verified that latency_results.csv and power_logs.csv have 1-to-1 correspondence (27 rows each)
-    # and are sequential, we can merge them directly by index after sorting by timestamp.
-    
-    latency_df = latency_df.sort_values("timestamp").reset_index(drop=True)
-    power_df = power_df.sort_values("timestamp").reset_index(drop=True)
-    
-    if len(latency_df) != len(power_df):
-        print(f"⚠️ Warning: record count mismatch! Latency: {len(latency_df)}, Power: {len(power_df)}")
-        # Proceeding with inner join on index if possible or truncation, but for this task we assume perfect match
-        # as verified by the user.
+def summarize_perf_counters(merged: pd.DataFrame, perf_path: Path = Path("data/perf_counters.csv")):
+    """Join perf stat counters to per-prompt energy and derive efficiency metrics.
 
-    # Assign energy to latency dataframe
-    latency_df["energy_joules"] = power_df["energy_joules"]
-    
-    # Create the 'merged' dataframe for plotting (now it contains all 27 rows)
-    merged = latency_df.copy()
-    merged["avg_latency_ms"] = merged["latency_ms"] # Alias for compatibility with existing plot code if needed, but better to change plot code
-    merged["avg_energy_joules"] = merged["energy_joules"]
+    Returns one row per run_id with energy per instruction (nJ), IPC,
+    arithmetic intensity (instructions per DRAM byte) and DRAM bandwidth,
+    or ``None`` when no counters have been recorded.
+    """
+    if not perf_path.exists():
+        return None
+    perf_df = pd.read_csv(perf_path)
+    if perf_df.empty:
+        return None
+    perf_df["timestamp"] = pd.to_datetime(
+        stream_timeline_ns(perf_df, perf_path, Timeline.from_file()), unit="ns"
+    )
 
-    # --- 3. Calculate EDP ---
-    # EDP = Energy (J) * Latency (s)
-    merged["edp"] = merged["energy_joules"] * (merged["latency_ms"] / 1000.0)
-
-    # --- Grouping for Summary Table (Optional: keep summary table logic) ---
-    summary_table = merged.groupby(["backend", "prompt_template"]).agg(
-         avg_latency_ms=("latency_ms", "mean"),
-         avg_energy_joules=("energy_joules", "mean"),
-         avg_edp=("edp", "mean")
+    joined = pd.merge_asof(
+        perf_df.sort_values("timestamp"),
+        merged[["timestamp", "run_id", "prompt_id", "latency_ms", "energy_joules"]]
+        .sort_values("timestamp"),
+        on="timestamp",
+        by=["run_id", "prompt_id"],
+        direction="nearest",
+        tolerance=pd.Timedelta(seconds=60),
+    ).dropna(subset=["latency_ms"])
+    if joined.empty:
+        return None
+
+    per_run = joined.groupby("run_id").agg(
+        instructions=("instructions", "sum"),
+        cycles=("cycles", "sum"),
+        dram_bytes=("dram_bytes", "sum"),
+        energy_joules=("energy_joules", "sum"),
+        latency_ms=("latency_ms", "sum"),
     ).reset_index()
+    per_run["nj_per_instruction"] = per_run["energy_joules"] / per_run["instructions"] * 1e9
+    per_run["nj_per_dram_byte"] = per_run["energy_joules"] / per_run["dram_bytes"] * 1e9
+    per_run["ipc"] = per_run["instructions"] / per_run["cycles"]
+    per_run["arithmetic_intensity"] = per_run["instructions"] / per_run["dram_bytes"]
+    per_run["dram_gb_per_s"] = per_run["dram_bytes"] / (per_run["latency_ms"] / 1000.0) / 1e9
+    per_run["memory_bound"] = per_run["arithmetic_intensity"] < MEMORY_BOUND_INTENSITY
+    return per_run
+
+
+def summarize_quantization(merged: pd.DataFrame, quality_path: Path = QUALITY_LOG):
+    """Energy per token and latency per model variant next to its perplexity.
+
+    Returns one row per model file, or ``None`` when fewer than two variants
+    have been measured (there is nothing to trade off).
+    """
+    if "model" not in merged.columns:
+        return None
+    runs = merged[merged["model"].fillna("") != ""].copy()
+    if runs["model"].nunique() < 2:
+        return None
+    tokens = pd.to_numeric(runs["tokens_generated"], errors="coerce")
+    runs["j_per_token"] = runs["energy_joules"] / tokens.where(tokens > 0)
+    per_model = runs.groupby("model").agg(
+        j_per_token=("j_per_token", "mean"),
+        energy_joules=("energy_joules", "mean"),
+        latency_ms=("latency_ms", "mean"),
+        n=("latency_ms", "size"),
+    ).reset_index()
+    per_model["quantization"] = [quantization_of(Path(m)) or m for m in per_model["model"]]
+    per_model["perplexity"] = float("nan")
+    if quality_path.exists():
+        quality = pd.read_csv(quality_path).drop_duplicates("model", keep="last")
+        per_model = per_model.drop(columns="perplexity").merge(
+            quality[["model", "perplexity"]], on="model", how="left"
+        )
+    return per_model.sort_values("j_per_token", na_position="last")
+
+
+def summarize_phases(merged: pd.DataFrame, phase_path: Path = Path("data/phase_energy.csv")):
+    """Mean energy, duration and J/token per run and phase (load/prefill/decode).
+
+    Only phases of prompts present in ``merged`` count, so the report's
+    manifest and dry-run filters apply.  Returns ``None`` when nothing was split.
+    """
+    if not phase_path.exists():
+        return None
+    phases = pd.read_csv(phase_path, dtype={"manifest_id": str})
+    keys = merged[["run_id", "prompt_id", "manifest_id"]].drop_duplicates()
+    phases = phases.merge(keys, on=["run_id", "prompt_id", "manifest_id"])
+    if phases.empty:
+        return None
+    per_phase = phases.groupby(["backend", "run_id", "phase"], sort=False).agg(
+        energy_joules=("energy_joules", "mean"),
+        duration_ms=("duration_ms", "mean"),
+        total_energy=("energy_joules", "sum"),
+        tokens=("tokens", "sum"),
+        n=("prompt_id", "size"),
+    ).reset_index()
+    per_phase["j_per_token"] = per_phase["total_energy"] / per_phase["tokens"].where(
+        per_phase["tokens"] > 0
+    )
+    run_energy = per_phase.groupby("run_id")["energy_joules"].transform("sum")
+    per_phase["share"] = per_phase["energy_joules"] / run_energy
+    return per_phase.drop(columns=["total_energy", "tokens"])
+
 
+def columns(frame: pd.DataFrame, names):
+    """Plain-Python column slice of ``frame``: hashable for the figure cache, cheap to pickle."""
+    return {name: frame[name].tolist() for name in names}
 
-    # EDP = Energy (J) * Latency (s)
-    merged["edp"] = merged["avg_energy_joules"] * (merged["avg_latency_ms"] / 1000.0)
+
+def print_environments(merged: pd.DataFrame) -> None:
+    """List the environment manifests behind the loaded rows (legacy rows have none)."""
+    counts = merged.groupby(merged["manifest_id"].fillna("(none)"), dropna=False).size()
+    if list(counts.index) in ([], ["(none)"]):
+        return
+    print("\n--- Environments (session manifests) ---")
+    facts = merged.drop_duplicates("manifest_id").set_index("manifest_id")
+    for manifest_id, n in counts.items():
+        if manifest_id == "(none)":
+            print(f"{'(none)':<12} | {n:>4} rows | recorded before session manifests")
+            continue
+        row = facts.loc[manifest_id]
+        print(f"{manifest_id:<12} | {n:>4} rows | {row.get('hostname')} | {row.get('cpu_model')} | "
+              f"{row.get('gpu_name')} {row.get('gpu_driver') or ''} | "
+              f"llama {row.get('llama_build')}")
+    if len(counts) > 1:
+        print("⚠️ Rows come from more than one environment; pass --manifest to pick one.")
+
+
+def generate_report(manifest_ids=None, include_simulated=False):
+    # Load and join data (latency rows keyed to their own power measurement)
+    engine = AnalysisEngine(manifest_ids=manifest_ids)
+    timeline = engine.timeline()
+    merged = to_pandas(engine.runs())
+    print(f"Loaded {len(merged)} latency records.")
+    print_environments(merged)
+    unmatched = engine.unmatched()
+    if len(unmatched):
+        print(f"⚠️ Warning: {len(unmatched)} latency records have no matching power measurement.")
+
+    # --- 1. Latency Analysis ---
+    # --- 2. Energy Analysis ---
+    # --- 3. Calculate EDP ---
+    # EDP = Energy (J) * Latency (s), computed per run by the engine
+    merged["avg_latency_ms"] = merged["latency_ms"]
+    merged["avg_energy_joules"] = merged["energy_joules"]
+    summary_table = to_pandas(engine.summary())
 
     # --- 4. Formatting ---
     print("\n=== Performance Report (Nov 2025) ===")
@@ -62,74 +173,72 @@ def generate_report():
         print(f"{row['backend']:<8} | {row['prompt_template']:<20} | {row['avg_latency_ms']:<12.2f} | {row['avg_energy_joules']:<10.2f} | {row['avg_edp']:<10.2f}")
 
     # --- 5. Generate Figures ---
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    
-    # Use non-interactive backend to avoid Tcl/Tk errors
-    plt.switch_backend("Agg")
-
-    # Ensure figures directory exists
+    # Each figure is a task keyed by its data slice; unchanged ones are skipped
+    # and the rest render in parallel worker processes.
     figures_dir = Path("doc/figures")
     figures_dir.mkdir(parents=True, exist_ok=True)
+    tasks = []
 
     # Figure 1: Energy vs Latency Scatter Plot
-    plt.figure(figsize=(10, 6))
-    sns.scatterplot(
-        data=merged, 
-        x="latency_ms", 
-        y="energy_joules", 
-        hue="backend", 
-        style="run_id", 
-        s=100
-    )
-    plt.title("Energy vs. Latency: CPU vs GPU")
-    plt.xlabel("Average Latency (ms)")
-    plt.ylabel("Average Energy (Joules)")
-    plt.grid(True, linestyle="--", alpha=0.7)
-    plt.savefig(figures_dir / "energy_vs_latency.png")
-    print(f"Saved figure: {figures_dir / 'energy_vs_latency.png'}")
+    tasks.append(PlotTask(
+        name="energy_vs_latency",
+        output=figures_dir / "energy_vs_latency.png",
+        render=render_scatter,
+        data=columns(merged, ["latency_ms", "energy_joules", "backend", "run_id"]),
+        params={
+            "x": "latency_ms", "y": "energy_joules", "hue": "backend", "style": "run_id",
+            "title": "Energy vs. Latency: CPU vs GPU",
+            "xlabel": "Average Latency (ms)", "ylabel": "Average Energy (Joules)",
+        },
+    ))
 
     # Figure 2: Bar Chart Comparison
-    # Melt for easier plotting
-    melted = merged.melt(id_vars=["backend", "prompt_template"], value_vars=["avg_latency_ms", "avg_energy_joules"], var_name="metric", value_name="value")
-    
-    g = sns.catplot(
-        data=melted, 
-        kind="bar", 
-        x="prompt_template", 
-        y="value", 
-        hue="backend", 
-        col="metric", 
-        sharey=False,
-        height=5, 
-        aspect=1.2
-    )
-    g.set_titles("{col_name}")
-    g.axes[0,0].set_ylabel("Latency (ms)")
-    g.axes[0,1].set_ylabel("Energy (J)")
-    plt.savefig(figures_dir / "metrics_comparison.png")
-    print(f"Saved figure: {figures_dir / 'metrics_comparison.png'}")
+    tasks.append(PlotTask(
+        name="metrics_comparison",
+        output=figures_dir / "metrics_comparison.png",
+        render=render_metric_bars,
+        data=columns(merged, ["backend", "prompt_template", "avg_latency_ms", "avg_energy_joules"]),
+        params={
+            "id_vars": ["backend", "prompt_template"],
+            "metrics": ["avg_latency_ms", "avg_energy_joules"],
+            "x": "prompt_template", "hue": "backend",
+            "ylabels": ["Latency (ms)", "Energy (J)"],
+        },
+    ))
 
     # Figure 3: GPU Power Trace (Latest Run)
-    import glob
     import os
     
-    # Find latest raw GPU power log
-    gpu_logs = glob.glob("data/raw_gpu_power_*.csv")
+    # Find latest raw GPU power log (dry-run traces only when asked for)
+    gpu_logs = raw_trace_files(Path("data"), "gpu", include_simulated)
     if gpu_logs:
         latest_gpu_log = max(gpu_logs, key=os.path.getctime)
         print(f"Plotting GPU trace from: {latest_gpu_log}")
         
-        gpu_trace_df = pd.read_csv(latest_gpu_log)
-        gpu_trace_df["timestamp"] = pd.to_datetime(gpu_trace_df["timestamp"])
+        # Put the trace on the same timeline as the latency rows (clock anchors, skew).
+        trace_ns, trace_watts = read_power_trace(Path(latest_gpu_log), timeline)
+        tasks.append(PlotTask(
+            name="gpu_power_trace",
+            output=figures_dir / "gpu_power_trace.png",
+            render=render_line,
+            data={
+                "elapsed_s": ((trace_ns - trace_ns[0]) / 1e9).tolist() if len(trace_ns) else [],
+                "power_w": trace_watts.tolist(),
+            },
+            params={
+                "x": "elapsed_s", "y": "power_w", "color": "purple",
+                "title": f"GPU Power Trace: {os.path.basename(latest_gpu_log)}",
+                "xlabel": "Time (s)", "ylabel": "Power (W)",
+            },
+        ))
 
 
     # --- 6. Ablation Study Analysis ---
     print("\n--- Generating Ablation Plots ---")
     
-    # Reload data to ensure we have the latest with run_id
+    # Every measured run (the engine keeps the run_id column)
     try:
-        latency_df = pd.read_csv("data/latency_results.csv")
+        latency_df = merged
         # Ensure run_id exists
         if "run_id" not in latency_df.columns:
             print("⚠️ 'run_id' column missing in latency_results.csv. Skipping ablation plots.")
@@ -152,48 +261,152 @@ def generate_report():
                     lambda x: pd.Series(extract_param(x))
                 )
 
-                # Plot 1: CPU Thread Scaling
-                threads_df = ablation_df[ablation_df["param_type"] == "threads"]
-                if not threads_df.empty:
-                    plt.figure(figsize=(8, 5))
-                    sns.lineplot(data=threads_df, x="param_value", y="latency_ms", marker="o")
-                    plt.title("CPU Thread Scaling: Latency vs Threads")
-                    plt.xlabel("Threads")
-                    plt.ylabel("Latency (ms)")
-                    plt.grid(True, linestyle="--", alpha=0.5)
-                    plt.savefig(figures_dir / "ablation_threads.png")
-                    print(f"Saved figure: {figures_dir / 'ablation_threads.png'}")
-
-                # Plot 2: GPU Layer Offloading
-                layers_df = ablation_df[ablation_df["param_type"] == "layers"]
-                if not layers_df.empty:
-                    plt.figure(figsize=(8, 5))
-                    sns.lineplot(data=layers_df, x="param_value", y="latency_ms", marker="o", color="orange")
-                    plt.title("GPU Offloading: Latency vs GPU Layers")
-                    plt.xlabel("GPU Layers Offloaded")
-                    plt.ylabel("Latency (ms)")
-                    plt.grid(True, linestyle="--", alpha=0.5)
-                    plt.savefig(figures_dir / "ablation_layers.png")
-                    print(f"Saved figure: {figures_dir / 'ablation_layers.png'}")
-
-                # Plot 3: Batch Size Scaling
-                batch_df = ablation_df[ablation_df["param_type"] == "batch_size"]
-                if not batch_df.empty:
-                    plt.figure(figsize=(8, 5))
-                    sns.lineplot(data=batch_df, x="param_value", y="latency_ms", marker="o", color="green")
-                    plt.title("Batch Size Scaling: Latency vs Batch Size")
-                    plt.xlabel("Batch Size")
-                    plt.ylabel("Latency (ms)")
-                    plt.grid(True, linestyle="--", alpha=0.5)
-                    plt.savefig(figures_dir / "ablation_batch.png")
-                    print(f"Saved figure: {figures_dir / 'ablation_batch.png'}")
+                ablation_plots = [
+                    # (param, figure, title, x label, colour)
+                    ("threads", "ablation_threads", "CPU Thread Scaling: Latency vs Threads",
+                     "Threads", None),
+                    ("layers", "ablation_layers", "GPU Offloading: Latency vs GPU Layers",
+                     "GPU Layers Offloaded", "orange"),
+                    ("batch_size", "ablation_batch", "Batch Size Scaling: Latency vs Batch Size",
+                     "Batch Size", "green"),
+                ]
+                for param, name, title, xlabel, color in ablation_plots:
+                    param_df = ablation_df[ablation_df["param_type"] == param]
+                    if param_df.empty:
+                        continue
+                    tasks.append(PlotTask(
+                        name=name,
+                        output=figures_dir / f"{name}.png",
+                        render=render_line,
+                        data=columns(param_df, ["param_value", "latency_ms"]),
+                        params={
+                            "x": "param_value", "y": "latency_ms", "color": color,
+                            "title": title, "xlabel": xlabel, "ylabel": "Latency (ms)",
+                        },
+                    ))
             else:
                 print("No ablation data found in CSV.")
 
     except Exception as e:
         print(f"⚠️ Failed to generate ablation plots: {e}")
 
+    # Quantization sweep: energy per token against the perplexity quality proxy
+    quant = summarize_quantization(merged)
+    if quant is not None:
+        print("\n--- Quantization (energy/token vs perplexity) ---")
+        print(f"{'Variant':<8} | {'J/token':<8} | {'Energy (J)':<10} | {'Latency (ms)':<12} | "
+              f"{'PPL':<8} | n")
+        print("-" * 62)
+        for _, row in quant.iterrows():
+            ppl = f"{row['perplexity']:.3f}" if pd.notna(row["perplexity"]) else "-"
+            print(f"{row['quantization']:<8} | {row['j_per_token']:<8.3f} | "
+                  f"{row['energy_joules']:<10.2f} | {row['latency_ms']:<12.1f} | {ppl:<8} | "
+                  f"{row['n']}")
+        measured = quant.dropna(subset=["perplexity", "j_per_token"])
+        if len(measured) >= 2:
+            tasks.append(PlotTask(
+                name="quantization_tradeoff",
+                output=figures_dir / "quantization_tradeoff.png",
+                render=render_scatter,
+                data=columns(measured, ["perplexity", "j_per_token", "quantization"]),
+                params={
+                    "x": "perplexity", "y": "j_per_token", "hue": "quantization",
+                    "title": "Quantization: Energy per Token vs Perplexity",
+                    "xlabel": "Perplexity (lower is better)", "ylabel": "Energy (J/token)",
+                },
+            ))
+
+    # Phase-resolved energy: where each configuration spends its joules
+    phase_summary = summarize_phases(merged)
+    if phase_summary is not None:
+        print("\n--- Energy by Phase (load / prefill / decode) ---")
+        print(f"{'Run':<12} | {'Phase':<8} | {'Energy (J)':<10} | {'Share':<6} | "
+              f"{'Time (ms)':<10} | {'J/token':<8} | n")
+        print("-" * 72)
+        for _, row in phase_summary.iterrows():
+            per_token = f"{row['j_per_token']:.4f}" if pd.notna(row["j_per_token"]) else "-"
+            print(f"{row['run_id']:<12} | {row['phase']:<8} | {row['energy_joules']:<10.2f} | "
+                  f"{row['share']:<6.0%} | {row['duration_ms']:<10.1f} | {per_token:<8} | "
+                  f"{row['n']}")
+        phase_summary.to_csv(figures_dir / "phase_energy_summary.csv", index=False)
+        tasks.append(PlotTask(
+            name="phase_energy",
+            output=figures_dir / "phase_energy.png",
+            render=render_metric_bars,
+            data=columns(phase_summary.fillna({"j_per_token": 0.0}),
+                         ["run_id", "phase", "energy_joules", "j_per_token"]),
+            params={
+                "id_vars": ["run_id", "phase"],
+                "metrics": ["energy_joules", "j_per_token"],
+                "x": "run_id", "hue": "phase",
+                "ylabels": ["Energy per prompt (J)", "Energy (J/token)"],
+            },
+        ))
+
+    render_figures(tasks, figures_dir)
+
+    # --- 7. Hardware Counter Attribution (perf stat) ---
+    counters = summarize_perf_counters(merged)
+    if counters is not None:
+        print("\n--- Hardware Counters (CPU) ---")
+        print(f"{'Run':<10} | {'nJ/instr':<9} | {'IPC':<5} | {'Instr/Byte':<10} | "
+              f"{'DRAM GB/s':<9} | Bound")
+        print("-" * 65)
+        for _, row in counters.iterrows():
+            bound = "memory" if row["memory_bound"] else "compute"
+            print(f"{row['run_id']:<10} | {row['nj_per_instruction']:<9.3f} | {row['ipc']:<5.2f} | "
+                  f"{row['arithmetic_intensity']:<10.2f} | {row['dram_gb_per_s']:<9.2f} | {bound}")
+
+    # --- 8. Uncertainty and Significance ---
+    ci_table = bootstrap_summary(merged, ["backend", "prompt_template"])
+    comparisons = paired_comparisons(merged)
+    ci_table.to_csv(figures_dir / "stats_summary.csv", index=False)
+    comparisons.to_csv(figures_dir / "stats_comparisons.csv", index=False)
+    print("\n--- 95% Bootstrap CIs ---")
+    # (metric, header, width, decimals)
+    ci_columns = [
+        ("latency_ms", "Latency (ms)", 24, 1),
+        ("energy_joules", "Energy (J)", 20, 1),
+        ("j_per_token", "J/token", 22, 3),
+        ("edp", "EDP (J*s)", 24, 1),
+    ]
+    ci_columns = [c for c in ci_columns if f"{c[0]}_mean" in ci_table.columns]
+    print(" | ".join([f"{'Backend':<8}", f"{'Suite':<20}"]
+                     + [f"{header:<{width}}" for _, header, width, _ in ci_columns] + ["n"]))
+    print("-" * (36 + sum(width + 3 for _, _, width, _ in ci_columns)))
+    for _, row in ci_table.iterrows():
+        cells = [
+            f"{row[f'{m}_mean']:.{d}f} [{row[f'{m}_ci_low']:.{d}f}, {row[f'{m}_ci_high']:.{d}f}]"
+            .ljust(width)
+            for m, _, width, d in ci_columns
+        ]
+        flag = " (underpowered)" if row["underpowered"] else ""
+        print(" | ".join([f"{row['backend']:<8}", f"{row['prompt_template']:<20}", *cells,
+                          f"{row['latency_ms_n']}{flag}"]))
+    if len(comparisons):
+        significant = comparisons[comparisons["significant"]]
+        underpowered = int(comparisons["underpowered"].sum())
+        print(f"\nPaired comparisons: {len(comparisons)} tests (Holm-adjusted), "
+              f"{len(significant)} significant, {underpowered} underpowered.")
+        for _, row in significant.iterrows():
+            print(f"  {row['metric']:<14} {row['config_b']} vs {row['config_a']}: "
+                  f"{row['rel_diff']:+.1%} [{row['ci_low']:+.2f}, {row['ci_high']:+.2f}] "
+                  f"p={row['p_adjusted']:.3g}")
+
     print(f"\nReport saved to {figures_dir / 'report.txt'}") # Assuming report_path is figures_dir / 'report.txt'
 
 if __name__ == "__main__":
-    generate_report()
+    parser = argparse.ArgumentParser(description="Generate the latency/energy report.")
+    parser.add_argument(
+        "--manifest",
+        action="append",
+        dest="manifest_ids",
+        help="Only include rows from this session manifest id (repeatable)",
+    )
+    parser.add_argument(
+        "--include-simulated",
+        action="store_true",
+        help="Let the latest-trace figure pick a dry-run (raw_sim_*) trace",
+    )
+    args = parser.parse_args()
+    generate_report(args.manifest_ids, args.include_simulated)
@@ -8,6 +8,8 @@ from typing import Dict, List
 import pandas as pd
 import plotly.express as px
 
+from analysis.stats import bootstrap_summary
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
@@ -66,6 +68,20 @@ def summarize(df: pd.DataFrame) -> pd.DataFrame:
         p95_std=("p95_latency_ms_per_token", "std"),
         edp_mean=("edp", "mean"),
     ).reset_index()
+    intervals = bootstrap_summary(
+        df,
+        ["suite", "backend"],
+        metrics={
+            "energy": "energy_j_per_token",
+            "latency": "avg_latency_ms_per_token",
+            "p95": "p95_latency_ms_per_token",
+            "edp": "edp",
+        },
+    )
+    ci_columns = [c for c in intervals.columns if c.endswith(("_ci_low", "_ci_high"))]
+    summary = summary.merge(
+        intervals[["suite", "backend", *ci_columns, "underpowered"]], on=["suite", "backend"]
+    )
     summary["suite"] = summary["suite"].str.upper()
     summary["edp_mean"] = summary["edp_mean"].round(1)
     return summary
@@ -0,0 +1,283 @@
+"""Uncertainty and significance for the summary tables.
+
+Means alone cannot say whether a CPU/GPU gap is real with three prompts per
+configuration.  This module adds
+
+* percentile bootstrap confidence intervals for latency, energy, J/token and
+  EDP per group (:func:`bootstrap_summary`);
+* paired comparisons between configurations on the prompts they share: the
+  mean per-prompt difference with a bootstrap CI, a sign-flip permutation
+  p-value, and Holm-adjusted p-values across all comparisons
+  (:func:`paired_comparisons`);
+* an ``underpowered`` flag for cells with too few samples, too wide an
+  interval, or a minimum detectable effect above ``min_effect``.
+
+All resampling is batched: groups are padded into one matrix and every
+bootstrap replicate of every group is drawn in a single NumPy call (chunked to
+bound memory), so the stage is cheap enough to run on every report build.
+"""
+from __future__ import annotations
+
+from itertools import combinations
+from statistics import NormalDist
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+# Cells with fewer samples than this are always flagged as underpowered.
+MIN_SAMPLES = 5
+# ... as are cells whose CI half-width exceeds this fraction of the mean.
+MAX_RELATIVE_HALF_WIDTH = 0.10
+# Smallest relative difference worth detecting, for the power check on comparisons.
+DEFAULT_MIN_EFFECT = 0.05
+TARGET_POWER = 0.8
+# Bootstrap draws are generated in blocks of this many cells to bound memory.
+CELLS_PER_BLOCK = 4_000_000
+
+METRICS = {
+    "latency_ms": "latency_ms",
+    "energy_joules": "energy_joules",
+    "j_per_token": "j_per_token",
+    "edp": "edp",
+}
+
+
+def add_derived_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Add per-row ``edp`` (J*s) and ``j_per_token`` when their inputs exist."""
+    df = df.copy()
+    if "edp" not in df.columns and {"energy_joules", "latency_ms"} <= set(df.columns):
+        df["edp"] = df["energy_joules"] * df["latency_ms"] / 1000.0
+    if "j_per_token" not in df.columns and {"energy_joules", "tokens_generated"} <= set(df.columns):
+        tokens = pd.to_numeric(df["tokens_generated"], errors="coerce")
+        df["j_per_token"] = df["energy_joules"] / tokens.where(tokens > 0)
+    return df
+
+
+def _pad(groups: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    sizes = np.array([len(g) for g in groups], dtype=np.int64)
+    padded = np.zeros((len(groups), max(int(sizes.max(initial=0)), 1)))
+    for row, values in enumerate(groups):
+        padded[row, : len(values)] = values
+    return padded, sizes
+
+
+def _blocks(n_resamples: int, cells_per_resample: int):
+    step = max(1, CELLS_PER_BLOCK // max(cells_per_resample, 1))
+    for start in range(0, n_resamples, step):
+        yield min(step, n_resamples - start)
+
+
+def resample_means(
+    groups: Sequence[np.ndarray], n_resamples: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Bootstrap means, shape ``(n_resamples, len(groups))``; empty groups give NaN."""
+    padded, sizes = _pad(groups)
+    n_groups, width = padded.shape
+    safe = np.maximum(sizes, 1)
+    mask = np.arange(width)[None, None, :] < sizes[None, :, None]
+    rows = np.arange(n_groups)[None, :, None]
+    out = []
+    for block in _blocks(n_resamples, n_groups * width):
+        idx = (rng.random((block, n_groups, width)) * safe[None, :, None]).astype(np.int64)
+        draws = np.where(mask, padded[rows, idx], 0.0)
+        out.append(draws.sum(axis=2) / safe)
+    means = np.concatenate(out) if out else np.empty((0, n_groups))
+    means[:, sizes == 0] = np.nan
+    return means
+
+
+def resample_relative_deltas(
+    baselines: Sequence[np.ndarray],
+    candidates: Sequence[np.ndarray],
+    n_resamples: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Bootstrap ``mean(candidate) / mean(baseline) - 1`` per group, resampling pairs jointly.
+
+    ``baselines[i]`` and ``candidates[i]`` must be aligned (same length, same
+    units in the same order).  Returns shape ``(n_resamples, len(groups))``.
+    """
+    base, sizes = _pad(baselines)
+    cand, _ = _pad(candidates)
+    n_groups, width = base.shape
+    safe = np.maximum(sizes, 1)
+    mask = np.arange(width)[None, None, :] < sizes[None, :, None]
+    rows = np.arange(n_groups)[None, :, None]
+    out = []
+    for block in _blocks(n_resamples, 2 * n_groups * width):
+        idx = (rng.random((block, n_groups, width)) * safe[None, :, None]).astype(np.int64)
+        base_sum = np.where(mask, base[rows, idx], 0.0).sum(axis=2)
+        cand_sum = np.where(mask, cand[rows, idx], 0.0).sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out.append(cand_sum / base_sum - 1.0)
+    deltas = np.concatenate(out) if out else np.empty((0, n_groups))
+    deltas[:, sizes == 0] = np.nan
+    return deltas
+
+
+def sign_flip_pvalues(
+    differences: Sequence[np.ndarray], n_resamples: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Two-sided paired permutation p-values for a zero mean difference, per group."""
+    padded, sizes = _pad(differences)
+    n_groups, width = padded.shape
+    safe = np.maximum(sizes, 1)
+    observed = np.abs(padded.sum(axis=1) / safe)
+    mask = np.arange(width)[None, None, :] < sizes[None, :, None]
+    extreme = np.zeros(n_groups)
+    for block in _blocks(n_resamples, n_groups * width):
+        signs = np.where(rng.random((block, n_groups, width)) < 0.5, -1.0, 1.0)
+        stats = np.abs(np.where(mask, signs * padded[None], 0.0).sum(axis=2) / safe)
+        extreme += (stats >= observed[None, :] - 1e-12).sum(axis=0)
+    pvalues = (extreme + 1) / (n_resamples + 1)
+    pvalues[sizes == 0] = np.nan
+    return pvalues
+
+
+def holm(pvalues: Sequence[float]) -> np.ndarray:
+    """Holm-Bonferroni adjusted p-values (NaNs are left out and kept as NaN)."""
+    p = np.asarray(pvalues, dtype=float)
+    adjusted = np.full_like(p, np.nan)
+    valid = np.flatnonzero(~np.isnan(p))
+    if not len(valid):
+        return adjusted
+    order = valid[np.argsort(p[valid])]
+    m = len(order)
+    scaled = np.minimum(1.0, np.maximum.accumulate(p[order] * (m - np.arange(m))))
+    adjusted[order] = scaled
+    return adjusted
+
+
+def bootstrap_summary(
+    df: pd.DataFrame,
+    by: Sequence[str],
+    metrics: Optional[Mapping[str, str]] = None,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Mean and bootstrap CI of each metric per group, plus an ``underpowered`` flag.
+
+    ``metrics`` maps output names to columns; by default every metric in
+    :data:`METRICS` that is present in ``df``.
+    """
+    df = add_derived_metrics(df)
+    metrics = metrics or {name: col for name, col in METRICS.items() if col in df.columns}
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    groups = list(df.groupby(list(by), sort=True, dropna=False))
+    summary = pd.DataFrame([dict(zip(by, key if isinstance(key, tuple) else (key,)))
+                            for key, _ in groups])
+    underpowered = np.zeros(len(groups), dtype=bool)
+    for name, column in metrics.items():
+        samples = [
+            pd.to_numeric(frame[column], errors="coerce").dropna().to_numpy(dtype=float)
+            for _, frame in groups
+        ]
+        means = np.array([s.mean() if len(s) else np.nan for s in samples])
+        boot = resample_means(samples, n_resamples, rng)
+        sizes = np.array([len(s) for s in samples])
+        low, high = means.copy(), means.copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if len(boot) and (sizes > 0).any():
+                low[sizes > 0], high[sizes > 0] = np.quantile(
+                    boot[:, sizes > 0], [alpha, 1 - alpha], axis=0
+                )
+            relative = (high - low) / 2 / np.abs(means)
+        summary[f"{name}_mean"] = means
+        summary[f"{name}_ci_low"] = low
+        summary[f"{name}_ci_high"] = high
+        summary[f"{name}_n"] = sizes
+        underpowered |= (sizes < MIN_SAMPLES) | ~(relative <= MAX_RELATIVE_HALF_WIDTH)
+    summary["underpowered"] = underpowered
+    return summary
+
+
+def paired_comparisons(
+    df: pd.DataFrame,
+    config: str = "run_id",
+    unit: str = "prompt_id",
+    strata: Sequence[str] = ("prompt_template",),
+    metrics: Optional[Mapping[str, str]] = None,
+    n_resamples: int = DEFAULT_RESAMPLES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    min_effect: float = DEFAULT_MIN_EFFECT,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Compare every pair of configurations on the prompts both ran.
+
+    Repeats of a prompt within a configuration are averaged first, so each
+    prompt contributes one paired difference ``b - a``.  ``rel_diff`` is
+    relative to configuration ``a``'s mean on the shared prompts.
+    """
+    df = add_derived_metrics(df)
+    metrics = metrics or {name: col for name, col in METRICS.items() if col in df.columns}
+    strata = [s for s in strata if s in df.columns]
+    rng = np.random.default_rng(seed)
+    alpha = 1 - confidence
+    z_needed = NormalDist().inv_cdf(1 - alpha / 2) + NormalDist().inv_cdf(TARGET_POWER)
+
+    rows: List[Dict[str, object]] = []
+    differences: List[np.ndarray] = []
+    per_unit = df.groupby(strata + [config, unit], dropna=False)[list(metrics.values())].mean()
+    stratum_groups = per_unit.groupby(level=strata, dropna=False) if strata else [((), per_unit)]
+    for stratum, frame in stratum_groups:
+        stratum = stratum if isinstance(stratum, tuple) else (stratum,)
+        by_config = {name: sub.droplevel(strata + [config]) for name, sub in
+                     frame.groupby(level=config, dropna=False)}
+        for a, b in combinations(sorted(by_config), 2):
+            for name, column in metrics.items():
+                paired = pd.concat(
+                    [by_config[a][column], by_config[b][column]], axis=1, join="inner"
+                ).dropna()
+                if len(paired) < 2:
+                    continue
+                diff = (paired.iloc[:, 1] - paired.iloc[:, 0]).to_numpy(dtype=float)
+                baseline = float(paired.iloc[:, 0].mean())
+                row = dict(zip(strata, stratum))
+                row.update(
+                    metric=name,
+                    config_a=a,
+                    config_b=b,
+                    n_pairs=len(diff),
+                    mean_a=baseline,
+                    mean_b=float(paired.iloc[:, 1].mean()),
+                    mean_diff=float(diff.mean()),
+                    rel_diff=float(diff.mean() / baseline) if baseline else np.nan,
+                    detectable_diff=float(z_needed * diff.std(ddof=1) / np.sqrt(len(diff))),
+                )
+                rows.append(row)
+                differences.append(diff)
+
+    columns = list(strata) + [
+        "metric", "config_a", "config_b", "n_pairs", "mean_a", "mean_b", "mean_diff",
+        "rel_diff", "ci_low", "ci_high", "p_value", "p_adjusted", "significant",
+        "detectable_diff", "underpowered",
+    ]
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    result = pd.DataFrame(rows)
+    boot = resample_means(differences, n_resamples, rng)
+    result["ci_low"], result["ci_high"] = np.quantile(boot, [alpha / 2, 1 - alpha / 2], axis=0)
+    result["p_value"] = sign_flip_pvalues(differences, n_resamples, rng)
+    result["p_adjusted"] = holm(result["p_value"])
+    result["significant"] = result["p_adjusted"] < alpha
+    result["underpowered"] = (result["n_pairs"] < MIN_SAMPLES) | (
+        result["detectable_diff"] > min_effect * result["mean_a"].abs()
+    )
+    return result[columns]
+
+
+__all__ = [
+    "add_derived_metrics",
+    "bootstrap_summary",
+    "holm",
+    "paired_comparisons",
+    "resample_means",
+    "resample_relative_deltas",
+    "sign_flip_pvalues",
+]
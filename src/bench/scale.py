@@ -0,0 +1,412 @@
+"""Scale benchmark for the data pipeline on synthetic telemetry.
+
+Each consumer of the telemetry logs is timed on synthetic datasets at
+several multiples of today's data (see ``bench/synthetic.py``)::
+
+    uv run python src/bench/scale.py                        # scales 1, 10, 100
+    uv run python src/bench/scale.py --scales 1 10 100 1000 --repeat 3
+    uv run python src/bench/scale.py --compare data/bench/scale_<commit>.json
+
+Scenarios:
+
+* ``bridge_full``: ``interface.bridge`` exporting every run from scratch
+  (all formats).
+* ``bridge_incremental``: the same export with an up-to-date manifest.
+  This is what ``--watch`` pays per poll.
+* ``history``: ``demo_server``'s ``/history`` endpoint.
+* ``get_stats``: ``get_stats.py`` with a cold analysis cache.
+* ``generate_report``: ``analysis/generate_report.py`` with a cold cache,
+  including figures.
+
+Every measurement runs in a fresh interpreter inside the dataset directory.
+The consumer's modules are imported before the clock starts.  Wall time is
+the median over ``--repeat`` runs.  Peak memory is recorded two ways:
+
+* the process's peak RSS, and its growth over the scenario (Unix only);
+* with ``--python-heap``, the peak of Python allocations from
+  ``tracemalloc``, in an extra run since tracing slows the code down.
+
+A scenario that exceeds ``--timeout`` is recorded as such rather than
+waited for.
+
+Results go to ``data/bench/scale_<commit>.json``, together with the commit,
+Python version and platform.  ``--compare`` prints the time and memory ratio
+of each scenario and scale against an earlier results file.  Datasets are
+generated once per scale and seed under ``--work-dir`` and reused.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import importlib.util
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from bench.synthetic import SyntheticConfig, generate
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+RESULTS_DIR = Path("data/bench")
+WORK_DIR = RESULTS_DIR / "datasets"
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_TIMEOUT_S = 600.0
+# Files the scenarios write into a dataset; removed before every measurement.
+OUTPUTS = (
+    "data/.analysis_cache", "data/gamemaker_export.json", "data/gamemaker_export.bin",
+    "data/gamemaker_export_pages", "data/gamemaker_export.manifest.json", "doc",
+    "stats_output.json",
+)
+# Slower than the baseline by more than this is flagged by --compare.
+REGRESSION_RATIO = 1.2
+
+
+def _bridge_full() -> Callable[[], None]:
+    from clock import Timeline
+    from interface import bridge
+
+    def run() -> None:
+        timeline = Timeline.from_file(bridge.ANCHOR_FILE)
+        bridge.update_export(bridge.load_manifest(), "all", 64, timeline)
+
+    return run
+
+
+def _bridge_incremental() -> Callable[[], None]:
+    run = _bridge_full()
+    run()  # Bring the export manifest up to date; only the second pass is timed.
+    return run
+
+
+def _history() -> Callable[[], None]:
+    import demo_server
+
+    demo_server.logger.disabled = True
+    client = demo_server.app.test_client()
+
+    def run() -> None:
+        response = client.get("/history")
+        if response.status_code != 200:
+            raise RuntimeError(f"/history returned {response.status_code}")
+
+    return run
+
+
+def _get_stats() -> Callable[[], None]:
+    spec = importlib.util.spec_from_file_location("get_stats", REPO_ROOT / "get_stats.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.get_stats
+
+
+def _generate_report() -> Callable[[], None]:
+    from analysis.generate_report import generate_report
+
+    return lambda: generate_report(None)
+
+
+SCENARIOS: Dict[str, Callable[[], Callable[[], None]]] = {
+    "bridge_full": _bridge_full,
+    "bridge_incremental": _bridge_incremental,
+    "history": _history,
+    "get_stats": _get_stats,
+    "generate_report": _generate_report,
+}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_in_process(scenario: str, python_heap: bool = False) -> Dict[str, Optional[float]]:
+    """Set up and time one scenario in this process (the current directory is the dataset)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = SCENARIOS[scenario]()
+        rss_before = _peak_rss_mb()
+        if python_heap:
+            import tracemalloc
+
+            tracemalloc.start()
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        heap_mb = None
+        if python_heap:
+            heap_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+    rss_after = _peak_rss_mb()
+    return {
+        "seconds": seconds,
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": None if rss_after is None else rss_after - rss_before,
+        "peak_heap_mb": heap_mb,
+    }
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    scale: int
+    latency_rows: int
+    raw_files: int
+    status: str = "ok"
+    seconds: Optional[float] = None
+    seconds_all: List[float] = field(default_factory=list)
+    peak_rss_mb: Optional[float] = None
+    rss_growth_mb: Optional[float] = None
+    peak_heap_mb: Optional[float] = None
+    error: str = ""
+
+
+def dataset(scale: int, seed: int, work_dir: Path = WORK_DIR) -> Tuple[Path, Dict[str, int]]:
+    """The dataset directory for ``scale``/``seed``, generated on first use."""
+    root = work_dir / f"scale{scale}_seed{seed}"
+    index = root / "dataset.json"
+    if index.exists():
+        return root, json.loads(index.read_text(encoding="utf-8"))["counts"]
+    if root.exists():
+        shutil.rmtree(root)  # An interrupted generation.
+    started = time.perf_counter()
+    config = SyntheticConfig(scale=scale, seed=seed)
+    summary = generate(root, config)
+    counts = {"latency_rows": summary.latency_rows, "raw_files": summary.raw_files}
+    index.write_text(
+        json.dumps({"config": config.as_dict(), "counts": counts}, indent=2), encoding="utf-8"
+    )
+    print(f"🧪 Generated scale {scale}: {summary.latency_rows} rows, {summary.raw_files} raw "
+          f"files, {summary.bytes / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s")
+    return root, counts
+
+
+def _clean(root: Path) -> None:
+    for name in OUTPUTS:
+        path = root / name
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+
+
+def _run_worker(
+    scenario: str, root: Path, timeout_s: float, python_heap: bool = False
+) -> Dict[str, Optional[float]]:
+    _clean(root)
+    completed = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--worker", scenario]
+        + (["--python-heap"] if python_heap else []),
+        cwd=root, capture_output=True, text=True, timeout=timeout_s,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr
+                           else f"exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_scenario(
+    scenario: str,
+    scale: int,
+    root: Path,
+    counts: Dict[str, int],
+    repeat: int = 3,
+    timeout_s: float = DEFAULT_TIMEOUT_S,
+    python_heap: bool = False,
+) -> ScenarioResult:
+    result = ScenarioResult(scenario, scale, counts["latency_rows"], counts["raw_files"])
+    try:
+        for _ in range(repeat):
+            sample = _run_worker(scenario, root, timeout_s)
+            result.seconds_all.append(sample["seconds"])
+            for name in ("peak_rss_mb", "rss_growth_mb"):
+                if sample[name] is not None:
+                    setattr(result, name, max(getattr(result, name) or 0.0, sample[name]))
+        if python_heap:
+            result.peak_heap_mb = _run_worker(scenario, root, timeout_s, True)["peak_heap_mb"]
+    except subprocess.TimeoutExpired:
+        result.status = "timeout"
+        result.error = f"over {timeout_s:g}s"
+    except RuntimeError as exc:
+        result.status = "error"
+        result.error = str(exc)
+    finally:
+        _clean(root)
+    if result.seconds_all:
+        result.seconds = statistics.median(result.seconds_all)
+    return result
+
+
+def _git_commit() -> Tuple[str, bool]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def _format_row(result: ScenarioResult) -> str:
+    if result.status != "ok":
+        return f"{result.scenario:<20} {result.scale:>6}x  {result.status}: {result.error}"
+    rss = f"{result.peak_rss_mb:8.0f} MB rss" if result.peak_rss_mb is not None else ""
+    heap = f" {result.peak_heap_mb:8.1f} MB heap" if result.peak_heap_mb is not None else ""
+    return (f"{result.scenario:<20} {result.scale:>6}x {result.latency_rows:>8} rows "
+            f"{result.seconds:>9.3f} s {rss}{heap}")
+
+
+def run_benchmark(
+    scales: Sequence[int] = DEFAULT_SCALES,
+    scenarios: Sequence[str] = tuple(SCENARIOS),
+    repeat: int = 3,
+    seed: int = 0,
+    timeout_s: float = DEFAULT_TIMEOUT_S,
+    python_heap: bool = False,
+    work_dir: Path = WORK_DIR,
+) -> Dict[str, object]:
+    results: List[ScenarioResult] = []
+    for scale in scales:
+        if not scenarios:
+            break
+        root, counts = dataset(scale, seed, work_dir)
+        for scenario in scenarios:
+            result = run_scenario(scenario, scale, root, counts, repeat, timeout_s, python_heap)
+            results.append(result)
+            print(("✅ " if result.status == "ok" else "⚠️ ") + _format_row(result))
+            if result.status == "timeout":
+                # Larger scales of the same scenario will not be faster.
+                scenarios = [s for s in scenarios if s != scenario]
+    commit, dirty = _git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created_utc": dt.datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": [asdict(result) for result in results],
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object]) -> List[str]:
+    """Per-scenario ratio lines of ``current`` against ``baseline`` (>1 is slower/larger)."""
+    before = {(r["scenario"], r["scale"]): r for r in baseline["results"]}
+    lines = [f"Against {str(baseline['commit'])[:12]} ({baseline['created_utc']}):"]
+    for result in current["results"]:
+        old = before.get((result["scenario"], result["scale"]))
+        if old is None or not result["seconds"] or not old["seconds"]:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        memory = ""
+        if result["peak_rss_mb"] and old["peak_rss_mb"]:
+            memory = f", rss x{result['peak_rss_mb'] / old['peak_rss_mb']:.2f}"
+        flag = "⚠️ " if ratio > REGRESSION_RATIO else "   "
+        lines.append(f"{flag}{result['scenario']:<20} {result['scale']:>6}x  "
+                     f"time x{ratio:.2f}{memory}")
+    return lines
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time the data pipeline on synthetic telemetry.")
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SCALES),
+        help="Multiples of the reference dataset (27 runs, 27 raw traces).",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Only run this scenario (repeatable; default: all).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per scenario and scale; the median time is reported.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic data seed.")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT_S,
+        help="Seconds before a single run is abandoned (and larger scales skipped).",
+    )
+    parser.add_argument(
+        "--python-heap",
+        action="store_true",
+        help="Also record peak Python allocations with tracemalloc (one extra run each).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=WORK_DIR,
+        help="Where generated datasets are kept between invocations.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Results file (default: data/bench/scale_<commit>.json).",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="Earlier results file to compare this run against.",
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.worker:
+        print(json.dumps(measure_in_process(args.worker, args.python_heap)))
+        return
+
+    report = run_benchmark(
+        args.scales, args.scenario or tuple(SCENARIOS), args.repeat, args.seed, args.timeout,
+        args.python_heap, args.work_dir.resolve(),
+    )
+    output = args.output or RESULTS_DIR / f"scale_{str(report['commit'])[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"💾 Results saved to {output}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print("\n".join(compare(report, baseline)))
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "SCENARIOS",
+    "ScenarioResult",
+    "compare",
+    "dataset",
+    "measure_in_process",
+    "run_benchmark",
+    "run_scenario",
+]
@@ -0,0 +1,286 @@
+"""Deterministic synthetic telemetry in the harness's current file formats.
+
+The reference dataset is one session of the P1 sweep: nine run
+configurations (``cpu-t1`` ... ``gpu-l22``) with three prompts each, every
+prompt with its own legacy power capture.  That is 27 latency rows, 27 power
+summaries and 27 raw traces (PowerLog CSVs for the CPU, NVML traces for the
+GPU).  ``scale`` repeats the session with new timestamps, prompt sets and
+measurements, so ``scale=100`` yields 2,700 of each::
+
+    generate(Path("/tmp/scale100"), SyntheticConfig(scale=100))
+
+The output is a working directory of its own: ``data/latency_results.csv``,
+``data/power_logs.csv``, ``data/raw_{cpu,gpu}_power_*.csv``,
+``data/clock_anchors.jsonl`` and one ``data/manifests/<id>.json`` per
+session.  Everything is derived from ``seed``, including the clock
+anchors, which carry ``utc_offset_s`` so that PowerLog's local times convert
+the same way on any machine.  The same config always produces
+byte-identical files.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import json
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, TextIO, Tuple
+
+from clock import EPOCH, NS_PER_S
+
+# (run_id, backend, median latency ms, average watts) of the reference sweep.
+RUN_CONFIGS: Tuple[Tuple[str, str, float, float], ...] = (
+    ("cpu-t1", "cpu", 8000.0, 29.0),
+    ("cpu-t4", "cpu", 4200.0, 38.0),
+    ("cpu-t8", "cpu", 3100.0, 45.0),
+    ("gpu-b128", "gpu", 1900.0, 62.0),
+    ("gpu-b512", "gpu", 1700.0, 66.0),
+    ("gpu-b1024", "gpu", 1650.0, 68.0),
+    ("gpu-l0", "gpu", 6500.0, 44.0),
+    ("gpu-l11", "gpu", 3300.0, 55.0),
+    ("gpu-l22", "gpu", 1600.0, 70.0),
+)
+PROMPTS_PER_RUN = 3
+# Prompt sets in data/prompts, cycled per session.
+PROMPT_SETS = (
+    ("sd", "short_dialogue"),
+    ("ar", "analytical_reasoning"),
+    ("ng", "narrative_generation"),
+)
+MODEL = "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
+
+LATENCY_HEADERS = (
+    "timestamp", "run_id", "backend", "prompt_id", "prompt_template", "prompt_length_chars",
+    "latency_ms", "tokens_generated", "energy_joules", "notes", "monotonic_ns", "manifest_id",
+    "model",
+)
+POWER_HEADERS = (
+    "timestamp", "backend", "energy_joules", "notes", "max_temp_c", "throttled_fraction",
+    "manifest_id",
+)
+GPU_TRACE_HEADERS = ("timestamp", "monotonic_ns", "power_w", "temperature_c", "throttled")
+POWERLOG_HEADER = (
+    "System Time,RDTSC,Elapsed Time (sec), CPU Utilization(%),CPU Frequency_0(MHz),"
+    "Processor Power_0(Watt),Cumulative Processor Energy_0(Joules),"
+    "Cumulative Processor Energy_0(mWh),IA Power_0(Watt),Cumulative IA Energy_0(Joules),"
+    "Cumulative IA Energy_0(mWh),Package Temperature_0(C),Package Hot_0,DRAM Power_0(Watt),"
+    "Cumulative DRAM Energy_0(Joules),Cumulative DRAM Energy_0(mWh),Package PL1_0(Watt),"
+    "Package PL2_0(Watt),Package PL4_0(Watt),Platform PsysPL1_0(Watt),Platform PsysPL2_0(Watt)"
+)
+POWERLOG_INTERVAL_S = 0.108
+NVML_INTERVAL_S = 0.1
+TSC_GHZ = 2.496
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    """Size and shape of a synthetic dataset."""
+
+    scale: int = 1
+    seed: int = 0
+    start: dt.datetime = dt.datetime(2025, 12, 8, 1, 0, 0)
+    utc_offset_s: int = -5 * 3600
+    capture_s: float = 5.0
+    # Idle time between sessions, so sessions never overlap on the timeline.
+    session_gap_s: float = 600.0
+
+    def as_dict(self) -> Dict[str, object]:
+        data = asdict(self)
+        data["start"] = self.start.isoformat()
+        return data
+
+
+@dataclass
+class DatasetSummary:
+    root: Path
+    latency_rows: int
+    power_rows: int
+    raw_files: int
+    bytes: int
+
+
+def _wall_ns(value: dt.datetime) -> int:
+    return (value - EPOCH) // dt.timedelta(microseconds=1) * 1000
+
+
+def _iso(value: dt.datetime) -> str:
+    return value.isoformat(timespec="milliseconds")
+
+
+class _Writer:
+    """Writes one dataset; keeps the shared clock and the open CSV logs."""
+
+    def __init__(self, root: Path, config: SyntheticConfig) -> None:
+        self.data = root / "data"
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.offset = dt.timedelta(seconds=config.utc_offset_s)
+        # Synthetic boot one hour before the data starts: monotonic = wall - boot.
+        self.boot_ns = _wall_ns(config.start) - 3600 * NS_PER_S
+        self.raw_files = 0
+
+    def monotonic_ns(self, when: dt.datetime) -> int:
+        return _wall_ns(when) - self.boot_ns
+
+    def anchor(self, handle: TextIO, when: dt.datetime, label: str) -> None:
+        wall = _wall_ns(when)
+        handle.write(json.dumps({
+            "wall_ns": wall, "monotonic_ns": wall - self.boot_ns,
+            "utc_offset_s": self.config.utc_offset_s, "uncertainty_ns": 100, "label": label,
+        }) + "\n")
+
+    def watts(self, mean: float, n: int) -> List[float]:
+        """A noisy power trace with a prefill bump, around ``mean`` watts."""
+        bump = max(1, n // 8)
+        return [
+            max(1.0, mean * (1.25 if i < bump else 1.0) + self.rng.gauss(0.0, mean * 0.08))
+            for i in range(n)
+        ]
+
+    def cpu_trace(self, path: Path, start: dt.datetime, mean_w: float) -> Tuple[float, float]:
+        """A PowerLog CSV with local ``HH:MM:SS:mmm`` stamps; returns (joules, max temp)."""
+        n = int(self.config.capture_s / POWERLOG_INTERVAL_S)
+        watts = self.watts(mean_w, n)
+        energy = ia_energy = 0.0
+        max_temp = 0
+        start_mono = self.monotonic_ns(start)
+        lines = [POWERLOG_HEADER]
+        for i, w in enumerate(watts):
+            elapsed = (i + 1) * POWERLOG_INTERVAL_S
+            local = start + self.offset + dt.timedelta(seconds=elapsed)
+            energy += w * POWERLOG_INTERVAL_S
+            ia = w * 0.93
+            ia_energy += ia * POWERLOG_INTERVAL_S
+            temp = 34 + int(w / 10) + self.rng.randint(0, 2)
+            max_temp = max(max_temp, temp)
+            tsc = int((start_mono + elapsed * NS_PER_S) * TSC_GHZ)
+            stamp = local.strftime("%H:%M:%S:") + f"{local.microsecond // 1000:03d}"
+            lines.append(
+                f"{stamp}, {tsc}, {elapsed:8.3f}, {self.rng.uniform(10, 40):8.3f}, "
+                f"{self.rng.choice((2800, 4100))}, {w:7.3f}, {energy:7.3f}, "
+                f"{energy / 3.6:7.3f}, {ia:7.3f}, {ia_energy:7.3f}, {ia_energy / 3.6:7.3f}, "
+                f"{temp}, {0:2d}, {0:7.3f}, {0:7.3f}, {0:7.3f}, {65:7.3f}, {219:7.3f}, "
+                f"{0:7.3f}, {0:7.3f}, {0:7.3f}"
+            )
+        elapsed = n * POWERLOG_INTERVAL_S
+        lines += [
+            "",
+            f"Total Elapsed Time (sec) = {elapsed:.6f}",
+            f"Measured RDTSC Frequency (GHz) = {TSC_GHZ:.3f}",
+            "",
+            f"Cumulative Processor Energy_0 (Joules) = {energy:.6f}",
+            f"Cumulative Processor Energy_0 (mWh) = {energy / 3.6:.6f}",
+            f"Average Processor Power_0 (Watt) = {energy / elapsed:.6f}",
+            "",
+            f"Cumulative IA Energy_0 (Joules) = {ia_energy:.6f}",
+            f"Cumulative IA Energy_0 (mWh) = {ia_energy / 3.6:.6f}",
+            f"Average IA Power_0 (Watt) = {ia_energy / elapsed:.6f}",
+            "",
+            "Cumulative DRAM Energy_0 (Joules) = 0.000000",
+            "Cumulative DRAM Energy_0 (mWh) = 0.000000",
+            "Average DRAM Power_0 (Watt) = 0.000000",
+        ]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return energy, float(max_temp)
+
+    def gpu_trace(self, path: Path, start: dt.datetime, mean_w: float) -> Tuple[float, float]:
+        """An NVML trace in UTC with monotonic stamps; returns (joules, max temp)."""
+        n = int(self.config.capture_s / NVML_INTERVAL_S)
+        energy, max_temp = 0.0, 0.0
+        with path.open("w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(GPU_TRACE_HEADERS)
+            for i, w in enumerate(self.watts(mean_w, n)):
+                when = start + dt.timedelta(seconds=i * NVML_INTERVAL_S)
+                temp = 40 + int(w / 8) + self.rng.randint(0, 2)
+                max_temp = max(max_temp, temp)
+                energy += w * NVML_INTERVAL_S
+                writer.writerow([_iso(when), self.monotonic_ns(when), round(w, 3), temp, 0])
+        return energy, max_temp
+
+    def write(self) -> DatasetSummary:
+        (self.data / "manifests").mkdir(parents=True, exist_ok=True)
+        latency_handle = (self.data / "latency_results.csv").open(
+            "w", newline="", encoding="utf-8"
+        )
+        power_handle = (self.data / "power_logs.csv").open("w", newline="", encoding="utf-8")
+        anchors = (self.data / "clock_anchors.jsonl").open("w", encoding="utf-8")
+        latency_rows = power_rows = 0
+        with latency_handle, power_handle, anchors:
+            latency = csv.DictWriter(latency_handle, LATENCY_HEADERS)
+            power = csv.DictWriter(power_handle, POWER_HEADERS)
+            latency.writeheader()
+            power.writeheader()
+            now = self.config.start
+            for session in range(self.config.scale):
+                manifest_id = f"synthetic{session:06d}"
+                self.manifest(manifest_id, session)
+                prefix, template = PROMPT_SETS[session % len(PROMPT_SETS)]
+                for run_id, backend, latency_ms, mean_w in RUN_CONFIGS:
+                    for index in range(1, PROMPTS_PER_RUN + 1):
+                        prompt_id = f"{prefix}-{index:03d}"
+                        # The legacy capture covers the start of the prompt.
+                        end = now + dt.timedelta(seconds=self.config.capture_s)
+                        name = f"raw_{backend}_power_{(end + self.offset):%Y%m%d_%H%M%S}.csv"
+                        self.anchor(anchors, now, f"{name}:start")
+                        trace = self.cpu_trace if backend == "cpu" else self.gpu_trace
+                        joules, max_temp = trace(self.data / name, now, mean_w)
+                        self.anchor(anchors, end, f"{name}:end")
+                        self.raw_files += 1
+                        power.writerow({
+                            "timestamp": _iso(end), "backend": backend,
+                            "energy_joules": round(joules, 4), "notes": f"prompt={prompt_id}",
+                            "max_temp_c": max_temp, "throttled_fraction": 0.0,
+                            "manifest_id": manifest_id,
+                        })
+                        power_rows += 1
+                        took = latency_ms * self.rng.lognormvariate(0.0, 0.12)
+                        finished = now + dt.timedelta(milliseconds=100 + took)
+                        latency.writerow({
+                            "timestamp": _iso(finished), "run_id": run_id, "backend": backend,
+                            "prompt_id": prompt_id, "prompt_template": template,
+                            "prompt_length_chars": self.rng.randint(110, 260),
+                            "latency_ms": round(took, 3),
+                            "tokens_generated": self.rng.randint(18, 128),
+                            "energy_joules": "", "notes": "",
+                            "monotonic_ns": self.monotonic_ns(finished),
+                            "manifest_id": manifest_id, "model": MODEL,
+                        })
+                        latency_rows += 1
+                        now = max(finished, end) + dt.timedelta(seconds=1)
+                now += dt.timedelta(seconds=self.config.session_gap_s)
+        size = sum(p.stat().st_size for p in self.data.rglob("*") if p.is_file())
+        return DatasetSummary(self.data.parent, latency_rows, power_rows, self.raw_files, size)
+
+    def manifest(self, manifest_id: str, session: int) -> None:
+        # The facts the analysis engine joins on; see manifest.collect_environment.
+        record = {
+            "manifest_id": manifest_id,
+            "hostname": "synthetic",
+            "cpu_model": "Synthetic CPU",
+            "cpu_governor": None,
+            "power_plan": None,
+            "gpu_name": "Synthetic GPU",
+            "gpu_driver": None,
+            "llama_binaries": {},
+            "models": [],
+            "git_commit": None,
+            "dry_run": False,
+            "config_path": f"synthetic/session_{session}",
+        }
+        path = self.data / "manifests" / f"{manifest_id}.json"
+        path.write_text(json.dumps(record, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def generate(root: Path, config: SyntheticConfig = SyntheticConfig()) -> DatasetSummary:
+    """Write a synthetic dataset under ``root`` (which should be empty)."""
+    return _Writer(root, config).write()
+
+
+__all__ = [
+    "DatasetSummary",
+    "RUN_CONFIGS",
+    "SyntheticConfig",
+    "generate",
+]
@@ -0,0 +1,318 @@
+"""Energy- and latency-budgeted generation.
+
+On battery-powered or thermally constrained devices a bounded cost per answer
+matters more than a fixed token count.  A run (or ``defaults``) can carry a
+``budget`` block, and a manual prompt can override it with its own::
+
+    budget:
+      energy_joules: 40        # stop before the answer costs more than this
+      latency_ms: 8000         # ... or takes longer than this
+      min_tokens: 16           # below this a cheaper fallback is tried instead
+      fallback:                # cheaper options, in order of preference
+        - {backend: cpu}
+        - {model: data/models/TinyLlama-1.1B-Chat-v1.0.Q2_K.gguf}
+
+Before a prompt starts, :class:`BudgetPlanner` predicts its cost with the
+router's per-backend cost models and caps ``n_predict`` at the tokens the
+budget pays for; when the run's own backend/model cannot afford
+``min_tokens``, the first fallback that can is used.  While it generates,
+:class:`BudgetGuard` watches the measured energy (the session power trace, or
+the predicted draw when there is none) and elapsed time, and stops generation
+as soon as one more token at the observed per-token cost would overrun the
+budget.  Every budgeted prompt is logged to ``data/budget_usage.csv`` with
+its budget, plan, spend and outcome, and the observed cost is folded back
+into the planner so later prompts are planned with it.
+"""
+from __future__ import annotations
+
+import copy
+import time
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from router import BACKENDS, BackendCostModel, EnergyAwareRouter, Observation
+
+# Outcomes recorded in ``budget_usage.csv``.
+WITHIN = "within"
+STOPPED_ENERGY = "stopped_energy"
+STOPPED_LATENCY = "stopped_latency"
+OVER = "over"
+
+
+@dataclass
+class Fallback:
+    """A cheaper backend and/or model to use when the budget cannot be met."""
+
+    backend: Optional[str] = None
+    model: Optional[Path] = None
+
+
+@dataclass
+class Budget:
+    """Cost ceiling for each answer (``budget`` block)."""
+
+    energy_joules: Optional[float] = None
+    latency_ms: Optional[float] = None
+    min_tokens: int = 16
+    fallback: List[Fallback] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, object]]) -> Optional["Budget"]:
+        if not data:
+            return None
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown budget settings: {', '.join(sorted(unknown))}")
+        budget = cls(**{k: v for k, v in data.items() if k != "fallback"})  # type: ignore[arg-type]
+        if budget.energy_joules is None and budget.latency_ms is None:
+            raise ValueError("A budget needs energy_joules and/or latency_ms")
+        for name in ("energy_joules", "latency_ms"):
+            value = getattr(budget, name)
+            if value is not None and float(value) <= 0:
+                raise ValueError(f"budget.{name} must be positive, not {value}")
+        for entry in data.get("fallback") or []:
+            unknown = set(entry) - {"backend", "model"}
+            if unknown or not entry:
+                raise ValueError(f"Budget fallbacks take 'backend' and/or 'model', not {entry}")
+            if entry.get("backend") not in (None, *BACKENDS):
+                raise ValueError(f"Unknown fallback backend '{entry['backend']}'")
+            model = entry.get("model")
+            budget.fallback.append(Fallback(entry.get("backend"), Path(model) if model else None))
+        return budget
+
+    def merged(self, overrides: Optional[Dict[str, object]]) -> "Budget":
+        """This budget with a prompt's own ``budget`` entries on top."""
+        if not overrides:
+            return self
+        base = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "fallback"}
+        merged = Budget.from_dict({**base, **overrides})
+        if merged is not None and "fallback" not in overrides:
+            merged.fallback = list(self.fallback)
+        return merged or self
+
+    def label(self) -> str:
+        parts = []
+        if self.energy_joules is not None:
+            parts.append(f"{self.energy_joules:g} J")
+        if self.latency_ms is not None:
+            parts.append(f"{self.latency_ms:g} ms")
+        return " / ".join(parts)
+
+
+@dataclass
+class BudgetPlan:
+    """Backend, model and token cap chosen for one prompt."""
+
+    backend: str
+    model_path: Path
+    n_predict: int
+    predicted_energy_joules: float
+    predicted_latency_ms: float
+    fallback: bool = False
+    # Where the prediction goes beyond the cost model's fit (see BackendCostModel.caveats).
+    caveats: List[str] = field(default_factory=list)
+
+    @property
+    def watts(self) -> Optional[float]:
+        """Average draw the plan predicts, for when power is not measured."""
+        if self.predicted_latency_ms <= 0:
+            return None
+        return self.predicted_energy_joules / (self.predicted_latency_ms / 1000.0)
+
+
+class BudgetPlanner:
+    """Pick a backend/model and ``n_predict`` whose predicted cost fits a budget.
+
+    Costs come from one :class:`BackendCostModel` per backend/model pair,
+    seeded from the backend's telemetry fit and refined online per prompt.
+    """
+
+    def __init__(self, backend_models: Dict[str, BackendCostModel]) -> None:
+        self.backend_models = backend_models
+        self.models: Dict[Tuple[str, str], BackendCostModel] = {}
+
+    @classmethod
+    def from_telemetry(
+        cls,
+        latency_path: Path = Path("data/latency_results.csv"),
+        power_path: Path = Path("data/power_logs.csv"),
+    ) -> "BudgetPlanner":
+        return cls(EnergyAwareRouter.from_telemetry(latency_path, power_path).models)
+
+    def _model(self, backend: str, model_path: Path) -> BackendCostModel:
+        key = (backend, Path(model_path).name)
+        if key not in self.models:
+            seed = self.backend_models.get(backend) or BackendCostModel()
+            self.models[key] = copy.deepcopy(seed)
+        return self.models[key]
+
+    def affordable_tokens(
+        self, budget: Budget, backend: str, model_path: Path, prompt_tokens: float
+    ) -> float:
+        """Output tokens the budget pays for (the cost models are linear in them).
+
+        A model whose output-token slope was clipped predicts the same cost for
+        any ``n_predict``, so it puts no cap on the tokens; the guard's measured
+        per-token cost then stops generation, and the plan's ``caveats`` say so.
+        """
+        model = self._model(backend, model_path)
+        base_ms, base_j = model.predict(prompt_tokens, 0)
+        next_ms, next_j = model.predict(prompt_tokens, 1)
+        tokens = float("inf")
+        for limit, base, step in (
+            (budget.energy_joules, base_j, next_j - base_j),
+            (budget.latency_ms, base_ms, next_ms - base_ms),
+        ):
+            if limit is None:
+                continue
+            if base >= limit:
+                return 0.0
+            if step > 0:
+                tokens = min(tokens, (limit - base) / step)
+        return tokens
+
+    def _overrun(
+        self, budget: Budget, backend: str, model_path: Path, prompt_tokens: float, tokens: int
+    ) -> float:
+        """Predicted cost of ``tokens`` as a multiple of the budget (worst of energy/latency)."""
+        latency, energy = self._model(backend, model_path).predict(prompt_tokens, tokens)
+        ratios = [
+            value / limit
+            for value, limit in ((energy, budget.energy_joules), (latency, budget.latency_ms))
+            if limit is not None
+        ]
+        return max(ratios)
+
+    def plan(
+        self,
+        budget: Budget,
+        prompt_tokens: float,
+        n_predict: int,
+        backend: str,
+        model_path: Path,
+    ) -> BudgetPlan:
+        options = [(backend, model_path, False)] + [
+            (f.backend or backend, f.model or model_path, True) for f in budget.fallback
+        ]
+        affordable = [
+            self.affordable_tokens(budget, b, m, prompt_tokens) for b, m, _ in options
+        ]
+        wanted = min(budget.min_tokens, n_predict)
+        index = next((i for i, tokens in enumerate(affordable) if tokens >= wanted), None)
+        if index is None:
+            # Nothing fits; take the option that overruns least and let the guard stop it.
+            index = min(
+                range(len(options)),
+                key=lambda i: self._overrun(budget, *options[i][:2], prompt_tokens, wanted),
+            )
+        chosen_backend, chosen_model, fallback = options[index]
+        tokens = int(min(n_predict, max(affordable[index], wanted)))
+        model = self._model(chosen_backend, chosen_model)
+        latency, energy = model.predict(prompt_tokens, tokens)
+        return BudgetPlan(
+            backend=chosen_backend,
+            model_path=Path(chosen_model),
+            n_predict=max(tokens, 1),
+            predicted_energy_joules=energy,
+            predicted_latency_ms=latency,
+            fallback=fallback,
+            caveats=model.caveats(prompt_tokens, tokens),
+        )
+
+    def observe(
+        self,
+        plan: BudgetPlan,
+        prompt_tokens: float,
+        tokens: int,
+        latency_ms: float,
+        energy_joules: Optional[float],
+    ) -> None:
+        self._model(plan.backend, plan.model_path).observe(Observation(
+            backend=plan.backend,
+            prompt_tokens=prompt_tokens,
+            output_tokens=tokens,
+            latency_ms=latency_ms,
+            energy_joules=energy_joules,
+        ))
+
+
+class BudgetGuard:
+    """Live spend of one prompt against its budget.
+
+    ``energy_since(start_ns)`` returns the joules measured since ``start_ns``,
+    or ``None`` when no measurement is available, in which case ``watts`` (the
+    plan's predicted draw) is integrated over the elapsed time instead.
+    ``scale`` converts a simulator's compressed time back to real time.
+    """
+
+    def __init__(
+        self,
+        budget: Budget,
+        energy_since: Optional[Callable[[int], Optional[float]]] = None,
+        watts: Optional[float] = None,
+        scale: float = 1.0,
+    ) -> None:
+        self.budget = budget
+        self.energy_since = energy_since
+        self.watts = watts
+        self.scale = scale
+        self.start_ns = time.monotonic_ns()
+        self.stopped: Optional[str] = None
+        self._first: Optional[Tuple[int, float, float]] = None
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.monotonic_ns() - self.start_ns) / 1e6 * self.scale
+
+    @property
+    def spent_joules(self) -> Optional[float]:
+        measured = self.energy_since(self.start_ns) if self.energy_since else None
+        if measured is not None:
+            return measured * self.scale
+        if self.watts is None:
+            return None
+        return self.watts * self.elapsed_ms / 1000.0
+
+    def check(self, tokens: int) -> Optional[str]:
+        """Outcome to stop with once ``tokens`` are out, or ``None`` to keep going."""
+        if self.stopped:
+            return self.stopped
+        elapsed, spent = self.elapsed_ms, self.spent_joules
+        if tokens and self._first is None:
+            self._first = (tokens, elapsed, spent or 0.0)
+        per_token_ms = per_token_j = 0.0
+        if self._first is not None and tokens > self._first[0]:
+            done = tokens - self._first[0]
+            per_token_ms = (elapsed - self._first[1]) / done
+            per_token_j = ((spent or 0.0) - self._first[2]) / done
+        if spent is not None and self.budget.energy_joules is not None:
+            if spent + per_token_j > self.budget.energy_joules:
+                self.stopped = STOPPED_ENERGY
+        if self.budget.latency_ms is not None and elapsed + per_token_ms > self.budget.latency_ms:
+            self.stopped = self.stopped or STOPPED_LATENCY
+        return self.stopped
+
+    def outcome(self, energy_joules: Optional[float], latency_ms: float) -> str:
+        if self.stopped:
+            return self.stopped
+        over_energy = (
+            energy_joules is not None and self.budget.energy_joules is not None
+            and energy_joules > self.budget.energy_joules
+        )
+        over_latency = self.budget.latency_ms is not None and latency_ms > self.budget.latency_ms
+        return OVER if over_energy or over_latency else WITHIN
+
+
+__all__ = [
+    "Budget",
+    "BudgetGuard",
+    "BudgetPlan",
+    "BudgetPlanner",
+    "Fallback",
+    "OVER",
+    "STOPPED_ENERGY",
+    "STOPPED_LATENCY",
+    "WITHIN",
+]
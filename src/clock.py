@@ -0,0 +1,507 @@
+"""Clock anchors and a shared timebase for every telemetry stream.
+
+Sensors stamp samples with different clocks.  Our CSVs use UTC wall time,
+Intel PowerLog writes local ``HH:MM:SS:mmm`` with no date (the date only lives
+in the file name), and NVML samples are taken against ``time.monotonic``.  A
+fixed timezone offset breaks across DST changes and midnight, and wall time
+itself is slewed by NTP while a session runs.
+
+Whenever sampling starts or stops, :func:`record_anchor` stores a paired
+reading of the wall clock, the monotonic clock and the local UTC offset in
+``data/clock_anchors.jsonl``.  :class:`Timeline` turns those anchors into one
+timebase: monotonic nanoseconds, shifted per boot so that the first anchor of
+each boot lines up with its UTC epoch time.  Wall-clock stamps are mapped onto
+it by interpolating between anchors, which removes wall/monotonic skew; streams
+that carry ``monotonic_ns`` are mapped exactly.  PowerLog rows are unwrapped
+across midnight, converted with the UTC offset in force at the time, and then
+regressed against their ``RDTSC`` counter so that sample spacing comes from
+the TSC instead of millisecond-rounded wall time.
+
+Data recorded before anchors existed still works: with no anchors the timeline
+is plain UTC epoch nanoseconds and local times use the OS timezone rules (or an
+explicit ``default_utc_offset_s``).
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import glob
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+ANCHOR_LOG = Path("data/clock_anchors.jsonl")
+EPOCH = dt.datetime(1970, 1, 1)
+NS_PER_MS = 1_000_000
+NS_PER_S = 1_000_000_000
+NS_PER_DAY = 86_400 * NS_PER_S
+# Anchors whose (wall - monotonic) differ by more than this belong to different boots.
+BOOT_TOLERANCE_NS = 60 * NS_PER_S
+# Reject an RDTSC fit whose residuals exceed PowerLog's millisecond rounding by this much.
+MAX_TSC_RESIDUAL_NS = 5 * NS_PER_MS
+
+POWER_COLUMNS = ("Processor Power_0(Watt)", "power_w")
+# Traces of the simulated backend are ``raw_sim_<backend>_power_<ts>.csv``,
+# next to the real captures; readers leave them out unless asked.
+SIMULATED_TRACE_PREFIX = "raw_sim_"
+
+
+@dataclass
+class ClockAnchor:
+    """Simultaneous wall-clock and monotonic readings."""
+
+    wall_ns: int
+    monotonic_ns: int
+    utc_offset_s: int
+    uncertainty_ns: int = 0
+    label: str = ""
+
+    @property
+    def boot_epoch_ns(self) -> int:
+        return self.wall_ns - self.monotonic_ns
+
+
+def capture_anchor(label: str = "", tries: int = 5) -> ClockAnchor:
+    """Read both clocks, keeping the pair bracketed by the tightest monotonic window."""
+    best: Optional[Tuple[int, int, int]] = None
+    for _ in range(tries):
+        before = time.monotonic_ns()
+        wall = time.time_ns()
+        after = time.monotonic_ns()
+        if best is None or after - before < best[2]:
+            best = (wall, (before + after) // 2, after - before)
+    wall, mono, uncertainty = best
+    return ClockAnchor(
+        wall_ns=wall,
+        monotonic_ns=mono,
+        utc_offset_s=time.localtime(wall // NS_PER_S).tm_gmtoff,
+        uncertainty_ns=uncertainty,
+        label=label,
+    )
+
+
+def record_anchor(label: str = "", path: Path = ANCHOR_LOG) -> ClockAnchor:
+    """Capture an anchor and append it to the anchor log."""
+    anchor = capture_anchor(label)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps(asdict(anchor)) + "\n")
+    return anchor
+
+
+def load_anchors(path: Path = ANCHOR_LOG) -> List[ClockAnchor]:
+    if not path.exists():
+        return []
+    anchors = []
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                anchors.append(ClockAnchor(**json.loads(line)))
+    return anchors
+
+
+class Timeline:
+    """Map wall-clock, local and monotonic readings onto one nanosecond timebase."""
+
+    def __init__(
+        self,
+        anchors: Sequence[ClockAnchor] = (),
+        default_utc_offset_s: Optional[int] = None,
+    ) -> None:
+        self.anchors = sorted(anchors, key=lambda a: a.wall_ns)
+        self.default_utc_offset_s = default_utc_offset_s
+
+        # Each boot keeps the epoch offset of its first anchor so the timebase
+        # stays monotonic within a boot and close to UTC across boots.
+        self._boot_epochs: List[int] = []
+        self._boot_spans: List[Tuple[int, int]] = []
+        knot_timeline = []
+        for anchor in self.anchors:
+            boot = self._boot_of(anchor.boot_epoch_ns)
+            if boot is None:
+                self._boot_epochs.append(anchor.boot_epoch_ns)
+                self._boot_spans.append((anchor.wall_ns, anchor.wall_ns))
+                boot = len(self._boot_epochs) - 1
+            first, _ = self._boot_spans[boot]
+            self._boot_spans[boot] = (first, anchor.wall_ns)
+            knot_timeline.append(anchor.monotonic_ns + self._boot_epochs[boot])
+        self._knot_wall = np.array([a.wall_ns for a in self.anchors], dtype=np.float64)
+        self._knot_timeline = np.array(knot_timeline, dtype=np.float64)
+
+    @classmethod
+    def from_file(
+        cls, path: Path = ANCHOR_LOG, default_utc_offset_s: Optional[int] = None
+    ) -> "Timeline":
+        return cls(load_anchors(path), default_utc_offset_s)
+
+    def _boot_of(self, boot_epoch_ns: int) -> Optional[int]:
+        for index, epoch in enumerate(self._boot_epochs):
+            if abs(epoch - boot_epoch_ns) <= BOOT_TOLERANCE_NS:
+                return index
+        return None
+
+    def anchor(self, label: str) -> Optional[ClockAnchor]:
+        """The most recent anchor carrying ``label``."""
+        for anchor in reversed(self.anchors):
+            if anchor.label == label:
+                return anchor
+        return None
+
+    def from_wall(self, wall_ns: np.ndarray) -> np.ndarray:
+        """Map UTC wall-clock nanoseconds onto the timeline.
+
+        Between anchors the mapping is linear, absorbing clock skew and NTP
+        slew; outside them it extends the nearest anchor with slope 1.
+        """
+        wall = np.asarray(wall_ns, dtype=np.float64)
+        if not len(self.anchors):
+            return wall
+        mapped = np.interp(wall, self._knot_wall, self._knot_timeline)
+        before = wall < self._knot_wall[0]
+        after = wall > self._knot_wall[-1]
+        mapped[before] = self._knot_timeline[0] + (wall[before] - self._knot_wall[0])
+        mapped[after] = self._knot_timeline[-1] + (wall[after] - self._knot_wall[-1])
+        return mapped
+
+    def from_monotonic(self, monotonic_ns: np.ndarray, wall_hint_ns: np.ndarray) -> np.ndarray:
+        """Map monotonic readings onto the timeline.
+
+        ``wall_hint_ns`` (the wall stamp recorded alongside) picks the boot the
+        readings belong to, and is used as-is when there are no anchors.
+        """
+        hints = np.asarray(wall_hint_ns, dtype=np.float64)
+        if not self._boot_epochs:
+            return self.from_wall(hints)
+        mono = np.asarray(monotonic_ns, dtype=np.float64)
+        epochs = np.array(self._boot_epochs, dtype=np.float64)
+        # Samples from a boot have wall - monotonic close to that boot's epoch.
+        boot = np.abs((hints - mono)[:, None] - epochs[None, :]).argmin(axis=1)
+        return mono + epochs[boot]
+
+    def utc_offset_s(self, wall_ns: float) -> int:
+        """UTC offset in force at ``wall_ns``: from the nearest anchor, else OS rules."""
+        if self.anchors:
+            nearest = min(self.anchors, key=lambda a: abs(a.wall_ns - wall_ns))
+            if abs(nearest.wall_ns - wall_ns) <= NS_PER_DAY / 2:
+                return nearest.utc_offset_s
+        if self.default_utc_offset_s is not None:
+            return self.default_utc_offset_s
+        stamp = EPOCH + dt.timedelta(microseconds=wall_ns // 1000)
+        local = stamp.replace(tzinfo=dt.timezone.utc).astimezone()
+        return int(local.utcoffset().total_seconds())
+
+    def local_to_wall(self, local_ns: np.ndarray) -> np.ndarray:
+        """Convert naive local-time nanoseconds to UTC wall nanoseconds, per sample."""
+        local = np.asarray(local_ns, dtype=np.float64)
+        wall = np.full_like(local, np.nan)
+        valid = ~np.isnan(local)
+        guess = local[valid]
+        hour_ns = 3600 * NS_PER_S
+        # Offsets only change on the hour; two passes settle DST edges.
+        for _ in range(2):
+            hours = np.floor(guess / hour_ns)
+            unique, inverse = np.unique(hours, return_inverse=True)
+            offsets = np.array([self.utc_offset_s(h * hour_ns) for h in unique], dtype=np.float64)
+            guess = local[valid] - offsets[inverse] * NS_PER_S
+        wall[valid] = guess
+        return wall
+
+    @staticmethod
+    def to_datetime(timeline_ns: float) -> dt.datetime:
+        """Naive UTC datetime for a timeline value (for reports and exports)."""
+        return EPOCH + dt.timedelta(microseconds=float(timeline_ns) / 1000)
+
+
+def datetime_to_ns(value: dt.datetime) -> int:
+    """Nanoseconds since the epoch for a naive (UTC or local) or aware datetime."""
+    if value.tzinfo is not None:
+        value = value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    delta = value - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * NS_PER_S + delta.microseconds * 1000
+
+
+def parse_iso_ns(value: str) -> float:
+    """UTC ISO timestamp to epoch nanoseconds, NaN when unparsable."""
+    try:
+        return float(datetime_to_ns(dt.datetime.fromisoformat(value.replace("Z", "+00:00"))))
+    except (AttributeError, TypeError, ValueError):
+        return float("nan")
+
+
+def parse_iso_ns_array(values: Sequence) -> np.ndarray:
+    """Vectorized :func:`parse_iso_ns` for naive UTC stamps; anything else takes the slow path."""
+    text = np.char.strip(np.asarray(values, dtype=str))
+    if text.size == 0:
+        return np.empty(0)
+    has_zone = (np.char.find(text, "+") >= 0) | (np.char.rfind(text, "-") >= 19)
+    if not has_zone.any():
+        try:
+            stamps = np.char.rstrip(text, "Z").astype("datetime64[ns]")
+        except ValueError:
+            pass
+        else:
+            parsed = stamps.astype(np.int64).astype(np.float64)
+            parsed[np.isnat(stamps)] = np.nan
+            return parsed
+    return np.array([parse_iso_ns(str(v)) for v in values], dtype=np.float64)
+
+
+def parse_gadget_tod(value: str) -> float:
+    """PowerLog ``HH:MM:SS:mmm`` to nanoseconds since local midnight, NaN when unparsable."""
+    try:
+        hours, minutes, seconds, millis = (int(part) for part in str(value).split(":"))
+    except ValueError:
+        return float("nan")
+    return float(((hours * 60 + minutes) * 60 + seconds) * NS_PER_S + millis * NS_PER_MS)
+
+
+def parse_gadget_tod_array(values: Sequence) -> np.ndarray:
+    """Vectorized :func:`parse_gadget_tod` for the fixed-width ``HH:MM:SS:mmm`` form."""
+    text = np.char.strip(np.asarray(values, dtype=str))
+    parsed = np.full(text.shape, np.nan)
+    fixed = (np.char.str_len(text) == 12) & (np.char.count(text, ":") == 3)
+    try:
+        packed = np.char.replace(text[fixed], ":", "").astype(np.int64)
+    except ValueError:
+        fixed[:] = False
+    else:
+        hours, minutes = packed // 10_000_000, packed // 100_000 % 100
+        seconds, millis = packed // 1000 % 100, packed % 1000
+        parsed[fixed] = ((hours * 60 + minutes) * 60 + seconds) * NS_PER_S + millis * NS_PER_MS
+    # Trailing summary lines and unpadded times are rare; parse them one by one.
+    for index in np.flatnonzero(~fixed):
+        parsed[index] = parse_gadget_tod(text[index])
+    return parsed
+
+
+def powerlog_file_reference(path: Path, timeline: Timeline) -> Tuple[dt.datetime, bool]:
+    """Local time near the first (or, for legacy files, last) sample of a PowerLog file.
+
+    New raw files have ``<name>:start`` anchors.  Older ones only carry the
+    local time the file was saved at, which is just after the last sample.
+    """
+    start = timeline.anchor(f"{path.name}:start")
+    if start is not None:
+        local_ns = start.wall_ns + start.utc_offset_s * NS_PER_S
+        return Timeline.to_datetime(local_ns), False
+    stamp = "_".join(path.stem.split("_")[3:5])
+    return dt.datetime.strptime(stamp, "%Y%m%d_%H%M%S"), True
+
+
+def unwrap_local_ns(
+    tod_ns: np.ndarray, reference: dt.datetime, reference_is_last: bool
+) -> np.ndarray:
+    """Attach dates to times of day, rolling over at midnight.
+
+    The date is chosen so the first (or last) valid sample lands closest to
+    ``reference``.
+    """
+    tod = np.asarray(tod_ns, dtype=np.float64)
+    valid = ~np.isnan(tod)
+    local = np.full_like(tod, np.nan)
+    if not valid.any():
+        return local
+    values = tod[valid]
+    wraps = np.concatenate([[0], np.cumsum(np.diff(values) < -NS_PER_DAY / 2)])
+    values = values + wraps * NS_PER_DAY
+    ref_ns = datetime_to_ns(reference)
+    midnight = ref_ns - ref_ns % NS_PER_DAY
+    pivot = values[-1] if reference_is_last else values[0]
+    day = min((-1, 0, 1), key=lambda d: abs(midnight + d * NS_PER_DAY + pivot - ref_ns))
+    local[valid] = values + midnight + day * NS_PER_DAY
+    return local
+
+
+def refine_with_counter(
+    wall_ns: np.ndarray, counter: np.ndarray
+) -> Tuple[np.ndarray, Optional[float]]:
+    """Replace ms-rounded wall stamps with a linear fit against a free-running counter.
+
+    Returns the refined stamps and the counter frequency in Hz (``None`` when
+    the counter is missing, non-monotonic or does not fit the wall clock).
+    """
+    wall = np.asarray(wall_ns, dtype=np.float64)
+    ticks = np.asarray(counter, dtype=np.float64)
+    ok = ~np.isnan(wall) & ~np.isnan(ticks)
+    if ok.sum() < 3 or np.any(np.diff(ticks[ok]) <= 0):
+        return wall, None
+    origin = ticks[ok][0]
+    slope, intercept = np.polyfit(ticks[ok] - origin, wall[ok], 1)
+    if slope <= 0:
+        return wall, None
+    fitted = intercept + slope * (ticks - origin)
+    if np.abs(fitted[ok] - wall[ok]).max() > MAX_TSC_RESIDUAL_NS:
+        return wall, None
+    refined = np.where(ok, fitted, wall)
+    return refined, NS_PER_S / slope
+
+
+def _column(columns: Mapping[str, Sequence], name: str) -> Optional[np.ndarray]:
+    if name not in columns:
+        return None
+    values = np.asarray(columns[name])
+    try:
+        return values.astype(np.float64)
+    except (TypeError, ValueError):
+        return np.array([_to_float(value) for value in values], dtype=np.float64)
+
+
+def _to_float(value: object) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class StreamAligner:
+    """Stamp successive chunks of one sensor stream on the timeline.
+
+    ``columns`` is anything indexable by column name (a DataFrame or a dict of
+    lists).  Handles PowerLog exports (``System Time`` + ``RDTSC``), streams
+    with a ``monotonic_ns`` column, and plain UTC ``timestamp`` columns.
+    PowerLog chunks are dated relative to the previous chunk, so a capture
+    read in pieces still rolls over midnight correctly.
+    """
+
+    def __init__(self, source: Path, timeline: Timeline) -> None:
+        self.source = Path(source)
+        self.timeline = timeline
+        self._last_local_ns: Optional[float] = None
+
+    def __call__(self, columns: Mapping[str, Sequence]) -> np.ndarray:
+        if "System Time" in columns:
+            return self._powerlog(columns)
+        if "timestamp" not in columns:
+            raise ValueError(
+                f"{self.source} has neither a 'timestamp' nor a 'System Time' column"
+            )
+        wall = parse_iso_ns_array(columns["timestamp"])
+        aligned = self.timeline.from_wall(wall)
+        mono = _column(columns, "monotonic_ns")
+        if mono is not None:
+            has_mono = ~np.isnan(mono) & ~np.isnan(wall)
+            if has_mono.any():
+                aligned[has_mono] = self.timeline.from_monotonic(mono[has_mono], wall[has_mono])
+        return aligned
+
+    def _powerlog(self, columns: Mapping[str, Sequence]) -> np.ndarray:
+        tod = parse_gadget_tod_array(columns["System Time"])
+        if self._last_local_ns is None:
+            reference, is_last = powerlog_file_reference(self.source, self.timeline)
+        else:
+            reference, is_last = Timeline.to_datetime(self._last_local_ns), False
+        local = unwrap_local_ns(tod, reference, is_last)
+        if (~np.isnan(local)).any():
+            self._last_local_ns = float(np.nanmax(local))
+        wall = self.timeline.local_to_wall(local)
+        counter = _column(columns, "RDTSC")
+        if counter is None:
+            counter = _column(columns, "Elapsed Time (sec)")
+        if counter is not None:
+            wall, _ = refine_with_counter(wall, counter)
+        return self.timeline.from_wall(wall)
+
+
+def stream_timeline_ns(
+    columns: Mapping[str, Sequence], source: Path, timeline: Timeline
+) -> np.ndarray:
+    """Timeline nanoseconds for every row of a whole sensor stream (see :class:`StreamAligner`)."""
+    return StreamAligner(source, timeline)(columns)
+
+
+def read_columns(path: Path) -> Dict[str, List[str]]:
+    """Read a CSV into a dict of column lists (no pandas needed)."""
+    with Path(path).open(newline="", encoding="utf-8") as handle:
+        reader = csv.DictReader(handle)
+        columns: Dict[str, List[str]] = {name: [] for name in reader.fieldnames or []}
+        for row in reader:
+            for name in columns:
+                columns[name].append(row.get(name) or "")
+    return columns
+
+
+def read_power_trace(path: Path, timeline: Timeline) -> Tuple[np.ndarray, np.ndarray]:
+    """Timeline nanoseconds and watts for a raw CPU or GPU power file, sorted by time."""
+    columns = read_columns(path)
+    power_column = next((name for name in POWER_COLUMNS if name in columns), None)
+    if power_column is None:
+        return np.empty(0), np.empty(0)
+    stamps = stream_timeline_ns(columns, path, timeline)
+    watts = _column(columns, power_column)
+    ok = ~np.isnan(stamps) & ~np.isnan(watts)
+    order = np.argsort(stamps[ok], kind="stable")
+    return stamps[ok][order], watts[ok][order]
+
+
+def raw_trace_name(backend: str, stamp: str, simulated: bool = False) -> str:
+    """File name of a raw power trace for ``backend`` started at ``stamp``."""
+    prefix = SIMULATED_TRACE_PREFIX if simulated else "raw_"
+    return f"{prefix}{backend}_power_{stamp}.csv"
+
+
+def is_simulated_trace(path: object) -> bool:
+    return Path(str(path)).name.startswith(SIMULATED_TRACE_PREFIX)
+
+
+def raw_trace_files(
+    directory: Path, backend: str = "*", include_simulated: bool = False
+) -> List[str]:
+    """Raw power traces of ``backend`` in ``directory``, sorted by name.
+
+    Simulated traces (see :data:`SIMULATED_TRACE_PREFIX`) are only included
+    with ``include_simulated``.
+    """
+    files = [
+        path for path in glob.glob(str(directory / raw_trace_name(backend, "*")))
+        if not is_simulated_trace(path)
+    ]
+    if include_simulated:
+        files += glob.glob(str(directory / raw_trace_name(backend, "*", simulated=True)))
+    return sorted(files)
+
+
+def run_window_ns(row: Mapping[str, str], timeline: Timeline) -> Optional[Tuple[float, float]]:
+    """``(start, end)`` of a latency row on the timeline.
+
+    Latency rows are written when the prompt finishes, so the row's stamp is
+    the end of the window and ``latency_ms`` reaches back to its start.
+    """
+    wall = parse_iso_ns(row.get("timestamp", ""))
+    if np.isnan(wall):
+        return None
+    mono = _to_float(row.get("monotonic_ns"))
+    if np.isnan(mono):
+        end = float(timeline.from_wall(np.array([wall]))[0])
+    else:
+        end = float(timeline.from_monotonic(np.array([mono]), np.array([wall]))[0])
+    latency_ms = _to_float(row.get("latency_ms"))
+    if np.isnan(latency_ms):
+        latency_ms = 0.0
+    return end - latency_ms * NS_PER_MS, end
+
+
+__all__ = [
+    "ANCHOR_LOG",
+    "ClockAnchor",
+    "SIMULATED_TRACE_PREFIX",
+    "StreamAligner",
+    "Timeline",
+    "capture_anchor",
+    "is_simulated_trace",
+    "load_anchors",
+    "parse_iso_ns",
+    "parse_iso_ns_array",
+    "read_columns",
+    "raw_trace_files",
+    "raw_trace_name",
+    "read_power_trace",
+    "record_anchor",
+    "refine_with_counter",
+    "run_window_ns",
+    "stream_timeline_ns",
+]
@@ -4,11 +4,16 @@ import time
 import random
 import sys
 import logging
-import glob
+import math
 import csv
 import os
 import datetime as dt
-from flask import Flask, request, jsonify
+from pathlib import Path
+from flask import Flask, Response, request, jsonify
+
+from clock import raw_trace_files
+from metrics import CONTENT_TYPE, QUEUE_DEPTH, REGISTRY, record_request
+from router import EnergyAwareRouter, Observation, estimate_tokens
 
 # Configure logging
 logging.basicConfig(
@@ -19,11 +24,24 @@ logging.basicConfig(
 logger = logging.getLogger("EnergyDemo")
 
 app = Flask(__name__)
+_router = None
+
+def get_router():
+    """Builds the energy-aware router from telemetry on first use."""
+    global _router
+    if _router is None:
+        _router = EnergyAwareRouter.from_telemetry()
+        logger.info("Router fitted from telemetry history.")
+    return _router
 
-def get_latest_trace_file(backend):
-    """Finds the most recent CSV file for the given backend."""
-    search_pattern = f"data/raw_{backend}_power_*.csv"
-    files = glob.glob(search_pattern)
+def publish_queue_depth():
+    """Mirrors the router's live reservations into the queue-depth gauge."""
+    for backend, depth in get_router().in_flight.items():
+        QUEUE_DEPTH.labels(backend).set(depth)
+
+def get_latest_trace_file(backend, include_simulated=False):
+    """Finds the most recent CSV file for the given backend (simulated ones only if asked)."""
+    files = raw_trace_files(Path("data"), backend, include_simulated)
     if not files: return None
     files.sort(key=os.path.getmtime, reverse=True)
     return files[0]
@@ -159,9 +177,10 @@ def history():
 @app.route('/latest_trace', methods=['GET'])
 def latest_trace():
     backend = request.args.get("backend", "gpu")
+    include_simulated = request.args.get("simulated", "0").lower() in ("1", "true", "yes")
     logger.info(f"Received request for latest {backend} trace.")
     
-    filepath = get_latest_trace_file(backend)
+    filepath = get_latest_trace_file(backend, include_simulated)
     
     if not filepath:
         return jsonify({"error": "No data found", "message": "Run experiments first."}), 404
@@ -184,6 +203,105 @@ def latest_trace():
     time.sleep(0.5) # UI Delay
     return jsonify(response_data)
 
+@app.route('/route', methods=['POST'])
+def route():
+    """Picks the CPU or GPU backend for a request.
+
+    Body: {"prompt": str | "prompt_tokens": int, "n_predict": int, "slo_ms": float,
+           "reserve": bool}
+
+    With "reserve": true the request counts toward the backend's queue until
+    its /route/feedback or /route/release (or the reservation expires); pass
+    back the returned "reservation" token.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        if "prompt_tokens" in payload:
+            prompt_tokens = float(payload["prompt_tokens"])
+        else:
+            prompt_tokens = estimate_tokens(str(payload.get("prompt", "")))
+        n_predict = float(payload.get("n_predict", 128))
+        slo_ms = None if payload.get("slo_ms") is None else float(payload["slo_ms"])
+        for name, value in (("prompt_tokens", prompt_tokens), ("n_predict", n_predict),
+                            ("slo_ms", slo_ms)):
+            if value is not None and not (math.isfinite(value) and value >= 0):
+                raise ValueError(f"{name} must be a non-negative number, got {value}")
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({"error": "Invalid route request", "message": str(e)}), 400
+
+    decision = get_router().route(
+        prompt_tokens,
+        n_predict,
+        slo_ms,
+        reserve=bool(payload.get("reserve", False)),
+    )
+    logger.info(
+        f"Routed request ({prompt_tokens:.0f} tok, n_predict={n_predict:.0f}) -> {decision.backend}"
+    )
+    publish_queue_depth()
+    return jsonify({
+        "backend": decision.backend,
+        "prompt_tokens": prompt_tokens,
+        "predicted_latency_ms": decision.predicted_latency_ms,
+        "predicted_energy_joules": decision.predicted_energy_joules,
+        "meets_slo": decision.meets_slo,
+        "candidates": decision.candidates,
+        "reservation": decision.reservation,
+        "caveats": decision.caveats,
+    })
+
+@app.route('/route/feedback', methods=['POST'])
+def route_feedback():
+    """Reports a finished request so the router can refine its cost model.
+
+    Optional "run_id", "model" and "ttft_ms" label and extend its /metrics entry;
+    "reservation" ends the reservation taken by /route.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        ttft_ms = None if payload.get("ttft_ms") is None else float(payload["ttft_ms"])
+        energy = payload.get("energy_joules")
+        obs = Observation(
+            backend=payload["backend"],
+            prompt_tokens=float(payload["prompt_tokens"]),
+            output_tokens=float(payload.get("tokens_generated", 0)),
+            latency_ms=float(payload["latency_ms"]),
+            energy_joules=None if energy is None else float(energy),
+        )
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({"error": "Invalid feedback", "message": str(e)}), 400
+    if obs.backend not in get_router().models:
+        return jsonify({"error": "Unknown backend", "message": obs.backend}), 400
+    get_router().observe(obs, payload.get("reservation"))
+    publish_queue_depth()
+    record_request(
+        obs.backend, payload.get("run_id", "serve"), payload.get("model", ""),
+        obs.latency_ms / 1000.0, int(obs.output_tokens), obs.energy_joules,
+        ttft_s=None if ttft_ms is None else ttft_ms / 1000.0,
+    )
+    return jsonify({"status": "ok", "in_flight": get_router().in_flight})
+
+@app.route('/route/release', methods=['POST'])
+def route_release():
+    """Ends a reservation without feedback, e.g. for a failed or timed-out request.
+
+    Body: {"reservation": str}
+    """
+    payload = request.get_json(silent=True) or {}
+    reservation = payload.get("reservation")
+    if not reservation:
+        return jsonify({"error": "Invalid release", "message": "reservation is required"}), 400
+    backend = get_router().release(str(reservation))
+    publish_queue_depth()
+    return jsonify({"status": "ok", "backend": backend, "in_flight": get_router().in_flight})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """OpenMetrics exposition for Prometheus-compatible scrapers."""
+    if _router is not None:
+        publish_queue_depth()
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/status', methods=['GET'])
 def status():
     return jsonify({"status": "idle", "step": 0, "step_name": "Ready", "progress": 0.0})
@@ -0,0 +1,300 @@
+"""CPU frequency and GPU power-limit settings applied around a run.
+
+Energy per token on consumer hardware depends heavily on DVFS: a lower clock
+or power limit is often much cheaper per token for a small latency cost.  A
+run (or ``defaults``) can carry a ``frequency`` block, and a top-level
+``sweep: {frequencies: [...]}`` repeats the runs once per entry::
+
+    sweep:
+      frequencies:
+        - {cpu_governor: powersave}
+        - {cpu_max_mhz: 2000}
+        - {gpu_power_limit_w: 120}
+        - {gpu_clocks_mhz: [1200, 1200]}   # lock graphics clocks (min, max)
+
+CPU settings go through cpufreq sysfs (``scaling_governor``,
+``scaling_max_freq``), GPU settings through NVML.  Both need root/admin.
+Before anything is changed the current values are snapshotted and written
+to a restore journal (``data/.dvfs_restore.json``); the values are put back
+when the run ends, on error, on Ctrl-C or SIGTERM, and, after a hard crash,
+at the start of the next session.  What was requested and what the hardware
+reported afterwards are logged per run to ``data/run_settings.csv``.
+
+``CpuFreq`` takes the sysfs root and ``GpuClocks`` the NVML module, so both
+can be exercised against a fake sysfs tree and a mocked ``pynvml``.
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import signal
+import sys
+import threading
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+SYSFS_CPU = Path("/sys/devices/system/cpu")
+RESTORE_JOURNAL = Path("data/.dvfs_restore.json")
+GPU_FIELDS = ("gpu_power_limit_w", "gpu_clocks_mhz")
+
+
+@dataclass
+class FrequencySetting:
+    """DVFS knobs for one run (``frequency`` block); unset fields are left alone."""
+
+    cpu_governor: Optional[str] = None
+    cpu_max_mhz: Optional[int] = None
+    gpu_power_limit_w: Optional[float] = None
+    gpu_clocks_mhz: Optional[List[int]] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, object]]) -> Optional["FrequencySetting"]:
+        if not data:
+            return None
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown frequency settings: {', '.join(sorted(unknown))}")
+        setting = cls(**data)  # type: ignore[arg-type]
+        clocks = setting.gpu_clocks_mhz
+        if clocks is not None:
+            clocks = [int(clocks)] * 2 if isinstance(clocks, (int, float)) else list(clocks)
+            if len(clocks) != 2 or clocks[0] > clocks[1]:
+                raise ValueError("gpu_clocks_mhz must be a clock or a [min, max] pair")
+            setting.gpu_clocks_mhz = clocks
+        return setting
+
+    @property
+    def touches_cpu(self) -> bool:
+        return self.cpu_governor is not None or self.cpu_max_mhz is not None
+
+    @property
+    def touches_gpu(self) -> bool:
+        return any(getattr(self, name) is not None for name in GPU_FIELDS)
+
+    def label(self) -> str:
+        """Short run-id suffix, e.g. ``powersave-cpu2000mhz-gpu120w``."""
+        parts = []
+        if self.cpu_governor:
+            parts.append(self.cpu_governor)
+        if self.cpu_max_mhz:
+            parts.append(f"cpu{self.cpu_max_mhz}mhz")
+        if self.gpu_power_limit_w:
+            parts.append(f"gpu{self.gpu_power_limit_w:g}w")
+        if self.gpu_clocks_mhz:
+            low, high = self.gpu_clocks_mhz
+            parts.append(f"gpuclk{low}" if low == high else f"gpuclk{low}-{high}")
+        return "-".join(parts) or "default"
+
+
+class CpuFreq:
+    """cpufreq sysfs access for every CPU policy under ``root``."""
+
+    def __init__(self, root: Path = SYSFS_CPU) -> None:
+        self.root = root
+
+    def _files(self, name: str) -> List[Path]:
+        return sorted(self.root.glob(f"cpu[0-9]*/cpufreq/{name}"))
+
+    def snapshot(self) -> Dict[str, str]:
+        """Current governor and max frequency of every CPU, keyed by sysfs path."""
+        return {
+            str(path): path.read_text(encoding="utf-8").strip()
+            for name in ("scaling_governor", "scaling_max_freq")
+            for path in self._files(name)
+        }
+
+    def apply(self, setting: FrequencySetting) -> None:
+        if not self._files("scaling_governor"):
+            raise RuntimeError(f"No cpufreq policies under {self.root}; cannot change CPU clocks")
+        if setting.cpu_governor is not None:
+            for path in self._files("scaling_governor"):
+                available = path.with_name("scaling_available_governors")
+                if available.exists() and setting.cpu_governor not in available.read_text().split():
+                    raise ValueError(
+                        f"Governor '{setting.cpu_governor}' is not available "
+                        f"({available.read_text().strip()})"
+                    )
+                _write(path, setting.cpu_governor)
+        if setting.cpu_max_mhz is not None:
+            khz = setting.cpu_max_mhz * 1000
+            for path in self._files("scaling_max_freq"):
+                limits = [path.with_name(n) for n in ("cpuinfo_min_freq", "cpuinfo_max_freq")]
+                if all(p.exists() for p in limits):
+                    low, high = (int(p.read_text()) for p in limits)
+                    khz = min(max(khz, low), high)
+                _write(path, str(khz))
+
+    def restore(self, snapshot: Dict[str, str]) -> None:
+        # Governors first: some drivers reset scaling_max_freq on a governor change.
+        for path, value in sorted(snapshot.items(), key=lambda kv: "max_freq" in kv[0]):
+            _write(Path(path), value)
+
+    def report(self) -> Dict[str, object]:
+        governors = {p.read_text().strip() for p in self._files("scaling_governor")}
+        max_freqs = {int(p.read_text()) for p in self._files("scaling_max_freq")}
+        return {
+            "cpu_governor_actual": ",".join(sorted(governors)) or None,
+            "cpu_max_mhz_actual": max(max_freqs) // 1000 if max_freqs else None,
+        }
+
+
+class GpuClocks:
+    """NVML power-limit and clock-lock access for one GPU.
+
+    ``nvml`` is the ``pynvml`` module (or a stand-in with the same functions).
+    """
+
+    def __init__(self, nvml=None, index: int = 0) -> None:
+        if nvml is None:
+            import pynvml as nvml
+        self.nvml = nvml
+        nvml.nvmlInit()
+        self.handle = nvml.nvmlDeviceGetHandleByIndex(index)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"power_limit_mw": self.nvml.nvmlDeviceGetPowerManagementLimit(self.handle)}
+
+    def apply(self, setting: FrequencySetting) -> None:
+        if setting.gpu_power_limit_w is not None:
+            low, high = self.nvml.nvmlDeviceGetPowerManagementLimitConstraints(self.handle)
+            milliwatts = int(setting.gpu_power_limit_w * 1000)
+            if not low <= milliwatts <= high:
+                raise ValueError(
+                    f"GPU power limit {setting.gpu_power_limit_w:g} W is outside "
+                    f"{low / 1000:g}-{high / 1000:g} W"
+                )
+            self.nvml.nvmlDeviceSetPowerManagementLimit(self.handle, milliwatts)
+        if setting.gpu_clocks_mhz is not None:
+            self.nvml.nvmlDeviceSetGpuLockedClocks(self.handle, *setting.gpu_clocks_mhz)
+
+    def restore(self, snapshot: Dict[str, object]) -> None:
+        self.nvml.nvmlDeviceSetPowerManagementLimit(self.handle, snapshot["power_limit_mw"])
+        # Clock locks are always released: NVML cannot report a lock set by someone else.
+        self.nvml.nvmlDeviceResetGpuLockedClocks(self.handle)
+
+    def report(self) -> Dict[str, object]:
+        limit = self.nvml.nvmlDeviceGetPowerManagementLimit(self.handle)
+        return {"gpu_power_limit_w_actual": limit / 1000.0}
+
+    def close(self) -> None:
+        self.nvml.nvmlShutdown()
+
+
+def _write(path: Path, value: str) -> None:
+    try:
+        path.write_text(value, encoding="utf-8")
+    except PermissionError as exc:
+        raise PermissionError(
+            f"Cannot write {path}; frequency settings need root (or a udev rule for cpufreq)"
+        ) from exc
+
+
+def _journal_write(journal: Path, entry: Dict[str, object]) -> None:
+    journal.parent.mkdir(parents=True, exist_ok=True)
+    journal.write_text(json.dumps(entry, indent=2), encoding="utf-8")
+
+
+def recover(
+    journal: Path = RESTORE_JOURNAL, cpu: Optional[CpuFreq] = None, gpu: Optional[GpuClocks] = None
+) -> bool:
+    """Restore settings left behind by a session that died mid-run."""
+    if not journal.exists():
+        return False
+    entry = json.loads(journal.read_text(encoding="utf-8"))
+    print(f"♻️ Restoring frequency settings left by run {entry.get('run_id')}")
+    if entry.get("cpu"):
+        (cpu or CpuFreq(Path(entry.get("cpu_root", SYSFS_CPU)))).restore(entry["cpu"])
+    if entry.get("gpu"):
+        (gpu or GpuClocks()).restore(entry["gpu"])
+    journal.unlink()
+    return True
+
+
+@contextlib.contextmanager
+def _sigterm_as_exit() -> Iterator[None]:
+    """Turn SIGTERM into SystemExit so ``finally`` blocks run (main thread only)."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+@contextlib.contextmanager
+def applied(
+    setting: Optional[FrequencySetting],
+    run_id: str = "",
+    cpu: Optional[CpuFreq] = None,
+    gpu: Optional[GpuClocks] = None,
+    journal: Path = RESTORE_JOURNAL,
+) -> Iterator[Dict[str, object]]:
+    """Apply ``setting`` for the duration of the block and always put the old values back.
+
+    Yields what the hardware reports once the setting is in place.
+    """
+    if setting is None or not (setting.touches_cpu or setting.touches_gpu):
+        yield {}
+        return
+    owns_gpu = setting.touches_gpu and gpu is None
+    cpu = (cpu or CpuFreq()) if setting.touches_cpu else None
+    gpu = (gpu or GpuClocks()) if setting.touches_gpu else None
+    entry: Dict[str, object] = {"run_id": run_id}
+    if cpu is not None:
+        entry.update(cpu=cpu.snapshot(), cpu_root=str(cpu.root))
+    if gpu is not None:
+        entry["gpu"] = gpu.snapshot()
+    _journal_write(journal, entry)
+    try:
+        with _sigterm_as_exit():
+            if cpu is not None:
+                cpu.apply(setting)
+            if gpu is not None:
+                gpu.apply(setting)
+            state: Dict[str, object] = {}
+            for device in (cpu, gpu):
+                if device is not None:
+                    state.update(device.report())
+            print(f"⚡ Applied {setting.label()} for {run_id}: {state}")
+            yield state
+    finally:
+        if cpu is not None:
+            cpu.restore(entry["cpu"])
+        if gpu is not None:
+            gpu.restore(entry["gpu"])
+            if owns_gpu:
+                gpu.close()
+        journal.unlink(missing_ok=True)
+        print(f"↩️ Restored frequency settings after {run_id}")
+
+
+def expand_frequency_sweep(runs: Sequence, settings: Sequence[FrequencySetting]) -> List:
+    """Repeat every run (a ``RunSpec``-like dataclass) once per setting.
+
+    GPU-only settings are skipped for CPU runs, which they would not affect;
+    an empty entry (``{}``) keeps a baseline run at the current settings.
+    """
+    expanded = []
+    for run in runs:
+        for setting in settings:
+            if setting.touches_gpu and not setting.touches_cpu and run.backend != "gpu":
+                continue
+            expanded.append(replace(
+                run, run_id=f"{run.run_id}-{setting.label()}", frequency=setting
+            ))
+    return expanded
+
+
+__all__ = [
+    "CpuFreq",
+    "FrequencySetting",
+    "GpuClocks",
+    "RESTORE_JOURNAL",
+    "applied",
+    "expand_frequency_sweep",
+    "recover",
+]
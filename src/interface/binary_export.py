@@ -0,0 +1,175 @@
+"""Compact binary export for the GameMaker dashboard.
+
+The JSON export repeats every key per run and spells out 100 floats per trace,
+and the dashboard has to ``json_parse`` the whole file at once.  This layout is
+read directly with GameMaker's ``buffer_read``: a fixed header, a fixed-size
+run table, a NUL-terminated string table and packed float32 traces.  All
+values are little-endian.
+
+Single-file layout (``gamemaker_export.bin``)::
+
+    header      32 bytes   magic "EAEX", version, sizes and offsets (HEADER)
+    run table   32 bytes   per run (RUN_RECORD)
+    strings     NUL-terminated UTF-8 run/prompt ids
+    traces      run_count * trace_len float32
+
+Paged layout (a directory) keeps the same header, run table and strings in
+``index.bin`` (``traces_offset`` is 0 and ``page_size`` is set) and stores the
+traces for runs ``[p * page_size, (p + 1) * page_size)`` in ``page_<p>.bin``
+behind a 16-byte PAGE_HEADER, so the dashboard can load only the pages in view.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+MAGIC = b"EAEX"
+PAGE_MAGIC = b"EAPG"
+VERSION = 1
+
+# magic, version, header_size, run_count, trace_len, strings_offset, strings_size,
+# traces_offset, page_size
+HEADER = struct.Struct("<4sHHIIIIII")
+# run_id offset, prompt_id offset, backend code, padding, latency_ms, energy_joules, trace index
+RUN_RECORD = struct.Struct("<IIB3xddI")
+# magic, version, padding, first_run, run_count
+PAGE_HEADER = struct.Struct("<4sH2xII")
+
+BACKEND_CODES = {"cpu": 0, "gpu": 1}
+BACKEND_NAMES = {code: name for name, code in BACKEND_CODES.items()}
+UNKNOWN_BACKEND = 255
+
+
+def _trace_length(runs: Sequence[Dict]) -> int:
+    lengths = {len(run["power_trace"]) for run in runs}
+    if len(lengths) > 1:
+        raise ValueError(f"All traces must have the same length, got {sorted(lengths)}")
+    return lengths.pop() if lengths else 0
+
+
+def _index_sections(runs: Sequence[Dict]) -> tuple:
+    strings = bytearray()
+    offsets: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        if text not in offsets:
+            offsets[text] = len(strings)
+            strings.extend(text.encode("utf-8") + b"\0")
+        return offsets[text]
+
+    table = bytearray()
+    for index, run in enumerate(runs):
+        table += RUN_RECORD.pack(
+            intern(str(run["run_id"])),
+            intern(str(run.get("prompt_id", ""))),
+            BACKEND_CODES.get(run["backend"], UNKNOWN_BACKEND),
+            float(run["latency_ms"] or 0.0),
+            float(run["energy_joules"] or 0.0),
+            index,
+        )
+    return bytes(table), bytes(strings)
+
+
+def _pack_traces(runs: Sequence[Dict], trace_len: int) -> bytes:
+    flat: List[float] = [value for run in runs for value in run["power_trace"]]
+    return struct.pack(f"<{len(flat)}f", *flat) if trace_len else b""
+
+
+def _atomic_write(path: Path, payload: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(payload)
+    os.replace(tmp, path)
+
+
+def encode(runs: Sequence[Dict], include_traces: bool = True, page_size: int = 0) -> bytes:
+    trace_len = _trace_length(runs)
+    table, strings = _index_sections(runs)
+    strings_offset = HEADER.size + len(table)
+    traces_offset = strings_offset + len(strings) if include_traces else 0
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        HEADER.size,
+        len(runs),
+        trace_len,
+        strings_offset,
+        len(strings),
+        traces_offset,
+        page_size,
+    )
+    payload = header + table + strings
+    if include_traces:
+        payload += _pack_traces(runs, trace_len)
+    return payload
+
+
+def write_binary(runs: Sequence[Dict], path: Path) -> None:
+    """Write all runs and traces into a single binary file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _atomic_write(path, encode(runs))
+
+
+def write_paged(runs: Sequence[Dict], directory: Path, page_size: int = 64) -> int:
+    """Write ``index.bin`` plus one trace page per ``page_size`` runs; returns the page count."""
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+    directory.mkdir(parents=True, exist_ok=True)
+    trace_len = _trace_length(runs)
+    pages = 0
+    for first in range(0, len(runs), page_size):
+        chunk = runs[first:first + page_size]
+        header = PAGE_HEADER.pack(PAGE_MAGIC, VERSION, first, len(chunk))
+        _atomic_write(directory / f"page_{pages:04d}.bin", header + _pack_traces(chunk, trace_len))
+        pages += 1
+    for stale in directory.glob("page_*.bin"):
+        if int(stale.stem.split("_")[1]) >= pages:
+            stale.unlink()
+    # Write the index last so a reader never sees it pointing at missing pages.
+    _atomic_write(directory / "index.bin", encode(runs, include_traces=False, page_size=page_size))
+    return pages
+
+
+def read_binary(path: Path) -> List[Dict]:
+    """Decode a single-file or paged export back into run dictionaries."""
+    index_path = path / "index.bin" if path.is_dir() else path
+    data = index_path.read_bytes()
+    (magic, version, header_size, run_count, trace_len, strings_offset, strings_size,
+     traces_offset, page_size) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{index_path} is not a dashboard export (magic {magic!r})")
+    if version > VERSION:
+        raise ValueError(f"{index_path} uses format version {version}, newer than {VERSION}")
+
+    strings = data[strings_offset:strings_offset + strings_size]
+
+    def string_at(offset: int) -> str:
+        return strings[offset:strings.index(b"\0", offset)].decode("utf-8")
+
+    def traces_for(index: int) -> List[float]:
+        if traces_offset:
+            start = traces_offset + index * trace_len * 4
+            return list(struct.unpack_from(f"<{trace_len}f", data, start))
+        page = path / f"page_{index // page_size:04d}.bin"
+        page_data = page.read_bytes()
+        start = PAGE_HEADER.size + (index % page_size) * trace_len * 4
+        return list(struct.unpack_from(f"<{trace_len}f", page_data, start))
+
+    runs: List[Dict] = []
+    for i in range(run_count):
+        run_off, prompt_off, backend, latency, energy, trace_index = RUN_RECORD.unpack_from(
+            data, header_size + i * RUN_RECORD.size
+        )
+        runs.append({
+            "run_id": string_at(run_off),
+            "prompt_id": string_at(prompt_off),
+            "backend": BACKEND_NAMES.get(backend, "unknown"),
+            "latency_ms": latency,
+            "energy_joules": energy,
+            "power_trace": traces_for(trace_index),
+        })
+    return runs
+
+
+__all__ = ["MAGIC", "VERSION", "encode", "read_binary", "write_binary", "write_paged"]
@@ -1,28 +1,41 @@
-import json
+import argparse
 import csv
-import datetime as dt
-import glob
+import json
 import os
-import math
+import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, List, Optional, Tuple
+
+from clock import (
+    SIMULATED_TRACE_PREFIX,
+    Timeline,
+    raw_trace_files,
+    read_power_trace,
+    run_window_ns,
+)
+from interface.binary_export import write_binary, write_paged
+from router import SIMULATED_NOTE
+from tracing import TRACER, traced
 
 # Configuration
 DATA_DIR = Path("data")
 LATENCY_FILE = DATA_DIR / "latency_results.csv"
 OUTPUT_FILE = DATA_DIR / "gamemaker_export.json"
+BINARY_OUTPUT_FILE = DATA_DIR / "gamemaker_export.bin"
+PAGED_OUTPUT_DIR = DATA_DIR / "gamemaker_export_pages"
+# Already-exported runs, each with the raw trace files (and their mtimes) it was
+# built from, and the time range of every raw trace file.
+MANIFEST_FILE = DATA_DIR / "gamemaker_export.manifest.json"
+MANIFEST_VERSION = 3
+ANCHOR_FILE = DATA_DIR / "clock_anchors.jsonl"
 
-# Timezone offset (Intel Gadget is Local, Python is UTC)
-# User metadata says -05:00.
-LOCAL_TZ_OFFSET = dt.timedelta(hours=-5)
 
-def parse_iso_utc(t_str: str) -> dt.datetime:
-    """Parse ISO format timestamp (UTC)."""
-    # Python 3.11+ supports fromisoformat with Z, but let's be safe
-    return dt.datetime.fromisoformat(t_str)
+@traced()
+def load_latency_runs(timeline: Timeline, include_simulated: bool = False) -> List[Dict]:
+    """Load all runs from latency_results.csv with their window on the shared timeline.
 
-def load_latency_runs() -> List[Dict]:
-    """Load all runs from latency_results.csv."""
+    Dry-run rows (simulated backend) are skipped unless ``include_simulated``.
+    """
     runs = []
     if not LATENCY_FILE.exists():
         print(f"Warning: {LATENCY_FILE} not found.")
@@ -31,99 +44,37 @@ def load_latency_runs() -> List[Dict]:
     with open(LATENCY_FILE, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
+            if not include_simulated and SIMULATED_NOTE in (row.get("notes") or ""):
+                continue
             try:
-                start_utc = parse_iso_utc(row["timestamp"])
-                # Convert to naive local time for matching with Intel Gadget
-                start_local = start_utc + LOCAL_TZ_OFFSET
-                
-                latency_ms = float(row["latency_ms"]) if row["latency_ms"] else 0.0
-                end_local = start_local + dt.timedelta(milliseconds=latency_ms)
-
+                window = run_window_ns(row, timeline)
+                if window is None:
+                    continue
                 runs.append({
+                    "timestamp": row["timestamp"],
                     "run_id": row["run_id"],
                     "backend": row["backend"],
                     "prompt_id": row["prompt_id"],
-                    "latency_ms": latency_ms,
+                    "latency_ms": float(row["latency_ms"]) if row["latency_ms"] else 0.0,
                     "energy_joules": float(row["energy_joules"]) if row["energy_joules"] else 0.0,
-                    "start_local": start_local,
-                    "end_local": end_local,
+                    "start_ns": window[0],
+                    "end_ns": window[1],
                     "power_trace": []  # To be filled
                 })
             except ValueError:
                 continue
     return runs
 
-def parse_gadget_time(date_part: str, t_str: str) -> Optional[dt.datetime]:
-    """Parse Intel Gadget time (HH:MM:SS:mmm) + Date."""
-    try:
-        parts = t_str.split(":")
-        if len(parts) == 4:
-            h, m, s, ms = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3])
-            base_date = dt.datetime.strptime(date_part, "%Y%m%d")
-            return base_date.replace(hour=h, minute=m, second=s, microsecond=ms*1000)
-    except:
-        pass
-    return None
-
-def find_cpu_trace(run: Dict) -> List[float]:
-    """Find and extract CPU power trace for a specific run window."""
-    files = sorted(glob.glob(str(DATA_DIR / "raw_cpu_power_*.csv")))
+def find_trace(run: Dict, files: List[str], timeline: Timeline) -> List[float]:
+    """Collect the power samples of ``files`` that fall inside the run window."""
     best_trace = []
-    
     for fpath in files:
         try:
-            filename = os.path.basename(fpath)
-            # raw_cpu_power_20251123_233510.csv
-            parts = filename.split("_")
-            if len(parts) < 4: continue
-            date_part = parts[2] # 20251123
-            
-            with open(fpath, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                # Check headers
-                if "System Time" not in reader.fieldnames or "Processor Power_0(Watt)" not in reader.fieldnames:
-                    continue
-                
-                for row in reader:
-                    t_val = parse_gadget_time(date_part, row["System Time"])
-                    if t_val and run["start_local"] <= t_val <= run["end_local"]:
-                        try:
-                            val = float(row["Processor Power_0(Watt)"])
-                            best_trace.append(val)
-                        except ValueError:
-                            pass
-        except Exception:
+            stamps, watts = read_power_trace(Path(fpath), timeline)
+        except (OSError, ValueError):
             continue
-            
-    return best_trace
-
-def find_gpu_trace(run: Dict) -> List[float]:
-    """Find and extract GPU power trace."""
-    files = sorted(glob.glob(str(DATA_DIR / "raw_gpu_power_*.csv")))
-    best_trace = []
-    
-    # Convert run times back to UTC for GPU matching
-    start_utc = run["start_local"] - LOCAL_TZ_OFFSET
-    end_utc = run["end_local"] - LOCAL_TZ_OFFSET
-    
-    for fpath in files:
-        try:
-            with open(fpath, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                if "timestamp" not in reader.fieldnames or "power_w" not in reader.fieldnames:
-                    continue
-                
-                for row in reader:
-                    try:
-                        t_val = parse_iso_utc(row["timestamp"])
-                        if start_utc <= t_val <= end_utc:
-                            val = float(row["power_w"])
-                            best_trace.append(val)
-                    except ValueError:
-                        pass
-        except Exception:
-            continue
-            
+        inside = (stamps >= run["start_ns"]) & (stamps <= run["end_ns"])
+        best_trace.extend(watts[inside].tolist())
     return best_trace
 
 def resample_trace(trace: List[float], target_points: int = 100) -> List[float]:
@@ -151,44 +102,278 @@ def resample_trace(trace: List[float], target_points: int = 100) -> List[float]:
         
     return resampled
 
-def main():
-    print("Loading runs...")
-    runs = load_latency_runs()
-    print(f"Found {len(runs)} runs.")
-    
-    export_data = {"runs": []}
-    
+def run_key(run: Dict) -> str:
+    """Identity of an exported run: (run_id, prompt_id, timestamp)."""
+    return f"{run['run_id']}|{run['prompt_id']}|{run['timestamp']}"
+
+def raw_file_range(fpath: str, timeline: Timeline) -> Optional[Tuple[float, float]]:
+    """Return the (first, last) sample time of a raw trace file on the shared timeline."""
+    try:
+        stamps, _ = read_power_trace(Path(fpath), timeline)
+    except (OSError, ValueError):
+        return None
+    if not len(stamps):
+        return None
+    return float(stamps[0]), float(stamps[-1])
+
+@traced()
+def scan_raw_files(
+    previous: Dict[str, Dict], timeline: Timeline, include_simulated: bool = False
+) -> Tuple[Dict[str, Dict], bool]:
+    """Stat raw trace files, re-reading time ranges only for new or modified ones."""
+    current: Dict[str, Dict] = {}
+    changed = False
+    for fpath in raw_trace_files(DATA_DIR, include_simulated=include_simulated):
+        mtime_ns = os.stat(fpath).st_mtime_ns
+        known = previous.get(fpath)
+        if known and known["mtime_ns"] == mtime_ns:
+            current[fpath] = known
+            continue
+        changed = True
+        span = raw_file_range(fpath, timeline)
+        current[fpath] = {
+            "mtime_ns": mtime_ns,
+            "start": span[0] if span else None,
+            "end": span[1] if span else None,
+        }
+    if set(previous) - set(current):
+        changed = True
+    return current, changed
+
+def candidate_files(run: Dict, raw_files: Dict[str, Dict]) -> List[str]:
+    """Raw files of the run's backend whose sample range overlaps the run window."""
+    prefixes = (f"raw_{run['backend']}_power_", f"{SIMULATED_TRACE_PREFIX}{run['backend']}_power_")
+    return [
+        fpath for fpath, info in raw_files.items()
+        if os.path.basename(fpath).startswith(prefixes)
+        and info["start"] is not None
+        and info["start"] <= run["end_ns"] and info["end"] >= run["start_ns"]
+    ]
+
+@traced()
+def build_export_run(run: Dict, sources: Dict[str, int], timeline: Timeline) -> Dict:
+    """Extract, fall back and resample the power trace of one run.
+
+    ``sources`` maps the candidate raw files to their ``mtime_ns``; it is kept
+    with the run so a later change to any of them rebuilds it.
+    """
+    trace = find_trace(run, list(sources), timeline)
+
+    fallback = not trace
+    if fallback:
+        print(f"  ⚠️ No power trace found for {run['run_id']}")
+        # Fallback: flat line
+        if run["energy_joules"] and run["latency_ms"]:
+            avg_watts = run["energy_joules"] / (run["latency_ms"] / 1000.0)
+            trace = [avg_watts] * 10
+        else:
+            trace = [0.0] * 10
+
+    return {
+        "run_id": run["run_id"],
+        "prompt_id": run["prompt_id"],
+        "timestamp": run["timestamp"],
+        "backend": run["backend"],
+        "latency_ms": run["latency_ms"],
+        "energy_joules": run["energy_joules"],
+        "power_trace": resample_trace(trace, 100),
+        "sources": sources,
+    }
+
+def load_manifest(include_simulated: bool = False) -> Dict:
+    """The export manifest, or a fresh one if it was built with other settings."""
+    if MANIFEST_FILE.exists():
+        try:
+            manifest = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+            if (
+                manifest.get("version") == MANIFEST_VERSION
+                and manifest.get("include_simulated", False) == include_simulated
+            ):
+                return manifest
+        except json.JSONDecodeError:
+            print(f"⚠️ Ignoring unreadable {MANIFEST_FILE}")
+    return {
+        "version": MANIFEST_VERSION,
+        "include_simulated": include_simulated,
+        "raw_files": {},
+        "runs": {},
+    }
+
+def save_manifest(manifest: Dict) -> None:
+    tmp = MANIFEST_FILE.with_name(MANIFEST_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, MANIFEST_FILE)
+
+def outputs_missing(fmt: str) -> bool:
+    """True when a requested export format has not been written yet."""
+    expected = {
+        "json": [OUTPUT_FILE],
+        "binary": [BINARY_OUTPUT_FILE],
+        "paged": [PAGED_OUTPUT_DIR / "index.bin"],
+    }
+    wanted = expected if fmt == "all" else {fmt: expected[fmt]}
+    return any(not path.exists() for paths in wanted.values() for path in paths)
+
+@traced()
+def update_export(manifest: Dict, fmt: str, page_size: int, timeline: Timeline) -> int:
+    """Process only latency rows and raw files not yet in the manifest; returns rows processed.
+
+    When raw files change, a row is rebuilt if the set of raw files overlapping
+    it, or the mtime of any of them, differs from what it was built from: this
+    picks up traces that were still being written (``--watch``) as well as
+    traces that appear after a row was exported with a fallback trace.
+    """
+    include_simulated = manifest.get("include_simulated", False)
+    raw_files, raw_changed = scan_raw_files(manifest["raw_files"], timeline, include_simulated)
+    exported: Dict[str, Dict] = manifest["runs"]
+    runs = load_latency_runs(timeline, include_simulated)
+
+    processed = 0
     for run in runs:
+        key = run_key(run)
+        previous = exported.get(key)
+        if previous and not raw_changed:
+            continue
+        sources = {f: raw_files[f]["mtime_ns"] for f in candidate_files(run, raw_files)}
+        if previous and previous.get("sources") == sources:
+            continue
         print(f"Processing {run['run_id']} ({run['backend']})...")
-        
-        trace = []
-        if run["backend"] == "cpu":
-            trace = find_cpu_trace(run)
-        elif run["backend"] == "gpu":
-            trace = find_gpu_trace(run)
-            
-        if not trace:
-            print(f"  ⚠️ No power trace found for {run['run_id']}")
-            # Fallback: flat line
-            if run["energy_joules"] and run["latency_ms"]:
-                avg_watts = run["energy_joules"] / (run["latency_ms"] / 1000.0)
-                trace = [avg_watts] * 10
-            else:
-                trace = [0.0] * 10
-        
-        smooth_trace = resample_trace(trace, 100)
-        
-        export_data["runs"].append({
-            "run_id": run["run_id"],
-            "backend": run["backend"],
-            "latency_ms": run["latency_ms"],
-            "energy_joules": run["energy_joules"],
-            "power_trace": smooth_trace
-        })
-        
-    print(f"Writing {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(export_data, f, indent=2)
+        exported[key] = build_export_run(run, sources, timeline)
+        processed += 1
+
+    live_keys = {run_key(run) for run in runs}
+    removed = [key for key in exported if key not in live_keys]
+    for key in removed:
+        del exported[key]
+
+    manifest["raw_files"] = raw_files
+    if processed or removed or outputs_missing(fmt):
+        ordered = sorted(exported.values(), key=lambda r: r["timestamp"])
+        hidden = ("timestamp", "sources")
+        export_data = {"runs": [{k: v for k, v in r.items() if k not in hidden} for r in ordered]}
+        write_export(export_data, fmt, page_size)
+    save_manifest(manifest)
+    return processed
+
+def watch(
+    fmt: str,
+    page_size: int,
+    interval: float,
+    offset_s: Optional[int],
+    include_simulated: bool = False,
+) -> None:
+    """Poll the latency log and raw trace files and re-export whenever they change."""
+    manifest = load_manifest(include_simulated)
+    last_seen = None
+    print(f"Watching {DATA_DIR} every {interval:.1f}s (Ctrl+C to stop)...")
+    try:
+        while True:
+            raw = raw_trace_files(DATA_DIR, include_simulated=include_simulated)
+            paths = [LATENCY_FILE, ANCHOR_FILE] + sorted(Path(p) for p in raw)
+            snapshot = tuple((str(p), p.stat().st_mtime_ns) for p in paths if p.exists())
+            if snapshot != last_seen:
+                timeline = Timeline.from_file(ANCHOR_FILE, offset_s)
+                processed = update_export(manifest, fmt, page_size, timeline)
+                if processed:
+                    print(f"Exported {processed} new/updated runs.")
+                last_seen = snapshot
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export telemetry runs for the GameMaker dashboard."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "binary", "paged", "all"],
+        default="all",
+        help="json: gamemaker_export.json; binary: packed gamemaker_export.bin; "
+             "paged: index + trace pages the dashboard can load on demand.",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=64,
+        help="Runs per trace page for --format paged.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the export manifest and rebuild every run from scratch.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and update the export whenever new telemetry lands.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Polling interval in seconds for --watch.",
+    )
+    parser.add_argument(
+        "--utc-offset-hours",
+        type=float,
+        default=None,
+        help="Local UTC offset for PowerLog files recorded without clock anchors "
+             "(default: this machine's timezone rules).",
+    )
+    parser.add_argument(
+        "--include-simulated",
+        action="store_true",
+        help="Also export dry-run rows and their simulated (raw_sim_*) power traces.",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        type=Path,
+        const=True,
+        help="Record a span trace of the export (Chrome trace JSON; default data/traces/).",
+    )
+    return parser.parse_args()
+
+@traced()
+def write_export(export_data: Dict, fmt: str, page_size: int) -> None:
+    """Write the export in the requested format(s)."""
+    if fmt in ("json", "all"):
+        print(f"Writing {OUTPUT_FILE}...")
+        tmp = OUTPUT_FILE.with_name(OUTPUT_FILE.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(export_data, f, separators=(",", ":"))
+        os.replace(tmp, OUTPUT_FILE)
+    if fmt in ("binary", "all"):
+        print(f"Writing {BINARY_OUTPUT_FILE}...")
+        write_binary(export_data["runs"], BINARY_OUTPUT_FILE)
+    if fmt in ("paged", "all"):
+        pages = write_paged(export_data["runs"], PAGED_OUTPUT_DIR, page_size)
+        print(f"Wrote {pages} trace pages to {PAGED_OUTPUT_DIR}")
+
+def main():
+    args = parse_args()
+    if args.trace:
+        TRACER.enable(None if args.trace is True else args.trace)
+    try:
+        export(args)
+    finally:
+        TRACER.write()
+
+def export(args: argparse.Namespace) -> None:
+    offset_s = None if args.utc_offset_hours is None else int(args.utc_offset_hours * 3600)
+    if args.full and MANIFEST_FILE.exists():
+        MANIFEST_FILE.unlink()
+    if args.watch:
+        watch(args.format, args.page_size, args.interval, offset_s, args.include_simulated)
+        return
+
+    print("Loading runs...")
+    timeline = Timeline.from_file(ANCHOR_FILE, offset_s)
+    processed = update_export(
+        load_manifest(args.include_simulated), args.format, args.page_size, timeline
+    )
+    print(f"Processed {processed} new/updated runs.")
     print("Done.")
 
 if __name__ == "__main__":
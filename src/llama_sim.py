@@ -0,0 +1,618 @@
+"""Simulated llama.cpp backend for dry runs, load tests and GPU-less machines.
+
+A dry run used to sleep 50 ms and return nothing, which exercised none of the
+scheduling, streaming, token-counting or energy-integration paths.  This
+module stands in for llama.cpp instead:
+
+* a request is planned as load -> prefill -> decode phases whose durations
+  come from per-backend coefficients (load ms, prefill ms/prompt token, decode
+  ms/output token) fitted from ``latency_results.csv`` with the router's cost
+  model, scaled for ``--threads`` (Amdahl fit over the ``-tN`` runs) and
+  ``--gpu-layers`` (linear fit over the ``-lN`` runs);
+* tokens are emitted on that schedule, one word per token, with log-normal
+  jitter; concurrent requests on one backend share it (processor sharing);
+* every phase draws a synthetic power level calibrated so that energy per
+  request matches the measured history, and the phases are turned into a
+  sampled trace in the NVML raw-file format the rest of the pipeline reads.
+
+``speed`` divides every duration, so a 7 s request takes 7/speed s of wall
+time; energies shrink by the same factor, keeping traces self-consistent.
+Everything reported per request (``timings``, the HTTP ``energy_joules``, and
+the latency and energy rows a dry run logs) is scaled back to model time.
+
+It runs in-process (``workload.run_prompts`` with ``dry_run=True``), as a
+``llama-cli`` stand-in script (``--llama-binary src/llama_sim.py``), or as a
+``llama-server``-compatible HTTP endpoint::
+
+    python src/llama_sim.py --serve --backend gpu --port 8080 \\
+        --power-trace data/raw_sim_gpu_power_serve.csv
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime as dt
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from router import BackendCostModel, Observation, estimate_tokens, load_observations
+
+# TinyLlama-1.1B has 22 transformer layers.
+N_LAYERS = 22
+# Placement the fitted coefficients are normalized to when a run does not say.
+REFERENCE_THREADS = 4
+SAMPLE_INTERVAL_MS = 100.0
+# Dry runs exercise the pipeline, not the clock: simulate 20x faster than real time.
+DRY_RUN_SPEED = 20.0
+# Share of a request spent decoding when the history cannot separate the phases.
+DECODE_SHARE = 0.6
+# Upper bound on the prefill share, so a noisy prompt-length slope cannot eat the request.
+MAX_PREFILL_SHARE = 0.25
+# Phase power relative to decode; the absolute level is calibrated from history.
+PHASE_POWER_RATIO = {"load": 0.6, "prefill": 1.3, "decode": 1.0}
+
+VOCABULARY = (
+    "the model answers with a short and plausible sentence about energy latency tokens "
+    "power budget hardware inference prompt cache memory bandwidth thread layer batch "
+    "quantization efficiency measurement result value system request response"
+).split()
+
+THREAD_RE = re.compile(r"-t(\d+)\b")
+LAYER_RE = re.compile(r"-l(\d+)\b")
+
+
+@dataclass
+class BackendProfile:
+    """Timing and power coefficients of one simulated backend."""
+
+    load_ms: float
+    prefill_ms_per_token: float
+    decode_ms_per_token: float
+    idle_w: float
+    decode_w: float
+    # Amdahl serial fraction for --threads, and relative latency change per
+    # fraction of layers offloaded beyond ``reference_offload``.
+    serial_fraction: float = 0.5
+    offload_slope: float = 0.0
+    reference_offload: float = 0.0
+    jitter: float = 0.05
+    output_tokens: List[float] = field(default_factory=list)
+
+    def phase_watts(self, phase: str) -> float:
+        return self.decode_w * PHASE_POWER_RATIO[phase]
+
+    def scale(self, threads: Optional[int], gpu_layers: Optional[int]) -> float:
+        """Latency multiplier of a placement relative to the reference one."""
+        s = self.serial_fraction
+        n = max(threads or REFERENCE_THREADS, 1)
+        factor = (s + (1 - s) / n) / (s + (1 - s) / REFERENCE_THREADS)
+        offload = self.reference_offload if gpu_layers is None else min(gpu_layers / N_LAYERS, 1.0)
+        return factor * max(0.1, 1 + self.offload_slope * (offload - self.reference_offload))
+
+
+DEFAULT_PROFILES = {
+    "cpu": BackendProfile(
+        load_ms=1500.0, prefill_ms_per_token=8.0, decode_ms_per_token=180.0,
+        idle_w=6.0, decode_w=22.0, serial_fraction=0.7,
+    ),
+    "gpu": BackendProfile(
+        load_ms=2500.0, prefill_ms_per_token=1.5, decode_ms_per_token=120.0,
+        idle_w=18.0, decode_w=32.0, serial_fraction=0.9,
+        offload_slope=-0.4, reference_offload=1.0,
+    ),
+}
+
+
+def run_placement(run_id: str) -> Tuple[Optional[int], Optional[int]]:
+    """``(threads, gpu_layers)`` encoded in ablation run ids such as ``cpu-t4``/``gpu-l11``."""
+    threads = THREAD_RE.search(run_id)
+    layers = LAYER_RE.search(run_id)
+    return (
+        int(threads.group(1)) if threads else None,
+        int(layers.group(1)) if layers else None,
+    )
+
+
+def _fit_line(x: Sequence[float], y: Sequence[float]) -> Optional[Tuple[float, float]]:
+    """Least-squares ``y = a + b * x`` over group means; needs two distinct x."""
+    if len(set(x)) < 2:
+        return None
+    design = np.column_stack([np.ones(len(x)), np.asarray(x, dtype=float)])
+    (a, b), *_ = np.linalg.lstsq(design, np.asarray(y, dtype=float), rcond=None)
+    return float(a), float(b)
+
+
+def _group_means(pairs: Sequence[Tuple[float, float]]) -> Tuple[List[float], List[float]]:
+    groups: Dict[float, List[float]] = {}
+    for key, value in pairs:
+        groups.setdefault(key, []).append(value)
+    keys = sorted(groups)
+    return keys, [float(np.mean(groups[k])) for k in keys]
+
+
+def fit_profile(observations: Sequence[Observation], base: BackendProfile) -> BackendProfile:
+    """Refit ``base`` to one backend's measurements; keeps defaults where data is thin."""
+    profile = replace(base, output_tokens=[o.output_tokens for o in observations
+                                           if o.output_tokens > 0])
+    if len(observations) < 3:
+        return profile
+    placements = [run_placement(o.run_id) for o in observations]
+
+    # Threads: mean latency L(n) = a + b / n  ->  serial fraction a / (a + b).
+    by_threads = _group_means([(1.0 / t, o.latency_ms)
+                               for o, (t, _) in zip(observations, placements) if t])
+    line = _fit_line(*by_threads)
+    if line and sum(line) > 0:
+        profile.serial_fraction = float(np.clip(line[0] / sum(line), 0.02, 1.0))
+    # Offload: L(f) = a + b * f, relative to the latency at the reference offload.
+    by_layers = _group_means([(min(layers / N_LAYERS, 1.0), o.latency_ms)
+                              for o, (_, layers) in zip(observations, placements)
+                              if layers is not None])
+    line = _fit_line(*by_layers)
+    if line:
+        at_reference = line[0] + line[1] * profile.reference_offload
+        if at_reference > 0:
+            profile.offload_slope = float(np.clip(line[1] / at_reference, -0.9, 2.0))
+
+    # Phase costs at the reference placement.
+    normalized = [
+        replace(o, latency_ms=o.latency_ms / profile.scale(threads, layers))
+        for o, (threads, layers) in zip(observations, placements)
+    ]
+    latency = np.array([o.latency_ms for o in normalized])
+    mean_latency = float(latency.mean())
+    mean_prompt = float(np.mean([o.prompt_tokens for o in normalized])) or 1.0
+    mean_output = float(np.mean([o.output_tokens for o in normalized])) or 1.0
+    model = BackendCostModel()
+    model.fit(normalized)
+    prefill = max(float(model.latency.theta[1]), 0.0)
+    decode = max(float(model.latency.theta[2]), 0.0)
+    if decode <= 0 or decode * mean_output > mean_latency:
+        decode = DECODE_SHARE * mean_latency / mean_output
+    prefill = min(prefill, MAX_PREFILL_SHARE * mean_latency / mean_prompt)
+    profile.prefill_ms_per_token = prefill
+    profile.decode_ms_per_token = decode
+    profile.load_ms = max(mean_latency - decode * mean_output - prefill * mean_prompt, 0.0)
+    profile.jitter = float(np.clip(latency.std() / mean_latency, 0.01, 0.3))
+
+    # Power: scale the phase levels so a typical request uses the measured energy.
+    watts = [o.energy_joules / (o.latency_ms / 1000.0) for o in observations
+             if o.energy_joules and o.latency_ms > 0]
+    if watts:
+        weighted = (
+            PHASE_POWER_RATIO["load"] * profile.load_ms
+            + PHASE_POWER_RATIO["prefill"] * prefill * mean_prompt
+            + PHASE_POWER_RATIO["decode"] * decode * mean_output
+        )
+        if weighted > 0:
+            profile.decode_w = float(np.median(watts)) * mean_latency / weighted
+    return profile
+
+
+def fit_profiles(
+    latency_path: Path = Path("data/latency_results.csv"),
+    power_path: Path = Path("data/power_logs.csv"),
+) -> Dict[str, BackendProfile]:
+    observations = load_observations(latency_path, power_path)
+    return {
+        backend: fit_profile([o for o in observations if o.backend == backend], base)
+        for backend, base in DEFAULT_PROFILES.items()
+    }
+
+
+@dataclass
+class Phase:
+    """One phase of a simulated request on the monotonic clock."""
+
+    name: str
+    start_ns: int
+    end_ns: int
+    watts: float
+
+
+@dataclass
+class SimResult:
+    """Output of one simulated request, in the shapes llama.cpp would report."""
+
+    text: str
+    prompt_tokens: int
+    tokens: int
+    backend: str
+    idle_w: float
+    phases: List[Phase] = field(default_factory=list)
+
+    def phase_ms(self, name: str) -> float:
+        return sum((p.end_ns - p.start_ns) / 1e6 for p in self.phases if p.name == name)
+
+    @property
+    def energy_joules(self) -> float:
+        return sum((p.end_ns - p.start_ns) / 1e9 * p.watts for p in self.phases)
+
+    def timings(self, speed: float = 1.0) -> Dict[str, float]:
+        """llama-server style ``timings`` in simulated (unscaled) milliseconds."""
+        prompt_ms = self.phase_ms("prefill") * speed
+        predicted_ms = self.phase_ms("decode") * speed
+        return {
+            "load_ms": round(self.phase_ms("load") * speed, 3),
+            "prompt_n": self.prompt_tokens,
+            "prompt_ms": round(prompt_ms, 3),
+            "predicted_n": self.tokens,
+            "predicted_ms": round(predicted_ms, 3),
+            "predicted_per_second": round(self.tokens / predicted_ms * 1000, 3)
+            if predicted_ms else 0.0,
+        }
+
+    def power_samples(
+        self, interval_ms: float = SAMPLE_INTERVAL_MS, noise: float = 0.02, seed: int = 0
+    ) -> List[Tuple[int, float]]:
+        """``(monotonic_ns, watts)`` samples of the request's power signal."""
+        if not self.phases:
+            return []
+        rng = random.Random(seed)
+        start, end = self.phases[0].start_ns, self.phases[-1].end_ns
+        step = max(int(interval_ms * 1e6), 1)
+        stamps = list(range(start, end, step)) + [end]
+        samples = []
+        index = 0
+        for stamp in stamps:
+            while index < len(self.phases) - 1 and stamp >= self.phases[index].end_ns:
+                index += 1
+            watts = self.phases[index].watts * (1 + rng.gauss(0.0, noise))
+            samples.append((stamp, max(watts, 0.0)))
+        return samples
+
+
+class SimulatedLlama:
+    """In-process stand-in for llama.cpp with a matching synthetic power signal."""
+
+    def __init__(
+        self,
+        profiles: Optional[Dict[str, BackendProfile]] = None,
+        speed: float = 1.0,
+        seed: Optional[int] = None,
+        resident: bool = False,
+    ) -> None:
+        self.profiles = profiles or dict(DEFAULT_PROFILES)
+        self.speed = speed
+        # llama-server keeps the model loaded; llama-cli reloads it per invocation.
+        self.resident = resident
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[str, float]] = {}
+        self._next_id = 0
+
+    @classmethod
+    def from_telemetry(
+        cls,
+        latency_path: Path = Path("data/latency_results.csv"),
+        power_path: Path = Path("data/power_logs.csv"),
+        speed: float = 1.0,
+        seed: Optional[int] = None,
+    ) -> "SimulatedLlama":
+        return cls(fit_profiles(latency_path, power_path), speed=speed, seed=seed)
+
+    def _profile(self, backend: str) -> BackendProfile:
+        if backend not in self.profiles:
+            raise ValueError(f"No simulated profile for backend '{backend}'")
+        return self.profiles[backend]
+
+    def power_w(self, backend: str) -> float:
+        """Instantaneous power of ``backend``: idle plus every active request's draw."""
+        profile = self._profile(backend)
+        with self._lock:
+            extra = sum(w - profile.idle_w for b, w in self._active.values() if b == backend)
+        return profile.idle_w + max(extra, 0.0)
+
+    def _concurrency(self, backend: str) -> int:
+        with self._lock:
+            return max(1, sum(1 for b, _ in self._active.values() if b == backend))
+
+    def stream(
+        self,
+        prompt: str,
+        n_predict: int = 128,
+        backend: str = "cpu",
+        threads: Optional[int] = None,
+        gpu_layers: Optional[int] = None,
+        result: Optional[SimResult] = None,
+    ) -> Iterator[str]:
+        """Yield generated tokens in real time; ``result`` is filled in as phases finish."""
+        profile = self._profile(backend)
+        with self._lock:
+            request = self._next_id
+            self._next_id += 1
+            draws = self.rng.random(), self.rng.gauss(0.0, 1.0)
+            seed = self.rng.randrange(2**31)
+        token_rng = random.Random(seed)
+        scale = profile.scale(threads, gpu_layers) * math.exp(profile.jitter * draws[1])
+        prompt_tokens = estimate_tokens(prompt)
+        if profile.output_tokens:
+            length = profile.output_tokens[int(draws[0] * len(profile.output_tokens))]
+            n_tokens = max(1, min(n_predict, int(round(length))))
+        else:
+            n_tokens = max(1, n_predict)
+        result = result if result is not None else SimResult("", 0, 0, backend, profile.idle_w)
+        result.prompt_tokens = prompt_tokens
+        result.backend = backend
+        result.idle_w = profile.idle_w
+
+        def phase(name: str, duration_ms: float) -> None:
+            watts = profile.phase_watts(name)
+            with self._lock:
+                self._active[request] = (backend, watts)
+            start = time.monotonic_ns()
+            time.sleep(max(duration_ms, 0.0) / 1000.0 / self.speed)
+            result.phases.append(Phase(name, start, time.monotonic_ns(), watts))
+
+        try:
+            if not self.resident:
+                phase("load", profile.load_ms * scale)
+            phase("prefill", profile.prefill_ms_per_token * prompt_tokens * scale)
+            watts = profile.phase_watts("decode")
+            with self._lock:
+                self._active[request] = (backend, watts)
+            start = time.monotonic_ns()
+            words: List[str] = []
+            for _ in range(n_tokens):
+                # Processor sharing: co-running requests on one backend slow each other down.
+                delay = profile.decode_ms_per_token * scale * self._concurrency(backend)
+                time.sleep(delay / 1000.0 / self.speed)
+                word = token_rng.choice(VOCABULARY)
+                words.append(word)
+                result.tokens = len(words)
+                yield word
+            result.phases.append(Phase("decode", start, time.monotonic_ns(), watts))
+            result.text = " ".join(words)
+        finally:
+            with self._lock:
+                self._active.pop(request, None)
+
+    def complete(
+        self,
+        prompt: str,
+        n_predict: int = 128,
+        backend: str = "cpu",
+        threads: Optional[int] = None,
+        gpu_layers: Optional[int] = None,
+    ) -> SimResult:
+        result = SimResult("", 0, 0, backend, 0.0)
+        for _ in self.stream(prompt, n_predict, backend, threads, gpu_layers, result):
+            pass
+        return result
+
+
+def llama_timing_lines(result: SimResult, speed: float = 1.0) -> List[str]:
+    """The ``llama_perf_context_print`` summary llama-cli writes to stderr."""
+    t = result.timings(speed)
+    prompt_rate = t["prompt_n"] / t["prompt_ms"] * 1000 if t["prompt_ms"] else 0.0
+    decode_per_token = t["predicted_ms"] / t["predicted_n"] if t["predicted_n"] else 0.0
+    total = t["load_ms"] + t["prompt_ms"] + t["predicted_ms"]
+    prefix = "llama_perf_context_print:"
+    return [
+        f"{prefix}        load time = {t['load_ms']:10.2f} ms",
+        f"{prefix} prompt eval time = {t['prompt_ms']:10.2f} ms / {t['prompt_n']:5d} tokens "
+        f"({t['prompt_ms'] / max(t['prompt_n'], 1):8.2f} ms per token, "
+        f"{prompt_rate:8.2f} tokens per second)",
+        f"{prefix}        eval time = {t['predicted_ms']:10.2f} ms / {t['predicted_n']:5d} runs   "
+        f"({decode_per_token:8.2f} ms per token, "
+        f"{t['predicted_per_second']:8.2f} tokens per second)",
+        f"{prefix}       total time = {total:10.2f} ms / "
+        f"{t['prompt_n'] + t['predicted_n']:5d} tokens",
+    ]
+
+
+def write_power_trace(samples: Sequence[Tuple[int, float]], path: Path) -> None:
+    """Write samples in the NVML raw-file format (``timestamp``, ``monotonic_ns``, ``power_w``)."""
+    wall_ns, mono_ns = time.time_ns(), time.monotonic_ns()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["timestamp", "monotonic_ns", "power_w", "temperature_c", "throttled"])
+        for stamp, watts in samples:
+            wall = dt.datetime.utcfromtimestamp((wall_ns - (mono_ns - stamp)) / 1e9)
+            writer.writerow(
+                [wall.isoformat(timespec="milliseconds"), stamp, round(watts, 3), "", 0]
+            )
+
+
+class PowerTraceWriter(threading.Thread):
+    """Background sampler that appends the simulated backend's power to a trace file."""
+
+    def __init__(self, sim: SimulatedLlama, backend: str, path: Path,
+                 interval_ms: float = SAMPLE_INTERVAL_MS) -> None:
+        super().__init__(daemon=True)
+        self.sim, self.backend, self.path, self.interval_ms = sim, backend, path, interval_ms
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        new = not self.path.exists()
+        with self.path.open("a", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            if new:
+                writer.writerow(["timestamp", "monotonic_ns", "power_w", "temperature_c",
+                                 "throttled"])
+            while not self.stopped.wait(self.interval_ms / 1000.0):
+                writer.writerow([
+                    dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+                    time.monotonic_ns(),
+                    round(self.sim.power_w(self.backend), 3),
+                    "",
+                    0,
+                ])
+                handle.flush()
+
+
+def make_handler(sim: SimulatedLlama, backend: str, threads: Optional[int],
+                 gpu_layers: Optional[int]):
+    """Request handler implementing llama-server's ``/completion`` and ``/health``."""
+    # Imported here: the harness imports this module for dry runs, not to serve.
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args) -> None:  # noqa: A002
+            pass
+
+        def _json(self, status: int, payload: Dict[str, object]) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path == "/health":
+                self._json(200, {"status": "ok"})
+            elif self.path == "/power":
+                self._json(200, {"backend": backend, "power_w": round(sim.power_w(backend), 3)})
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:  # noqa: N802
+            if self.path not in ("/completion", "/completions"):
+                self._json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                self._json(400, {"error": "invalid JSON"})
+                return
+            prompt = str(request.get("prompt", ""))
+            n_predict = int(request.get("n_predict", 128))
+            if n_predict < 0:
+                n_predict = 128
+            result = SimResult("", 0, 0, backend, 0.0)
+            tokens = sim.stream(prompt, n_predict, backend, threads, gpu_layers, result)
+            if not request.get("stream"):
+                for _ in tokens:
+                    pass
+                self._json(200, {
+                    "content": result.text,
+                    "tokens_predicted": result.tokens,
+                    "tokens_evaluated": result.prompt_tokens,
+                    "stop": True,
+                    "timings": result.timings(sim.speed),
+                    "energy_joules": round(result.energy_joules * sim.speed, 6),
+                })
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for token in tokens:
+                event = {"content": " " + token, "stop": False}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            final = {
+                "content": "",
+                "stop": True,
+                "tokens_predicted": result.tokens,
+                "tokens_evaluated": result.prompt_tokens,
+                "timings": result.timings(sim.speed),
+            }
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+
+    return Handler
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    # llama-cli compatible flags; anything else llama-cli accepts is ignored.
+    parser.add_argument("-m", "--model", default="simulated.gguf")
+    parser.add_argument("-p", "--prompt", default="")
+    parser.add_argument("-n", "--n-predict", type=int, default=128)
+    parser.add_argument("-t", "--threads", type=int)
+    parser.add_argument("-ngl", "--gpu-layers", "--n-gpu-layers", dest="gpu_layers", type=int)
+    parser.add_argument("--backend", choices=sorted(DEFAULT_PROFILES),
+                        help="Backend to simulate (default: gpu when --gpu-layers > 0)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Run this many times faster than real time")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--latency-log", type=Path, default=Path("data/latency_results.csv"),
+                        help="Telemetry used to fit the simulation")
+    parser.add_argument("--power-log", type=Path, default=Path("data/power_logs.csv"))
+    parser.add_argument("--fit", action="store_true",
+                        help="Print the fitted coefficients as JSON and exit")
+    parser.add_argument("--serve", action="store_true",
+                        help="Serve llama-server's /completion API instead of generating once")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--power-trace", type=Path,
+                        help="With --serve, sample the synthetic power signal into this CSV")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    sim = SimulatedLlama.from_telemetry(args.latency_log, args.power_log, args.speed, args.seed)
+    if args.fit:
+        print(json.dumps(
+            {name: {k: v for k, v in asdict(p).items() if k != "output_tokens"}
+             for name, p in sim.profiles.items()},
+            indent=2,
+        ))
+        return
+    backend = args.backend or ("gpu" if (args.gpu_layers or 0) > 0 else "cpu")
+    if args.serve:
+        from http.server import ThreadingHTTPServer
+
+        sim.resident = True
+        server = ThreadingHTTPServer(
+            (args.host, args.port), make_handler(sim, backend, args.threads, args.gpu_layers)
+        )
+        tracer = None
+        if args.power_trace is not None:
+            tracer = PowerTraceWriter(sim, backend, args.power_trace)
+            tracer.start()
+        print(f"🧪 Simulated {backend} llama-server on http://{args.host}:{args.port}",
+              file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if tracer is not None:
+                tracer.stopped.set()
+        return
+    result = SimResult("", 0, 0, backend, 0.0)
+    for token in sim.stream(args.prompt, args.n_predict, backend, args.threads,
+                            args.gpu_layers, result):
+        sys.stdout.write(token + " ")
+        sys.stdout.flush()
+    sys.stdout.write("\n")
+    for line in llama_timing_lines(result, sim.speed):
+        print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "BackendProfile",
+    "DEFAULT_PROFILES",
+    "DRY_RUN_SPEED",
+    "SimResult",
+    "SimulatedLlama",
+    "fit_profiles",
+    "llama_timing_lines",
+    "run_placement",
+    "write_power_trace",
+]
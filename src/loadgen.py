@@ -0,0 +1,441 @@
+"""Open-loop trace replay load generator.
+
+Request logs are JSONL, one request per line::
+
+    {"t": 0.000, "id": "req-0001", "prompt": "...", "n_predict": 128, "backend": "gpu"}
+
+``t`` is the arrival offset in seconds from the start of the trace (an ISO
+``timestamp`` is accepted instead); ``id``, ``backend``, ``prompt_id`` and
+``n_predict`` are optional.  ``record`` derives such a log from
+``latency_results.csv``; ``replay`` fires it at an HTTP inference backend
+(llama.cpp ``llama-server``'s ``/completion`` API by default).
+
+Replay is open-loop: each request is launched at its scheduled time on the
+asyncio loop regardless of whether earlier ones have finished, so a slow
+backend shows up as queueing and tail latency instead of silently lowering
+the offered load.  Every request records its wall-clock start/end, which is
+the window to slice from the power traces when attributing energy.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import datetime as dt
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from router import estimate_tokens
+
+
+@dataclass
+class TraceRequest:
+    """A single entry of a request log."""
+
+    t: float
+    id: str
+    prompt: str = ""
+    n_predict: int = 128
+    backend: Optional[str] = None
+    prompt_id: Optional[str] = None
+
+
+@dataclass
+class RequestResult:
+    """Outcome of one replayed request."""
+
+    id: str
+    backend: str
+    scheduled_s: float
+    send_lag_ms: float
+    latency_ms: Optional[float]
+    status: Optional[int]
+    error: str
+    tokens_predicted: Optional[int]
+    start_utc: str
+    end_utc: str
+
+
+@dataclass
+class ReplayOptions:
+    """How to map a request log onto backends."""
+
+    default_url: str = "http://127.0.0.1:8080/completion"
+    backend_urls: Dict[str, str] = field(default_factory=dict)
+    router_url: Optional[str] = None
+    speed: float = 1.0
+    timeout_s: float = 300.0
+    max_in_flight: Optional[int] = None
+
+
+def read_request_log(path: Path) -> List[TraceRequest]:
+    """Parse a JSONL request log, sorted by arrival offset starting at zero."""
+    entries: List[TraceRequest] = []
+    origin: Optional[dt.datetime] = None
+    with path.open(encoding="utf-8") as handle:
+        for line_num, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise RuntimeError(f"Invalid JSON on line {line_num} of {path}") from exc
+            if "t" in raw:
+                offset = float(raw["t"])
+            elif "timestamp" in raw:
+                stamp = dt.datetime.fromisoformat(raw["timestamp"])
+                origin = origin or stamp
+                offset = (stamp - origin).total_seconds()
+            else:
+                raise RuntimeError(f"Request on line {line_num} of {path} needs 't' or 'timestamp'")
+            entries.append(
+                TraceRequest(
+                    t=offset,
+                    id=str(raw.get("id") or f"req-{line_num:05d}"),
+                    prompt=raw.get("prompt", ""),
+                    n_predict=int(raw.get("n_predict", 128)),
+                    backend=raw.get("backend"),
+                    prompt_id=raw.get("prompt_id"),
+                )
+            )
+    if not entries:
+        raise RuntimeError(f"Request log {path} is empty")
+    entries.sort(key=lambda entry: entry.t)
+    start = entries[0].t
+    for entry in entries:
+        entry.t -= start
+    return entries
+
+
+def write_request_log(entries: List[TraceRequest], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as handle:
+        for entry in entries:
+            record = {key: value for key, value in asdict(entry).items() if value is not None}
+            record["t"] = round(entry.t, 3)
+            handle.write(json.dumps(record) + "\n")
+
+
+def record_from_telemetry(
+    latency_path: Path,
+    prompt_files: List[Path],
+    n_predict: int = 128,
+) -> List[TraceRequest]:
+    """Reconstruct arrivals from ``latency_results.csv``.
+
+    Latency rows are written when a prompt finishes, so the arrival time is
+    the row timestamp minus its latency.  Prompt text is looked up by id in
+    the given prompt files.
+    """
+    from workload import load_manual_prompts
+
+    texts: Dict[str, str] = {}
+    for prompt_file in prompt_files:
+        texts.update({prompt.id: prompt.text for prompt in load_manual_prompts(prompt_file)})
+
+    entries: List[TraceRequest] = []
+    with latency_path.open(newline="", encoding="utf-8") as handle:
+        for index, row in enumerate(csv.DictReader(handle), start=1):
+            try:
+                finished = dt.datetime.fromisoformat(row["timestamp"])
+                latency_ms = float(row["latency_ms"])
+            except (KeyError, ValueError):
+                continue
+            started = finished - dt.timedelta(milliseconds=latency_ms)
+            entries.append(
+                TraceRequest(
+                    t=started.timestamp(),
+                    id=f"req-{index:05d}",
+                    prompt=texts.get(row.get("prompt_id", ""), ""),
+                    n_predict=n_predict,
+                    backend=row.get("backend") or None,
+                    prompt_id=row.get("prompt_id") or None,
+                )
+            )
+    entries.sort(key=lambda entry: entry.t)
+    if entries:
+        start = entries[0].t
+        for entry in entries:
+            entry.t -= start
+    return entries
+
+
+async def http_post_json(url: str, payload: Dict[str, object], timeout_s: float) -> tuple:
+    """Minimal HTTP/1.1 JSON POST over asyncio streams; returns (status, body)."""
+    parts = urlsplit(url)
+    if parts.scheme != "http":
+        raise ValueError(f"Only http:// backends are supported, got {url}")
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    body = json.dumps(payload).encode("utf-8")
+    request = (
+        f"POST {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("ascii") + body
+
+    async def exchange() -> tuple:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, payload_bytes = raw.partition(b"\r\n\r\n")
+        status_line = head.split(b"\r\n", 1)[0].decode("ascii", errors="replace")
+        status = int(status_line.split()[1])
+        try:
+            parsed = json.loads(payload_bytes.decode("utf-8") or "null")
+        except json.JSONDecodeError:
+            parsed = None
+        return status, parsed
+
+    return await asyncio.wait_for(exchange(), timeout=timeout_s)
+
+
+async def _send(
+    entry: TraceRequest,
+    options: ReplayOptions,
+    scheduled_at: float,
+    in_flight: List[int],
+) -> RequestResult:
+    backend = entry.backend or "default"
+    lag_ms = (time.perf_counter() - scheduled_at) * 1000.0
+    start_utc = dt.datetime.utcnow().isoformat(timespec="milliseconds")
+    start = time.perf_counter()
+    status: Optional[int] = None
+    error = ""
+    tokens: Optional[int] = None
+    reservation: Optional[str] = None
+    in_flight[0] += 1
+    try:
+        if options.router_url:
+            # Reserve so the router sees this request in its backend's queue.
+            _, decision = await http_post_json(
+                options.router_url,
+                {"prompt": entry.prompt, "n_predict": entry.n_predict, "reserve": True},
+                options.timeout_s,
+            )
+            backend = (decision or {}).get("backend", backend)
+            reservation = (decision or {}).get("reservation")
+        url = options.backend_urls.get(backend, options.default_url)
+        status, body = await http_post_json(
+            url, {"prompt": entry.prompt, "n_predict": entry.n_predict}, options.timeout_s
+        )
+        if status >= 400:
+            error = f"HTTP {status}"
+        elif isinstance(body, dict):
+            tokens = body.get("tokens_predicted")
+    except asyncio.TimeoutError:
+        error = "timeout"
+    except (OSError, ValueError, IndexError) as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    finally:
+        in_flight[0] -= 1
+    latency_ms = (time.perf_counter() - start) * 1000.0
+    end_utc = dt.datetime.utcnow().isoformat(timespec="milliseconds")
+
+    if options.router_url and (reservation or not error):
+        # Failed requests only end their reservation; they must not train the cost model.
+        if error:
+            path, payload = "/release", {"reservation": reservation}
+        else:
+            path, payload = "/feedback", {
+                "backend": backend,
+                "prompt_tokens": estimate_tokens(entry.prompt),
+                "tokens_generated": tokens or 0,
+                "latency_ms": latency_ms,
+                "reservation": reservation,
+            }
+        try:
+            await http_post_json(
+                options.router_url.rstrip("/") + path, payload, options.timeout_s
+            )
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError):
+            pass
+
+    return RequestResult(
+        id=entry.id,
+        backend=backend,
+        scheduled_s=entry.t / options.speed,
+        send_lag_ms=round(lag_ms, 3),
+        latency_ms=None if error == "timeout" else round(latency_ms, 3),
+        status=status,
+        error=error,
+        tokens_predicted=tokens,
+        start_utc=start_utc,
+        end_utc=end_utc,
+    )
+
+
+async def replay(entries: List[TraceRequest], options: ReplayOptions) -> List[RequestResult]:
+    """Fire every request at its (scaled) offset without waiting for responses."""
+    loop_start = time.perf_counter()
+    in_flight = [0]
+    tasks: List[asyncio.Task] = []
+    dropped: List[RequestResult] = []
+    for entry in entries:
+        scheduled_at = loop_start + entry.t / options.speed
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if options.max_in_flight is not None and in_flight[0] >= options.max_in_flight:
+            now = dt.datetime.utcnow().isoformat(timespec="milliseconds")
+            dropped.append(
+                RequestResult(
+                    id=entry.id,
+                    backend=entry.backend or "default",
+                    scheduled_s=entry.t / options.speed,
+                    send_lag_ms=0.0,
+                    latency_ms=None,
+                    status=None,
+                    error="dropped",
+                    tokens_predicted=None,
+                    start_utc=now,
+                    end_utc=now,
+                )
+            )
+            continue
+        tasks.append(asyncio.create_task(_send(entry, options, scheduled_at, in_flight)))
+    results = list(await asyncio.gather(*tasks)) + dropped
+    results.sort(key=lambda result: result.scheduled_s)
+    return results
+
+
+def write_results(results: List[RequestResult], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(asdict(results[0]).keys()))
+        writer.writeheader()
+        for result in results:
+            writer.writerow(asdict(result))
+
+
+def summarize(results: List[RequestResult]) -> Dict[str, object]:
+    latencies = sorted(r.latency_ms for r in results if not r.error and r.latency_ms is not None)
+    errors = sum(1 for r in results if r.error)
+
+    def pct(q: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(q * (len(latencies) - 1))))]
+
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_send_lag_ms": max((r.send_lag_ms for r in results), default=0.0),
+        "energy_window_utc": [results[0].start_utc, max(r.end_utc for r in results)],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="Build a request log from latency_results.csv")
+    record.add_argument(
+        "--latency-log",
+        type=Path,
+        default=Path("data/latency_results.csv"),
+        help="Telemetry CSV to reconstruct arrivals from.",
+    )
+    record.add_argument(
+        "--prompt-file",
+        type=Path,
+        action="append",
+        dest="prompt_files",
+        help="Prompt JSON/JSONL used to fill in prompt text by id (can repeat).",
+    )
+    record.add_argument("--n-predict", type=int, default=128, help="n_predict for every request.")
+    record.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data/request_log.jsonl"),
+        help="Destination request log.",
+    )
+
+    play = sub.add_parser("replay", help="Replay a request log open-loop against a backend")
+    play.add_argument("log", type=Path, help="JSONL request log to replay.")
+    play.add_argument(
+        "--url",
+        default=ReplayOptions.default_url,
+        help="Completion endpoint used when a request has no backend mapping.",
+    )
+    play.add_argument(
+        "--backend-url",
+        action="append",
+        default=[],
+        metavar="BACKEND=URL",
+        help="Endpoint for requests tagged with a backend, e.g. gpu=http://host:8081/completion.",
+    )
+    play.add_argument(
+        "--router",
+        help="Ask demo_server's /route endpoint for the backend of each request.",
+    )
+    play.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Scale arrival rate: 2.0 replays twice as fast, 0.5 at half speed.",
+    )
+    play.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout (s).")
+    play.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="Drop (rather than delay) arrivals beyond this many outstanding requests.",
+    )
+    play.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data/loadgen_results.csv"),
+        help="Per-request results CSV.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.command == "record":
+        prompt_files = args.prompt_files or sorted(Path("data/prompts").glob("*.jsonl"))
+        entries = record_from_telemetry(args.latency_log, prompt_files, args.n_predict)
+        write_request_log(entries, args.output)
+        print(f"✅ Recorded {len(entries)} requests to {args.output}")
+        return
+
+    backend_urls = {}
+    for mapping in args.backend_url:
+        name, _, url = mapping.partition("=")
+        if not url:
+            raise SystemExit(f"--backend-url expects BACKEND=URL, got '{mapping}'")
+        backend_urls[name] = url
+    options = ReplayOptions(
+        default_url=args.url,
+        backend_urls=backend_urls,
+        router_url=args.router,
+        speed=args.speed,
+        timeout_s=args.timeout,
+        max_in_flight=args.max_in_flight,
+    )
+    entries = read_request_log(args.log)
+    print(f"Replaying {len(entries)} requests over {entries[-1].t / args.speed:.1f}s...")
+    results = asyncio.run(replay(entries, options))
+    write_results(results, args.output)
+    print(json.dumps(summarize(results), indent=2))
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Environment manifest written at the start of every benchmark session.
+
+Numbers from different machines, llama.cpp builds, drivers or model files are
+not comparable, yet the telemetry CSVs do not say which of these produced a
+row.  Each session therefore records an environment fingerprint (host, CPU
+model, cpufreq governor, power plan, GPU and driver, llama.cpp build, model
+checksums, config and repository revision).  The manifest id is a hash of that
+fingerprint, so sessions on an identical setup share an id and anything that
+changes the setup starts a new one.  Every telemetry row carries the id.
+
+Layout under ``data/manifests``::
+
+    <manifest_id>.json   the fingerprint (written once per id)
+    sessions.jsonl       one line per session: id, start time, config, runs
+
+Model files are checked against ``config/model_hashes.json``.  SHA-256 of a
+1.3 GB GGUF takes seconds, so digests are cached in
+``data/.model_hash_cache.json`` keyed by path, size and mtime.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_DIR = Path("data/manifests")
+SESSION_LOG = "sessions.jsonl"
+MODEL_HASHES = Path("config/model_hashes.json")
+HASH_CACHE = Path("data/.model_hash_cache.json")
+MANIFEST_VERSION = 1
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+# ``llama-cli --version`` prints e.g. "version: 4589 (1a2b3c4d)".
+LLAMA_VERSION_RE = re.compile(r"version:\s*(\d+)\s*\(([0-9a-f]+)\)")
+
+
+@dataclass
+class ModelCheck:
+    """A model file and how it compares to the expected checksum."""
+
+    path: str
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
+    expected_sha256: Optional[str] = None
+    # verified | mismatch | unlisted | missing | skipped
+    status: str = "missing"
+
+
+@dataclass
+class Environment:
+    """Everything that decides whether two sessions' numbers are comparable."""
+
+    version: int = MANIFEST_VERSION
+    hostname: str = ""
+    os: str = ""
+    python: str = ""
+    cpu_model: Optional[str] = None
+    cpu_count: Optional[int] = None
+    cpu_governor: Optional[str] = None
+    power_plan: Optional[str] = None
+    gpu_name: Optional[str] = None
+    gpu_driver: Optional[str] = None
+    llama_binaries: Dict[str, Optional[str]] = field(default_factory=dict)
+    models: List[ModelCheck] = field(default_factory=list)
+    config_path: Optional[str] = None
+    config_sha256: Optional[str] = None
+    git_commit: Optional[str] = None
+    git_dirty: Optional[bool] = None
+    dry_run: bool = False
+
+    @property
+    def manifest_id(self) -> str:
+        payload = json.dumps(asdict(self), sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _run(cmd: List[str], timeout: float = 10.0) -> Optional[str]:
+    """Output of a probe command, or ``None`` when it is missing or fails."""
+    if shutil.which(cmd[0]) is None and not Path(cmd[0]).exists():
+        return None
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=timeout, errors="ignore"
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return (result.stdout + result.stderr).strip() or None
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def cpu_model() -> Optional[str]:
+    cpuinfo = _read(Path("/proc/cpuinfo"))
+    if cpuinfo:
+        for line in cpuinfo.splitlines():
+            if line.startswith("model name"):
+                return line.split(":", 1)[1].strip()
+    if platform.system() == "Windows":
+        out = _run(["powershell", "-NoProfile", "-Command",
+                    "(Get-CimInstance Win32_Processor).Name"])
+        if out:
+            return out.splitlines()[0].strip()
+    return platform.processor() or None
+
+
+def cpu_governor(cpufreq_root: Path = Path("/sys/devices/system/cpu")) -> Optional[str]:
+    governors = {
+        _read(path) for path in cpufreq_root.glob("cpu[0-9]*/cpufreq/scaling_governor")
+    } - {None}
+    return ",".join(sorted(governors)) if governors else None
+
+
+def power_plan() -> Optional[str]:
+    if platform.system() == "Windows":
+        out = _run(["powercfg", "/getactivescheme"])
+        match = re.search(r"\(([^)]+)\)", out or "")
+        return match.group(1) if match else out
+    return _read(Path("/sys/firmware/acpi/platform_profile"))
+
+
+def gpu_info() -> Dict[str, Optional[str]]:
+    try:
+        import pynvml
+    except ImportError:
+        return {"name": None, "driver": None}
+    try:
+        pynvml.nvmlInit()
+    except Exception:
+        return {"name": None, "driver": None}
+    try:
+        name = pynvml.nvmlDeviceGetName(pynvml.nvmlDeviceGetHandleByIndex(0))
+        driver = pynvml.nvmlSystemGetDriverVersion()
+        decode = lambda v: v.decode() if isinstance(v, bytes) else v  # noqa: E731
+        return {"name": decode(name), "driver": decode(driver)}
+    except Exception:
+        return {"name": None, "driver": None}
+    finally:
+        pynvml.nvmlShutdown()
+
+
+def llama_build(binary: Path) -> Optional[str]:
+    """``<build number>-<commit>`` reported by a llama.cpp binary."""
+    out = _run([str(binary), "--version"])
+    match = LLAMA_VERSION_RE.search(out or "")
+    return f"{match.group(1)}-{match.group(2)}" if match else None
+
+
+def git_revision(root: Path = Path(".")) -> Dict[str, object]:
+    commit = _run(["git", "-C", str(root), "rev-parse", "HEAD"])
+    if not commit or not re.fullmatch(r"[0-9a-f]{40}", commit):
+        return {"commit": None, "dirty": None}
+    status = _run(["git", "-C", str(root), "status", "--porcelain", "--untracked-files=no"])
+    return {"commit": commit, "dirty": bool(status)}
+
+
+class HashCache:
+    """SHA-256 digests keyed by resolved path, invalidated by size or mtime changes."""
+
+    def __init__(self, path: Path = HASH_CACHE) -> None:
+        self.path = path
+        try:
+            self.entries: Dict[str, Dict[str, object]] = json.loads(
+                path.read_text(encoding="utf-8")
+            )
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def sha256(self, file: Path) -> str:
+        stat = file.stat()
+        key = str(file.resolve())
+        entry = self.entries.get(key)
+        if entry and (entry.get("size"), entry.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns):
+            return str(entry["sha256"])
+        digest = hashlib.sha256()
+        with file.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        self.entries[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest.hexdigest(),
+        }
+        self._save()
+        return digest.hexdigest()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+def load_expected_hashes(path: Path = MODEL_HASHES) -> Dict[str, Dict[str, object]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def check_model(
+    model: Path,
+    expected: Dict[str, Dict[str, object]],
+    cache: HashCache,
+    hash_files: bool = True,
+) -> ModelCheck:
+    """Hash ``model`` (cached) and compare it with its entry in ``model_hashes.json``."""
+    entry = expected.get(model.name, {})
+    check = ModelCheck(path=str(model), expected_sha256=entry.get("sha256"))
+    if not model.exists():
+        return check
+    check.size_bytes = model.stat().st_size
+    if not hash_files:
+        check.status = "skipped"
+        return check
+    check.sha256 = cache.sha256(model)
+    if check.expected_sha256 is None:
+        check.status = "unlisted"
+    elif check.sha256 == check.expected_sha256:
+        check.status = "verified"
+    else:
+        check.status = "mismatch"
+    return check
+
+
+def collect_environment(
+    llama_binaries: Iterable[Path],
+    models: Iterable[Path],
+    config_path: Optional[Path] = None,
+    dry_run: bool = False,
+    hashes_path: Path = MODEL_HASHES,
+    cache: Optional[HashCache] = None,
+) -> Environment:
+    """Probe the host; every probe degrades to ``None`` when unavailable."""
+    cache = cache or HashCache()
+    expected = load_expected_hashes(hashes_path)
+    gpu = gpu_info()
+    git = git_revision()
+    config_sha = None
+    if config_path is not None and config_path.exists():
+        config_sha = hashlib.sha256(config_path.read_bytes()).hexdigest()
+    return Environment(
+        hostname=socket.gethostname(),
+        os=platform.platform(),
+        python=platform.python_version(),
+        cpu_model=cpu_model(),
+        cpu_count=os.cpu_count(),
+        cpu_governor=cpu_governor(),
+        power_plan=power_plan(),
+        gpu_name=gpu["name"],
+        gpu_driver=gpu["driver"],
+        llama_binaries={
+            str(binary): llama_build(binary.expanduser())
+            for binary in sorted(set(llama_binaries))
+        },
+        models=[
+            # Dry runs never load the model, so do not spend time hashing it.
+            check_model(model.expanduser(), expected, cache, hash_files=not dry_run)
+            for model in sorted(set(models))
+        ],
+        config_path=None if config_path is None else str(config_path),
+        config_sha256=config_sha,
+        git_commit=git["commit"],  # type: ignore[arg-type]
+        git_dirty=git["dirty"],  # type: ignore[arg-type]
+        dry_run=dry_run,
+    )
+
+
+def write_manifest(
+    env: Environment,
+    run_ids: Iterable[str] = (),
+    manifest_dir: Path = MANIFEST_DIR,
+) -> str:
+    """Store ``env`` under its id and log the session; returns the manifest id."""
+    manifest_id = env.manifest_id
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    path = manifest_dir / f"{manifest_id}.json"
+    if not path.exists():
+        record = {"manifest_id": manifest_id, **asdict(env)}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(record, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(path)
+    session = {
+        "manifest_id": manifest_id,
+        "started_utc": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+        "config_path": env.config_path,
+        "run_ids": list(run_ids),
+    }
+    with (manifest_dir / SESSION_LOG).open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps(session) + "\n")
+    return manifest_id
+
+
+def load_manifests(manifest_dir: Path = MANIFEST_DIR) -> List[Dict[str, object]]:
+    manifests = []
+    for path in sorted(manifest_dir.glob("*.json")):
+        try:
+            manifests.append(json.loads(path.read_text(encoding="utf-8")))
+        except json.JSONDecodeError:
+            print(f"⚠️ Skipping unreadable manifest {path}")
+    return manifests
+
+
+def unverified_models(env: Environment) -> List[ModelCheck]:
+    """Models that exist but do not match their expected checksum."""
+    return [model for model in env.models if model.status == "mismatch"]
+
+
+def open_session(
+    llama_binaries: Iterable[Path],
+    models: Iterable[Path],
+    run_ids: Iterable[str] = (),
+    config_path: Optional[Path] = None,
+    dry_run: bool = False,
+    allow_unverified: bool = False,
+    manifest_dir: Path = MANIFEST_DIR,
+) -> str:
+    """Fingerprint the environment, refuse mismatched models, and return the manifest id."""
+    env = collect_environment(llama_binaries, models, config_path=config_path, dry_run=dry_run)
+    mismatched = unverified_models(env)
+    if mismatched and not allow_unverified:
+        names = ", ".join(model.path for model in mismatched)
+        raise RuntimeError(
+            f"Model checksum mismatch for {names}; fix the file or pass --allow-unverified-model"
+        )
+    for model in env.models:
+        if model.status in ("missing", "unlisted") and not dry_run:
+            print(f"⚠️ Model {model.path} is {model.status} in {MODEL_HASHES}")
+    manifest_id = write_manifest(env, run_ids=run_ids, manifest_dir=manifest_dir)
+    builds = ", ".join(filter(None, env.llama_binaries.values())) or "unknown"
+    print(f"🧾 Session manifest {manifest_id} (cpu={env.cpu_model}, gpu={env.gpu_name}, "
+          f"llama={builds})")
+    return manifest_id
+
+
+__all__ = [
+    "Environment",
+    "HashCache",
+    "MANIFEST_DIR",
+    "ModelCheck",
+    "check_model",
+    "collect_environment",
+    "load_manifests",
+    "open_session",
+    "unverified_models",
+    "write_manifest",
+]
@@ -0,0 +1,341 @@
+"""In-process metrics in the OpenMetrics / Prometheus text format.
+
+CSV logs are good for analysis after the fact; long soak tests also need a
+live view.  This module keeps counters, gauges and histograms in memory and
+renders them in the text exposition format, either on ``demo_server``'s
+``/metrics`` endpoint or, for batch sessions, into a file rewritten every few
+seconds (``run_session.py --metrics-file data/metrics.prom``; the file also
+works with node_exporter's textfile collector).
+
+The hot path is a labelled child bound once per backend or run
+(``ENERGY.labels("gpu", run_id, model)``): updating it takes one uncontended
+per-child lock and allocates nothing.  Children are created under the family
+lock on first use only.
+
+No client library is required; the format is small enough to render here.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+LATENCY_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TTFT_BUCKETS_S = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_LABELS = ("backend", "run_id", "model")
+
+
+def _format(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+class CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        with self._lock:
+            self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class HistogramChild:
+    __slots__ = ("_lock", "bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Metric(ABC):
+    """A metric family: one child per combination of label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child holding one label combination's value."""
+
+    def labels(self, *values: object):
+        """The child for these label values (positional, in ``labelnames`` order)."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def _sample_lines(self) -> Iterator[str]:
+        """Exposition lines for every child, without the family's metadata."""
+
+    def render(self) -> Iterator[str]:
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"# HELP {self.name} {_escape(self.documentation)}"
+        yield from self._sample_lines()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def _sample_lines(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}_total{self._label_text(key)} {_format(child.value)}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def _sample_lines(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(key)} {_format(child.value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS_S,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def _sample_lines(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                label = self._label_text(key, f'le="{_format(bound)}"')
+                yield f"{self.name}_bucket{label} {cumulative}"
+            yield f"{self.name}_count{self._label_text(key)} {count}"
+            yield f"{self.name}_sum{self._label_text(key)} {_format(total)}"
+
+
+class Registry:
+    """The metric families one endpoint or file exposes."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "llm_request_latency_seconds", "End-to-end latency of one prompt", REQUEST_LABELS,
+))
+TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "llm_time_to_first_token_seconds", "Launch to first generated token (load + prefill)",
+    REQUEST_LABELS, buckets=TTFT_BUCKETS_S,
+))
+TOKENS_PER_SECOND = REGISTRY.register(Gauge(
+    "llm_tokens_per_second", "Decode rate of the latest prompt", REQUEST_LABELS,
+))
+TOKENS = REGISTRY.register(Counter(
+    "llm_tokens_generated", "Tokens generated", REQUEST_LABELS,
+))
+REQUESTS = REGISTRY.register(Counter(
+    "llm_requests", "Prompts completed", REQUEST_LABELS,
+))
+ENERGY = REGISTRY.register(Counter(
+    "llm_energy_joules", "Energy attributed to prompts", REQUEST_LABELS,
+))
+POWER = REGISTRY.register(Gauge(
+    "llm_power_watts", "Latest power sample", ("backend",),
+))
+POWER_SAMPLES = REGISTRY.register(Counter(
+    "llm_power_samples", "Power samples taken by the session sampler", ("backend",),
+))
+POWER_LAST_SAMPLE = REGISTRY.register(Gauge(
+    "llm_power_last_sample_timestamp_seconds",
+    "Unix time of the latest power sample; a stale value means the sampler stalled",
+    ("backend",),
+))
+SAMPLER_ERRORS = REGISTRY.register(Counter(
+    "llm_power_sampler_errors", "Failed power sensor reads", ("backend",),
+))
+SAMPLER_UP = REGISTRY.register(Gauge(
+    "llm_power_sampler_up", "Whether the backend's power sampler is running", ("backend",),
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "llm_queue_depth", "Requests routed to a backend and not yet finished", ("backend",),
+))
+
+
+def record_request(
+    backend: str,
+    run_id: str,
+    model: str,
+    latency_s: float,
+    tokens: Optional[int] = None,
+    energy_joules: Optional[float] = None,
+    ttft_s: Optional[float] = None,
+    decode_s: Optional[float] = None,
+) -> None:
+    """Fold one finished prompt into the request metrics."""
+    key = (backend, run_id, model)
+    REQUESTS.labels(*key).inc()
+    REQUEST_LATENCY.labels(*key).observe(latency_s)
+    if ttft_s is not None:
+        TIME_TO_FIRST_TOKEN.labels(*key).observe(ttft_s)
+    if tokens:
+        TOKENS.labels(*key).inc(tokens)
+        elapsed = decode_s or latency_s
+        if elapsed > 0:
+            TOKENS_PER_SECOND.labels(*key).set(tokens / elapsed)
+    if energy_joules is not None:
+        ENERGY.labels(*key).inc(max(energy_joules, 0.0))
+
+
+class FileExporter:
+    """Rewrite a registry's exposition to ``path`` every ``interval_s`` seconds."""
+
+    def __init__(
+        self, path: Path, registry: Registry = REGISTRY, interval_s: float = 5.0
+    ) -> None:
+        self.path = path
+        self.registry = registry
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "FileExporter":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+        print(f"📈 Exporting metrics to {self.path} every {self.interval_s:g}s")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+    def write(self) -> None:
+        # Write-then-rename so a scraper never reads a half-written file.
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(self.registry.render(), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.write()
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "Counter",
+    "ENERGY",
+    "FileExporter",
+    "Gauge",
+    "Histogram",
+    "POWER",
+    "POWER_LAST_SAMPLE",
+    "POWER_SAMPLES",
+    "QUEUE_DEPTH",
+    "REGISTRY",
+    "REQUESTS",
+    "REQUEST_LATENCY",
+    "Registry",
+    "SAMPLER_ERRORS",
+    "SAMPLER_UP",
+    "TIME_TO_FIRST_TOKEN",
+    "TOKENS",
+    "TOKENS_PER_SECOND",
+    "record_request",
+]
@@ -0,0 +1,165 @@
+"""Optional hardware-counter collection around llama.cpp via ``perf stat``.
+
+Watts and wall time alone cannot tell whether CPU decode is compute- or
+memory-bound.  When the Linux ``perf`` CLI is available (it drives
+``perf_event_open`` for us), the inference subprocess is wrapped in
+``perf stat`` and the retired instructions, cycles and cache misses are logged
+per prompt.  DRAM traffic is estimated from last-level-cache misses times the
+cache-line size.  Everything degrades to a no-op when perf is missing or the
+kernel refuses access (``perf_event_paranoid``).
+"""
+from __future__ import annotations
+
+import shutil
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+PERF_EVENTS = (
+    "instructions",
+    "cycles",
+    "cache-references",
+    "cache-misses",
+    "LLC-load-misses",
+    "LLC-store-misses",
+)
+CACHE_LINE_BYTES = 64
+
+
+@dataclass
+class PerfCounters:
+    """Counter totals for one inference subprocess."""
+
+    values: Dict[str, float] = field(default_factory=dict)
+
+    def get(self, event: str) -> Optional[float]:
+        return self.values.get(event)
+
+    @property
+    def ipc(self) -> Optional[float]:
+        instructions, cycles = self.get("instructions"), self.get("cycles")
+        if not instructions or not cycles:
+            return None
+        return instructions / cycles
+
+    @property
+    def dram_bytes(self) -> Optional[float]:
+        """Estimated DRAM traffic: LLC misses (or generic cache misses) x line size."""
+        llc = [self.get("LLC-load-misses"), self.get("LLC-store-misses")]
+        if any(value is not None for value in llc):
+            return sum(value or 0.0 for value in llc) * CACHE_LINE_BYTES
+        misses = self.get("cache-misses")
+        return None if misses is None else misses * CACHE_LINE_BYTES
+
+    def as_record(self) -> Dict[str, Optional[float]]:
+        return {
+            "instructions": self.get("instructions"),
+            "cycles": self.get("cycles"),
+            "cache_references": self.get("cache-references"),
+            "cache_misses": self.get("cache-misses"),
+            "llc_misses": _sum_present(self.get("LLC-load-misses"), self.get("LLC-store-misses")),
+            "dram_bytes": self.dram_bytes,
+            "ipc": None if self.ipc is None else round(self.ipc, 4),
+        }
+
+
+@dataclass
+class PerfCollector:
+    """Wrap commands in ``perf stat`` and parse the CSV (``-x,``) output."""
+
+    perf_binary: str = "perf"
+    events: Sequence[str] = PERF_EVENTS
+    _available: Optional[bool] = field(default=None, init=False, repr=False)
+
+    def available(self) -> bool:
+        """Probe once whether perf exists and may count user-space events."""
+        if self._available is None:
+            self._available = self._probe()
+            if not self._available:
+                print("⚠️ perf stat unavailable; hardware counters will not be recorded")
+        return self._available
+
+    def _probe(self) -> bool:
+        if shutil.which(self.perf_binary) is None:
+            return False
+        try:
+            result = subprocess.run(
+                [self.perf_binary, "stat", "-x", ",", "-e", "instructions", "--", "true"],
+                capture_output=True,
+                text=True,
+                timeout=10,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return result.returncode == 0 and "<not supported>" not in result.stderr
+
+    def wrap(self, cmd: Sequence[str], output_path: Path) -> List[str]:
+        return [
+            self.perf_binary,
+            "stat",
+            "-x",
+            ",",
+            "-e",
+            ",".join(self.events),
+            "-o",
+            str(output_path),
+            "--",
+            *cmd,
+        ]
+
+    def read(self, output_path: Path) -> Optional[PerfCounters]:
+        try:
+            text = output_path.read_text(encoding="utf-8", errors="ignore")
+        except FileNotFoundError:
+            return None
+        finally:
+            output_path.unlink(missing_ok=True)
+        counters = parse_perf_stat(text)
+        return counters if counters.values else None
+
+
+def parse_perf_stat(text: str) -> PerfCounters:
+    """Parse ``perf stat -x,`` output into event totals.
+
+    Hybrid CPUs report events per PMU (``cpu_core/instructions/`` and
+    ``cpu_atom/instructions/``); those are summed under the plain event name.
+    Rows marked ``<not counted>`` or ``<not supported>`` are skipped.
+    """
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(",")
+        if len(fields) < 3:
+            continue
+        try:
+            value = float(fields[0])
+        except ValueError:
+            continue
+        event = _normalize_event(fields[2])
+        values[event] = values.get(event, 0.0) + value
+    return PerfCounters(values=values)
+
+
+def _normalize_event(name: str) -> str:
+    name = name.strip()
+    if "/" in name:
+        parts = [part for part in name.split("/") if part]
+        name = parts[1] if len(parts) > 1 else parts[0]
+    return name.split(":")[0]
+
+
+def _sum_present(*values: Optional[float]) -> Optional[float]:
+    present = [value for value in values if value is not None]
+    return sum(present) if present else None
+
+
+__all__ = [
+    "CACHE_LINE_BYTES",
+    "PERF_EVENTS",
+    "PerfCollector",
+    "PerfCounters",
+    "parse_perf_stat",
+]
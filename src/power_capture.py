@@ -0,0 +1,532 @@
+"""Session-long power capture, sliced into per-prompt energy.
+
+Capturing power per prompt (one PowerLog process or NVML loop and one raw
+file per prompt) costs a process spawn and a file per prompt and leaves the
+time between prompts unmeasured.  Instead, :class:`SessionPowerCapture` starts
+one continuous capture per backend when a session first uses it:
+
+* CPU: one Intel PowerLog process writing a single ``raw_cpu_power_<ts>.csv``,
+  tailed while it grows;
+* GPU: one NVML sampling thread writing ``raw_gpu_power_<ts>.csv``;
+* dry runs: the same sampling thread reading the simulated backend's power
+  (``llama_sim``), so the path is exercised without hardware; its trace is
+  ``raw_sim_<backend>_power_<ts>.csv`` so readers can leave it out.
+
+The runner brackets each prompt with start/end markers (monotonic
+nanoseconds keyed by run and prompt id, in ``data/power_markers.csv``) and
+the prompt's energy is the trapezoid integral of the trace over that window.
+Windows are clipped to the sampled range, so prompt energy is measured on the
+same basis as the capture's total; the clipped time is reported as uncovered.
+It is logged as the usual ``prompt=<id>`` row in ``power_logs.csv`` so the
+analysis joins it unchanged; the full trace, gaps included, stays on disk.
+
+When the runner also knows the prompt's phase boundaries (model loaded, first
+token, last token; see :class:`PhaseWindow`) each phase is integrated the
+same way and logged to ``data/phase_energy.csv`` with its J/token.
+
+Every sample also updates the ``llm_power_*`` metrics (see ``metrics.py``).
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from clock import NS_PER_S, StreamAligner, Timeline, raw_trace_name, record_anchor
+from llama_sim import SimulatedLlama
+from metrics import POWER, POWER_LAST_SAMPLE, POWER_SAMPLES, SAMPLER_ERRORS, SAMPLER_UP
+from telemetry import TelemetryLogger
+from thermal import NVML_THERMAL_REASONS, POWERLOG_TEMP_COLUMN, throttled_powerlog_rows
+from tracing import span, traced
+
+TRACE_HEADERS = ("timestamp", "monotonic_ns", "power_w", "temperature_c", "throttled")
+POWERLOG_POWER_COLUMN = "Processor Power_0(Watt)"
+# PowerLog needs a duration; the capture is stopped explicitly long before this.
+POWERLOG_MAX_DURATION_S = 24 * 3600
+# How long to wait for a buffered trace to reach the end of a prompt.
+SLICE_TIMEOUT_S = 2.0
+
+# (watts, temperature_c, throttled) from one reading of a power sensor.
+Reading = Tuple[float, Optional[float], bool]
+
+
+@dataclass
+class PowerSlice:
+    """Energy and thermal state of one prompt's window of a trace."""
+
+    energy_joules: float
+    duration_s: float
+    samples: int
+    max_temp_c: Optional[float]
+    throttled_fraction: float
+    # Part of the window before the first or after the last sample (not integrated).
+    uncovered_s: float = 0.0
+
+
+@dataclass
+class PhaseWindow:
+    """One phase of a prompt (``load``, ``prefill`` or ``decode``) on the monotonic clock."""
+
+    name: str
+    start_ns: int
+    end_ns: int
+    tokens: Optional[int] = None
+
+
+def integrate(
+    stamps_ns: np.ndarray, watts: np.ndarray, start_ns: float, end_ns: float
+) -> float:
+    """Trapezoid energy (J) of a sampled trace over ``[start_ns, end_ns]``.
+
+    The window is clipped to the first and last sample; power is never
+    extrapolated past them.  Power at the (clipped) window edges is
+    interpolated between the neighbouring samples.
+    """
+    start_ns, end_ns = covered_window(stamps_ns, start_ns, end_ns)
+    if end_ns <= start_ns:
+        return 0.0
+    inside = (stamps_ns > start_ns) & (stamps_ns < end_ns)
+    t = np.concatenate([[start_ns], stamps_ns[inside], [end_ns]])
+    w = np.interp(t, stamps_ns, watts)
+    return float(np.sum((w[1:] + w[:-1]) / 2 * np.diff(t)) / NS_PER_S)
+
+
+def covered_window(stamps_ns: np.ndarray, start_ns: float, end_ns: float) -> Tuple[float, float]:
+    """``[start_ns, end_ns]`` clipped to the sampled range (empty when they don't overlap)."""
+    if not len(stamps_ns):
+        return start_ns, start_ns
+    start = max(start_ns, float(stamps_ns[0]))
+    end = min(end_ns, float(stamps_ns[-1]))
+    return start, max(end, start)
+
+
+class PowerCapture(ABC):
+    """One backend's continuous trace, kept in memory until it has been sliced."""
+
+    def __init__(self, backend: str, path: Path, interval_s: float) -> None:
+        self.backend = backend
+        self.path = path
+        self.interval_s = interval_s
+        self.total_joules = 0.0
+        self.attributed_joules = 0.0
+        self.uncovered_s = 0.0
+        self._lock = threading.Lock()
+        self._stamps: List[int] = []
+        self._watts: List[float] = []
+        self._temps: List[float] = []
+        self._throttled: List[bool] = []
+        self._power_metric = POWER.labels(backend)
+        self._samples_metric = POWER_SAMPLES.labels(backend)
+        self._last_sample_metric = POWER_LAST_SAMPLE.labels(backend)
+
+    @abstractmethod
+    def start(self) -> None:
+        """Begin sampling into the trace."""
+
+    @abstractmethod
+    def stop(self) -> None:
+        """Stop sampling; the trace stays available for slicing."""
+
+    def _poll(self) -> None:
+        """Pull samples written since the last call (for captures fed by a file)."""
+
+    def _append(self, stamp_ns: int, watts: float, temp: Optional[float], throttled: bool) -> None:
+        with self._lock:
+            if self._stamps:
+                dt_s = (stamp_ns - self._stamps[-1]) / NS_PER_S
+                self.total_joules += (watts + self._watts[-1]) / 2 * dt_s
+            self._stamps.append(stamp_ns)
+            self._watts.append(watts)
+            self._temps.append(np.nan if temp is None else temp)
+            self._throttled.append(throttled)
+        self._power_metric.set(watts)
+        self._samples_metric.inc()
+        self._last_sample_metric.set(time.time())
+
+    def _covers(self, start_ns: int, end_ns: int) -> bool:
+        """Whether the samples span the window (caller holds the lock)."""
+        # Allow a couple of sample intervals at either edge: the first prompt can
+        # start before the first sample lands.
+        slack = 2 * self.interval_s * NS_PER_S
+        return len(self._stamps) >= 2 and (
+            self._stamps[0] <= start_ns + slack and self._stamps[-1] >= end_ns - slack
+        )
+
+    def _wait_for(self, start_ns: int, end_ns: int) -> bool:
+        deadline = time.monotonic() + SLICE_TIMEOUT_S
+        while True:
+            self._poll()
+            with self._lock:
+                if self._covers(start_ns, end_ns):
+                    return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.interval_s)
+
+    def energy_since(self, start_ns: int) -> Optional[float]:
+        """Joules from ``start_ns`` to the latest sample, without waiting for more."""
+        self._poll()
+        with self._lock:
+            if len(self._stamps) < 2 or self._stamps[0] > start_ns + 2 * self.interval_s * NS_PER_S:
+                return None
+            stamps = np.array(self._stamps, dtype=np.float64)
+            watts = np.array(self._watts, dtype=np.float64)
+        return integrate(stamps, watts, start_ns, max(stamps[-1], start_ns))
+
+    def slice(self, start_ns: int, end_ns: int) -> Optional[PowerSlice]:
+        """Energy between two monotonic stamps; ``None`` if the trace does not cover it."""
+        return self.slices([(start_ns, end_ns)])[0]
+
+    def slices(self, windows: Sequence[Tuple[int, int]]) -> List[Optional[PowerSlice]]:
+        """:meth:`slice` for several windows of one prompt, against one snapshot."""
+        start_ns = min(start for start, _ in windows)
+        end_ns = max(end for _, end in windows)
+        if not self._wait_for(start_ns, end_ns):
+            return [None] * len(windows)
+        with self._lock:
+            stamps = np.array(self._stamps, dtype=np.float64)
+            watts = np.array(self._watts, dtype=np.float64)
+            temps = np.array(self._temps, dtype=np.float64)
+            throttled = np.array(self._throttled, dtype=bool)
+            # Later prompts start after this one ends; keep one sample before it.
+            keep = max(int(np.searchsorted(stamps, end_ns)) - 1, 0)
+            for series in (self._stamps, self._watts, self._temps, self._throttled):
+                del series[:keep]
+        results = []
+        for start, end in windows:
+            inside = (stamps >= start) & (stamps <= end)
+            window_temps = temps[inside & ~np.isnan(temps)]
+            covered_start, covered_end = covered_window(stamps, start, end)
+            results.append(PowerSlice(
+                energy_joules=integrate(stamps, watts, start, end),
+                duration_s=(end - start) / NS_PER_S,
+                samples=int(inside.sum()),
+                max_temp_c=float(window_temps.max()) if len(window_temps) else None,
+                throttled_fraction=float(throttled[inside].mean()) if inside.any() else 0.0,
+                uncovered_s=((end - start) - (covered_end - covered_start)) / NS_PER_S,
+            ))
+        return results
+
+
+class SampledCapture(PowerCapture):
+    """Poll a sensor on a background thread into one growing NVML-format trace."""
+
+    def __init__(
+        self,
+        backend: str,
+        path: Path,
+        read: Callable[[], Reading],
+        interval_s: float = 0.1,
+        close: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__(backend, path, interval_s)
+        self._read = read
+        self._close = close
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        if self._close is not None:
+            self._close()
+
+    def _run(self) -> None:
+        with self.path.open("w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(TRACE_HEADERS)
+            while not self._stopped.is_set():
+                try:
+                    watts, temp, throttled = self._read()
+                except Exception:
+                    watts = None
+                    SAMPLER_ERRORS.labels(self.backend).inc()
+                if watts is not None:
+                    stamp = time.monotonic_ns()
+                    self._append(stamp, watts, temp, throttled)
+                    writer.writerow([
+                        dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+                        stamp,
+                        round(watts, 3),
+                        "" if temp is None else temp,
+                        int(throttled),
+                    ])
+                    handle.flush()
+                self._stopped.wait(self.interval_s)
+
+
+class PowerLogCapture(PowerCapture):
+    """One Intel PowerLog process for the whole session, tailed as its file grows."""
+
+    def __init__(
+        self,
+        path: Path,
+        powerlog_path: Path,
+        anchor_path: Path,
+        throttle_temp_c: float = 95.0,
+        interval_s: float = 0.1,
+    ) -> None:
+        super().__init__("cpu", path, interval_s)
+        self.powerlog_path = powerlog_path
+        self.anchor_path = anchor_path
+        self.throttle_temp_c = throttle_temp_c
+        self._process: Optional[subprocess.Popen] = None
+        self._offset = 0
+        self._header: Optional[List[str]] = None
+        self._aligner: Optional[StreamAligner] = None
+        self._boot_epoch_ns = 0.0
+
+    def start(self) -> None:
+        cmd = [
+            str(self.powerlog_path),
+            "-duration", str(POWERLOG_MAX_DURATION_S),
+            "-resolution", str(int(self.interval_s * 1000)),
+            "-file", str(self.path),
+        ]
+        record_anchor(f"{self.path.name}:start", self.anchor_path)
+        self._process = subprocess.Popen(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        timeline = Timeline.from_file(self.anchor_path)
+        self._aligner = StreamAligner(self.path, timeline)
+        wall, mono = time.time_ns(), time.monotonic_ns()
+        # PowerLog stamps local wall time; samples are kept on the monotonic clock.
+        mapped = timeline.from_monotonic(np.array([mono]), np.array([wall]))
+        self._boot_epoch_ns = float(mapped[0]) - mono
+
+    def stop(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        record_anchor(f"{self.path.name}:end", self.anchor_path)
+        self._poll()
+
+    def _poll(self) -> None:
+        if self._aligner is None or not self.path.exists():
+            return
+        with self.path.open("rb") as handle:
+            handle.seek(self._offset)
+            chunk = handle.read()
+        # Only consume complete lines; PowerLog may be mid-write.
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        if not complete:
+            return
+        self._offset += len(complete)
+        lines = complete.decode("utf-8", errors="ignore").splitlines()
+        rows = list(csv.reader(lines))
+        if self._header is None:
+            self._header, rows = [name.strip() for name in rows[0]], rows[1:]
+        records = [dict(zip(self._header, row)) for row in rows if len(row) >= len(self._header)]
+        if not records or POWERLOG_POWER_COLUMN not in self._header:
+            return
+        columns: Dict[str, List[str]] = {
+            name: [record.get(name, "") for record in records] for name in self._header
+        }
+        stamps = self._aligner(columns) - self._boot_epoch_ns
+        throttled = throttled_powerlog_rows(records, self.throttle_temp_c)
+        for stamp, record, hot in zip(stamps, records, throttled):
+            watts = _to_float(record.get(POWERLOG_POWER_COLUMN))
+            if np.isnan(stamp) or watts is None:
+                continue
+            self._append(int(stamp), watts, _to_float(record.get(POWERLOG_TEMP_COLUMN)), hot)
+
+
+def _to_float(value: object) -> Optional[float]:
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def nvml_reader() -> Optional[Tuple[Callable[[], Reading], Callable[[], None]]]:
+    """``(read, close)`` for GPU 0 through NVML, or ``None`` when it is unavailable."""
+    try:
+        import pynvml
+    except ImportError:
+        print("⚠️ pynvml not installed, skipping GPU power capture")
+        return None
+    try:
+        pynvml.nvmlInit()
+        handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+    except Exception as e:
+        print(f"⚠️ Failed to initialize NVML: {e}")
+        return None
+
+    def read() -> Reading:
+        # nvmlDeviceGetPowerUsage returns milliwatts
+        watts = pynvml.nvmlDeviceGetPowerUsage(handle) / 1000.0
+        try:
+            temp = pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
+            reasons = pynvml.nvmlDeviceGetCurrentClocksThrottleReasons(handle)
+            return watts, temp, bool(reasons & NVML_THERMAL_REASONS)
+        except Exception:
+            return watts, None, False
+
+    return read, pynvml.nvmlShutdown
+
+
+class SessionPowerCapture:
+    """Lazily started per-backend captures that live for a whole session."""
+
+    def __init__(
+        self,
+        logger: TelemetryLogger,
+        simulator: Optional[SimulatedLlama] = None,
+        interval_s: float = 0.1,
+    ) -> None:
+        self.logger = logger
+        self.simulator = simulator
+        # Simulated traces run in compressed time; logged energies are in model time.
+        self.scale = simulator.speed if simulator is not None else 1.0
+        self.interval_s = interval_s
+        self._captures: Dict[str, Optional[PowerCapture]] = {}
+
+    def __enter__(self) -> "SessionPowerCapture":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _raw_path(self, backend: str) -> Path:
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        name = raw_trace_name(backend, stamp, simulated=self.simulator is not None)
+        return self.logger.power_path.parent / name
+
+    def capture(self, backend: str) -> Optional[PowerCapture]:
+        """The running capture for ``backend``, started on first use."""
+        if backend in self._captures:
+            return self._captures[backend]
+        path = self._raw_path(backend)
+        capture: Optional[PowerCapture] = None
+        if self.simulator is not None:
+            sim = self.simulator
+            # Sample faster as the simulation runs faster, so every phase is seen.
+            capture = SampledCapture(
+                backend, path, lambda: (sim.power_w(backend), None, False),
+                interval_s=self.interval_s / sim.speed,
+            )
+        elif backend == "gpu":
+            nvml = nvml_reader()
+            if nvml is not None:
+                capture = SampledCapture(backend, path, nvml[0], self.interval_s, close=nvml[1])
+        elif backend == "cpu":
+            capture = PowerLogCapture(
+                path, self.logger.powerlog_path, self.logger.anchor_path,
+                self.logger.throttle_temp_c, self.interval_s,
+            )
+        if capture is not None:
+            if isinstance(capture, SampledCapture):
+                record_anchor(f"{path.name}:start", self.logger.anchor_path)
+            try:
+                with span("capture_start", backend=backend):
+                    capture.start()
+            except OSError as e:
+                print(f"⚠️ Could not start {backend} power capture: {e}")
+                capture = None
+            else:
+                SAMPLER_UP.labels(backend).set(1)
+                print(f"🔌 Capturing {backend} power for the session to {path}")
+        self._captures[backend] = capture
+        return capture
+
+    @traced()
+    def measure_prompt(
+        self,
+        capture: PowerCapture,
+        run_id: str,
+        prompt_id: str,
+        start_ns: int,
+        end_ns: int,
+        phases: Sequence[PhaseWindow] = (),
+    ) -> Optional[PowerSlice]:
+        """Log the prompt's markers and its sliced energy as a ``power_logs`` row.
+
+        Each of ``phases`` is sliced too and logged with ``log_phase_energy``.
+        For a simulator the returned slice is scaled back to model time.
+        """
+        self.logger.log_marker(capture.path.name, run_id, prompt_id, "start", start_ns)
+        for phase in phases:
+            self.logger.log_marker(capture.path.name, run_id, prompt_id, f"{phase.name}_end",
+                                   phase.end_ns)
+        self.logger.log_marker(capture.path.name, run_id, prompt_id, "end", end_ns)
+        measured, *per_phase = capture.slices(
+            [(start_ns, end_ns)] + [(phase.start_ns, phase.end_ns) for phase in phases]
+        )
+        for phase, sliced in zip(phases, per_phase):
+            if sliced is not None:
+                self.logger.log_phase_energy(
+                    run_id, capture.backend, prompt_id, phase.name, phase.start_ns,
+                    phase.end_ns, phase.tokens, sliced.energy_joules, self.scale,
+                )
+        if measured is None:
+            print(f"⚠️ {capture.backend} power trace does not cover prompt {prompt_id}")
+            return None
+        capture.attributed_joules += measured.energy_joules
+        capture.uncovered_s += measured.uncovered_s
+        measured = replace(
+            measured,
+            energy_joules=measured.energy_joules * self.scale,
+            duration_s=measured.duration_s * self.scale,
+            uncovered_s=measured.uncovered_s * self.scale,
+        )
+        if measured.throttled_fraction:
+            print(f"⚠️ {capture.backend.upper()} throttled for "
+                  f"{measured.throttled_fraction:.0%} of samples (prompt={prompt_id})")
+        self.logger.log_power_sample({
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "backend": capture.backend,
+            "energy_joules": measured.energy_joules,
+            "notes": f"prompt={prompt_id}",
+            "max_temp_c": measured.max_temp_c,
+            "throttled_fraction": measured.throttled_fraction,
+        })
+        return measured
+
+    def close(self) -> None:
+        for backend, capture in self._captures.items():
+            if capture is None:
+                continue
+            capture.stop()
+            SAMPLER_UP.labels(backend).set(0)
+            if isinstance(capture, SampledCapture):
+                record_anchor(f"{capture.path.name}:end", self.logger.anchor_path)
+            # Prompt windows are clipped to the trace, so this is only off by rounding.
+            between = max(capture.total_joules - capture.attributed_joules, 0.0)
+            print(
+                f"✅ {backend.upper()} power captured: {capture.total_joules:.2f} J total, "
+                f"{capture.attributed_joules:.2f} J in prompts, {between:.2f} J between "
+                f"(raw CSV saved to {capture.path})"
+            )
+            if capture.uncovered_s > 0:
+                print(
+                    f"⚠️ {capture.uncovered_s * self.scale:.2f} s of {backend} prompt time fell "
+                    "outside the trace and was not integrated"
+                )
+        self._captures.clear()
+
+
+__all__ = [
+    "PowerCapture",
+    "PowerLogCapture",
+    "PhaseWindow",
+    "PowerSlice",
+    "SampledCapture",
+    "SessionPowerCapture",
+    "covered_window",
+    "integrate",
+]
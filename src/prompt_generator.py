@@ -14,7 +14,7 @@ import random
 import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Sequence
+from typing import Dict, Iterable, List, Optional, Sequence
 
 
 @dataclass
@@ -24,6 +24,8 @@ class Prompt:
     id: str
     text: str
     template: str
+    # Per-prompt overrides of the run's ``budget`` block (see ``budget.py``).
+    budget: Optional[Dict[str, object]] = None
 
     @property
     def length_chars(self) -> int:
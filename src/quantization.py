@@ -0,0 +1,257 @@
+"""Quantization sweeps: GGUF model variants, cache-friendly ordering and perplexity.
+
+Quantization is the largest energy lever we have, but a cheaper variant is
+only worth it if the answers stay good.  A run config can list model variants
+in a top-level ``sweep`` block::
+
+    sweep:
+      models: [Q4_0, Q5_1]          # tags from config/model_hashes.json, or paths
+
+Every run is then repeated once per variant (``<run_id>-q4_0`` ...).  Variants
+are verified against ``config/model_hashes.json`` by the session manifest.
+Runs are grouped by model so all prompts for one model share a warm page cache;
+when the session moves to the next model the previous file is evicted (Linux
+``posix_fadvise``), so each model's first run starts from the same cold state
+instead of from whatever the previous model left behind.
+
+Once a model's runs are done its perplexity on a fixed local text is measured
+with llama.cpp's ``llama-perplexity`` (``session.quality`` block) and appended
+to ``data/quality_results.csv``; a result is reused while the model, text and
+settings are unchanged.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import hashlib
+import os
+import re
+import subprocess
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+MODEL_HASHES = Path("config/model_hashes.json")
+QUALITY_LOG = Path("data/quality_results.csv")
+
+# e.g. "TinyLlama-1.1B-Chat-v1.0.Q4_0.gguf" -> "Q4_0"; also K-quants, IQ and float types.
+QUANT_RE = re.compile(r"[.-]((?:I?Q\d[\w]*)|F16|BF16|F32)\.gguf$", re.IGNORECASE)
+# llama-perplexity: "Final estimate: PPL = 8.1234 +/- 0.05678"
+PPL_RE = re.compile(r"Final estimate:\s*PPL\s*=\s*([\d.]+)(?:\s*\+/-\s*([\d.]+))?")
+
+QUALITY_HEADERS = (
+    "timestamp",
+    "model",
+    "quantization",
+    "model_size_bytes",
+    "text_sha256",
+    "ctx_size",
+    "chunks",
+    "perplexity",
+    "perplexity_stderr",
+    "manifest_id",
+)
+
+
+def quantization_of(model: Path) -> Optional[str]:
+    """Quantization tag encoded in a GGUF file name, upper-cased (``Q4_0``)."""
+    match = QUANT_RE.search(model.name)
+    return match.group(1).upper() if match else None
+
+
+def resolve_variant(variant: str, base_model: Path, known: Iterable[str] = ()) -> Path:
+    """Path of a sweep entry: an explicit path, a known file name, or a quantization tag.
+
+    Tags are matched against the file names in ``model_hashes.json`` first and
+    otherwise substituted into the base model's name, next to the base model.
+    """
+    if "/" in variant or "\\" in variant or variant.lower().endswith(".gguf"):
+        path = Path(variant)
+        return path if path.parent != Path(".") else base_model.parent / path
+    tag = variant.upper()
+    for name in sorted(known):
+        if quantization_of(Path(name)) == tag:
+            return base_model.parent / name
+    match = QUANT_RE.search(base_model.name)
+    if match is None:
+        raise ValueError(f"Cannot derive a {tag} variant from '{base_model.name}'")
+    name = base_model.name
+    return base_model.with_name(name[: match.start(1)] + tag + name[match.end(1):])
+
+
+@dataclass
+class QualitySettings:
+    """How to measure perplexity for each model variant (``session.quality``)."""
+
+    text_file: Path = Path("data/quality/perplexity.txt")
+    ctx_size: int = 512
+    chunks: int = 32
+    perplexity_binary: Optional[Path] = None
+    extra_args: List[str] = field(default_factory=list)
+    enabled: bool = True
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, object]]) -> Optional["QualitySettings"]:
+        if not data:
+            return None
+        known = set(cls.__dataclass_fields__)
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown quality settings: {', '.join(sorted(unknown))}")
+        values = dict(data)
+        for key in ("text_file", "perplexity_binary"):
+            if values.get(key) is not None:
+                values[key] = Path(str(values[key]))
+        return cls(**values)  # type: ignore[arg-type]
+
+    def binary_for(self, llama_binary: Path) -> Path:
+        """``llama-perplexity`` next to the inference binary unless configured."""
+        if self.perplexity_binary is not None:
+            return self.perplexity_binary
+        return llama_binary.with_name("llama-perplexity" + llama_binary.suffix)
+
+
+def group_by_model(items: Sequence, key=lambda item: item.model_path) -> List[List]:
+    """Split ``items`` into consecutive groups sharing a model, in first-seen order."""
+    groups: Dict[Path, List] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return list(groups.values())
+
+
+def expand_model_sweep(runs: Sequence, variants: Sequence[str], known: Iterable[str] = ()) -> List:
+    """Repeat every run (a ``RunSpec``-like dataclass) once per model variant."""
+    known = list(known)
+    expanded = []
+    for run in runs:
+        for variant in variants:
+            model = resolve_variant(variant, run.model_path, known)
+            tag = quantization_of(model) or model.stem
+            expanded.append(replace(
+                run,
+                run_id=f"{run.run_id}-{tag.lower()}",
+                model_path=model,
+                quantization=quantization_of(model),
+            ))
+    return expanded
+
+
+def evict_from_page_cache(path: Path) -> bool:
+    """Drop ``path`` from the OS page cache where the platform allows it."""
+    fadvise = getattr(os, "posix_fadvise", None)
+    if fadvise is None or not path.exists():
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def parse_perplexity(output: str) -> Optional[Dict[str, Optional[float]]]:
+    match = PPL_RE.search(output)
+    if not match:
+        return None
+    stderr = match.group(2)
+    return {
+        "perplexity": float(match.group(1)),
+        "perplexity_stderr": float(stderr) if stderr else None,
+    }
+
+
+def _text_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def cached_quality(
+    model: Path, settings: QualitySettings, log_path: Path = QUALITY_LOG
+) -> Optional[Dict[str, str]]:
+    """Previous result for this model file, text and settings, if any."""
+    if not log_path.exists() or not model.exists() or not settings.text_file.exists():
+        return None
+    text_sha = _text_sha256(settings.text_file)
+    size = str(model.stat().st_size)
+    with log_path.open(newline="", encoding="utf-8") as handle:
+        for row in reversed(list(csv.DictReader(handle))):
+            if (
+                row.get("model") == model.name
+                and row.get("model_size_bytes") == size
+                and row.get("text_sha256") == text_sha
+                and row.get("ctx_size") == str(settings.ctx_size)
+                and row.get("chunks") == str(settings.chunks)
+                and row.get("perplexity")
+            ):
+                return row
+    return None
+
+
+def measure_perplexity(
+    model: Path,
+    llama_binary: Path,
+    settings: QualitySettings,
+    manifest_id: str = "",
+    log_path: Path = QUALITY_LOG,
+) -> Optional[float]:
+    """Perplexity of ``model`` on the configured text, measured once and logged."""
+    cached = cached_quality(model, settings, log_path)
+    if cached is not None:
+        print(f"📚 Perplexity for {model.name}: {float(cached['perplexity']):.3f} (cached)")
+        return float(cached["perplexity"])
+    binary = settings.binary_for(llama_binary.expanduser())
+    if not settings.text_file.exists():
+        print(f"⚠️ Perplexity text {settings.text_file} not found; skipping quality check")
+        return None
+    if not binary.exists():
+        print(f"⚠️ Perplexity tool {binary} not found; skipping quality check")
+        return None
+
+    cmd = [
+        str(binary),
+        "--model", str(model),
+        "--file", str(settings.text_file),
+        "--ctx-size", str(settings.ctx_size),
+        "--chunks", str(settings.chunks),
+        *settings.extra_args,
+    ]
+    print(f"📚 Measuring perplexity of {model.name} on {settings.text_file}...")
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+    parsed = parse_perplexity(result.stdout + result.stderr)
+    if parsed is None:
+        print(f"⚠️ Could not read perplexity for {model.name} (exit {result.returncode})")
+        return None
+
+    record = {
+        "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+        "model": model.name,
+        "quantization": quantization_of(model),
+        "model_size_bytes": model.stat().st_size,
+        "text_sha256": _text_sha256(settings.text_file),
+        "ctx_size": settings.ctx_size,
+        "chunks": settings.chunks,
+        "manifest_id": manifest_id,
+        **parsed,
+    }
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    exists = log_path.exists()
+    with log_path.open("a", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=QUALITY_HEADERS, restval="")
+        if not exists:
+            writer.writeheader()
+        writer.writerow(record)
+    print(f"✅ Perplexity for {model.name}: {parsed['perplexity']:.3f}")
+    return parsed["perplexity"]
+
+
+__all__ = [
+    "QualitySettings",
+    "evict_from_page_cache",
+    "expand_model_sweep",
+    "group_by_model",
+    "measure_perplexity",
+    "parse_perplexity",
+    "quantization_of",
+    "resolve_variant",
+]
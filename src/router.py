@@ -0,0 +1,428 @@
+"""Energy-aware CPU/GPU routing for inference requests.
+
+The benchmarks show CPU and GPU trade energy for latency differently depending
+on prompt shape.  :class:`EnergyAwareRouter` turns that into a serve-time
+decision: per backend it keeps a small linear cost model
+
+    latency_ms    ~ b0 + b1 * prompt_tokens + b2 * output_tokens
+    energy_joules ~ c0 + c1 * prompt_tokens + c2 * output_tokens
+
+fitted from ``latency_results.csv``/``power_logs.csv`` and refined online with
+recursive least squares as new measurements arrive.  A request goes to the
+cheapest backend (in joules) whose predicted latency, inflated by the work
+already queued on it, still meets the latency SLO.  A backend with no history
+has nothing to predict from (its models say 0 ms / 0 J), so it is only
+considered when no backend has been fitted yet.
+
+The fit is only trustworthy where it has data.  Each decision lists
+``caveats`` for its candidates: token counts outside the range the model was
+fitted on (a linear extrapolation), and per-token costs that came out
+negative and were clipped to zero, in which case the prediction ignores that
+input (e.g. a backend flat in ``output_tokens`` costs the same for any
+``n_predict``).
+
+Callers that want a request to count toward its backend's queue pass
+``reserve=True`` and get a reservation token back; the reservation ends with
+the request's feedback, an explicit :meth:`EnergyAwareRouter.release`, or
+after ``reservation_ttl_s`` for clients that never report back.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4.0
+BACKENDS = ("cpu", "gpu")
+# Per-token inputs of the cost models, after the intercept.
+FEATURES = ("prompt_tokens", "output_tokens")
+# Longest a reserved request counts toward its backend's queue without feedback.
+RESERVATION_TTL_S = 300.0
+# ``notes`` marker on latency rows produced by the simulated backend (``llama_sim``).
+SIMULATED_NOTE = "simulated"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap prompt-token estimate used when no tokenizer is at hand."""
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+@dataclass
+class Observation:
+    """One completed request, as measured by the telemetry layer."""
+
+    backend: str
+    prompt_tokens: float
+    output_tokens: float
+    latency_ms: float
+    energy_joules: Optional[float] = None
+    suite: str = ""
+    run_id: str = ""
+
+
+@dataclass
+class RouteDecision:
+    """Chosen backend plus the predictions that justified it."""
+
+    backend: str
+    predicted_latency_ms: float
+    predicted_energy_joules: float
+    meets_slo: bool
+    candidates: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    reservation: Optional[str] = None
+    caveats: List[str] = field(default_factory=list)
+
+
+class OnlineLinearModel:
+    """Recursive least squares with exponential forgetting.
+
+    ``forgetting`` < 1 discounts old samples so the model follows driver
+    updates or thermal drift.  The first feature is the intercept; the others
+    are per-token costs, centred on the training means and ridge-penalized so
+    that a history with little spread in prompt length stays close to "mean
+    cost".  Negative per-token costs are clipped at prediction time so noisy
+    fits never claim longer prompts are cheaper; a clipped feature then has no
+    effect on the prediction (see :attr:`clipped`).  ``low``/``high`` track the
+    range of each per-token feature seen so far.
+    """
+
+    def __init__(
+        self,
+        n_features: int,
+        forgetting: float = 0.995,
+        prior: float = 1e3,
+        ridge: float = 1.0,
+    ) -> None:
+        self.theta = np.zeros(n_features)
+        self.P = np.eye(n_features) * prior
+        self.center = np.zeros(n_features - 1)
+        self.low = np.full(n_features - 1, np.inf)
+        self.high = np.full(n_features - 1, -np.inf)
+        self.forgetting = forgetting
+        self.ridge = ridge
+        self.n_updates = 0
+
+    def _centered(self, x: np.ndarray) -> np.ndarray:
+        centered = np.array(x, dtype=float)
+        centered[..., 1:] -= self.center
+        return centered
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        """Batch ridge fit, seeding the RLS state."""
+        self.center = X[:, 1:].mean(axis=0)
+        self.low = X[:, 1:].min(axis=0)
+        self.high = X[:, 1:].max(axis=0)
+        Xc = self._centered(X)
+        penalty = np.diag([1e-9] + [self.ridge] * (X.shape[1] - 1))
+        gram = Xc.T @ Xc + penalty
+        self.theta = np.linalg.solve(gram, Xc.T @ y)
+        self.P = np.linalg.inv(gram)
+        self.n_updates = len(y)
+
+    @property
+    def clipped(self) -> np.ndarray:
+        """Per-token features whose fitted cost is negative and predicted as zero."""
+        return self.theta[1:] < 0.0
+
+    def outside(self, x: np.ndarray) -> np.ndarray:
+        """Per-token features of ``x`` outside the range the model has seen."""
+        return (x[1:] < self.low) | (x[1:] > self.high)
+
+    def predict(self, x: np.ndarray) -> float:
+        xc = self._centered(x)
+        return float(xc[0] * self.theta[0] + xc[1:] @ np.clip(self.theta[1:], 0.0, None))
+
+    def update(self, x: np.ndarray, y: float) -> None:
+        self.low = np.minimum(self.low, x[1:])
+        self.high = np.maximum(self.high, x[1:])
+        xc = self._centered(x)
+        Px = self.P @ xc
+        gain = Px / (self.forgetting + xc @ Px)
+        self.theta = self.theta + gain * (y - xc @ self.theta)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        self.n_updates += 1
+
+
+@dataclass
+class BackendCostModel:
+    """Latency and energy models for a single backend."""
+
+    latency: OnlineLinearModel = field(default_factory=lambda: OnlineLinearModel(3))
+    energy: OnlineLinearModel = field(default_factory=lambda: OnlineLinearModel(3))
+
+    @staticmethod
+    def features(prompt_tokens: float, output_tokens: float) -> np.ndarray:
+        return np.array([1.0, prompt_tokens, output_tokens])
+
+    @property
+    def fitted(self) -> bool:
+        """Whether both models have seen data; unfitted ones predict 0 ms / 0 J."""
+        return self.latency.n_updates > 0 and self.energy.n_updates > 0
+
+    def predict(self, prompt_tokens: float, output_tokens: float) -> Tuple[float, float]:
+        x = self.features(prompt_tokens, output_tokens)
+        return max(self.latency.predict(x), 0.0), max(self.energy.predict(x), 0.0)
+
+    @property
+    def output_range(self) -> Optional[Tuple[float, float]]:
+        """Fewest and most output tokens the latency model was fitted on."""
+        if self.latency.n_updates == 0:
+            return None
+        index = FEATURES.index("output_tokens")
+        return float(self.latency.low[index]), float(self.latency.high[index])
+
+    def flat_in_output(self) -> bool:
+        """Whether either model ignores output tokens (its slope was clipped)."""
+        index = FEATURES.index("output_tokens")
+        return bool(self.latency.clipped[index] or self.energy.clipped[index])
+
+    def caveats(self, prompt_tokens: float, output_tokens: float) -> List[str]:
+        """Reasons a prediction for this request goes beyond what the fit supports."""
+        if not self.fitted:
+            return ["unfitted"]
+        x = self.features(prompt_tokens, output_tokens)
+        notes = []
+        for index, name in enumerate(FEATURES):
+            if self.latency.outside(x)[index]:
+                low, high = self.latency.low[index], self.latency.high[index]
+                notes.append(f"{name} outside fitted range {low:.0f}-{high:.0f}")
+        for kind, model in (("latency", self.latency), ("energy", self.energy)):
+            for index, name in enumerate(FEATURES):
+                if model.clipped[index]:
+                    notes.append(f"{kind} ignores {name} (negative slope clipped)")
+        return notes
+
+    def fit(self, observations: Sequence[Observation]) -> None:
+        if not observations:
+            return
+        X = np.array([self.features(o.prompt_tokens, o.output_tokens) for o in observations])
+        self.latency.fit(X, np.array([o.latency_ms for o in observations]))
+        with_energy = [o for o in observations if o.energy_joules is not None]
+        if with_energy:
+            Xe = np.array([self.features(o.prompt_tokens, o.output_tokens) for o in with_energy])
+            self.energy.fit(Xe, np.array([o.energy_joules for o in with_energy]))
+
+    def observe(self, obs: Observation) -> None:
+        x = self.features(obs.prompt_tokens, obs.output_tokens)
+        self.latency.update(x, obs.latency_ms)
+        if obs.energy_joules is not None:
+            self.energy.update(x, obs.energy_joules)
+
+
+class EnergyAwareRouter:
+    """Pick the lowest-energy backend that meets a latency SLO under current load."""
+
+    def __init__(
+        self, backends: Iterable[str] = BACKENDS, reservation_ttl_s: float = RESERVATION_TTL_S
+    ) -> None:
+        self.models: Dict[str, BackendCostModel] = {name: BackendCostModel() for name in backends}
+        self.reservation_ttl_s = reservation_ttl_s
+        # token -> (backend, monotonic deadline)
+        self._reservations: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> Dict[str, int]:
+        """Unexpired reservations per backend."""
+        with self._lock:
+            return self._in_flight()
+
+    def _in_flight(self) -> Dict[str, int]:
+        now = time.monotonic()
+        for token, (_, deadline) in list(self._reservations.items()):
+            if deadline <= now:
+                del self._reservations[token]
+        counts = {name: 0 for name in self.models}
+        for backend, _ in self._reservations.values():
+            counts[backend] += 1
+        return counts
+
+    @classmethod
+    def from_telemetry(
+        cls,
+        latency_path: Path = Path("data/latency_results.csv"),
+        power_path: Path = Path("data/power_logs.csv"),
+        backends: Iterable[str] = BACKENDS,
+    ) -> "EnergyAwareRouter":
+        router = cls(backends)
+        observations = load_observations(latency_path, power_path)
+        for name, model in router.models.items():
+            model.fit([o for o in observations if o.backend == name])
+        return router
+
+    def route(
+        self,
+        prompt_tokens: float,
+        n_predict: float,
+        slo_ms: Optional[float] = None,
+        reserve: bool = False,
+    ) -> RouteDecision:
+        """Choose a backend; with ``reserve`` the request counts toward its load.
+
+        A reserved decision carries a ``reservation`` token to pass to
+        :meth:`observe` or :meth:`release` once the request is done.
+        """
+        reservation = None
+        with self._lock:
+            in_flight = self._in_flight()
+            candidates: Dict[str, Dict[str, float]] = {}
+            for name, model in self.models.items():
+                latency, energy = model.predict(prompt_tokens, n_predict)
+                # Backends serve one request at a time, so queued work adds latency.
+                queued_latency = latency * (1 + in_flight[name])
+                candidates[name] = {
+                    "latency_ms": round(queued_latency, 3),
+                    "energy_joules": round(energy, 6),
+                    "in_flight": in_flight[name],
+                    "fitted": model.fitted,
+                    "caveats": model.caveats(prompt_tokens, n_predict),
+                }
+
+            # An unfitted backend would look free and win every request.
+            eligible = [name for name, model in self.models.items() if model.fitted]
+            eligible = eligible or list(candidates)
+            feasible = [
+                name
+                for name in eligible
+                if slo_ms is None or candidates[name]["latency_ms"] <= slo_ms
+            ]
+            if feasible:
+                backend = min(feasible, key=lambda name: candidates[name]["energy_joules"])
+            else:
+                backend = min(eligible, key=lambda name: candidates[name]["latency_ms"])
+            if reserve:
+                reservation = uuid.uuid4().hex
+                deadline = time.monotonic() + self.reservation_ttl_s
+                self._reservations[reservation] = (backend, deadline)
+
+        chosen = candidates[backend]
+        return RouteDecision(
+            backend=backend,
+            predicted_latency_ms=chosen["latency_ms"],
+            predicted_energy_joules=chosen["energy_joules"],
+            meets_slo=bool(feasible),
+            candidates=candidates,
+            reservation=reservation,
+            caveats=chosen["caveats"],
+        )
+
+    def observe(self, obs: Observation, reservation: Optional[str] = None) -> None:
+        """Fold a completed measurement into the backend's model and end its reservation."""
+        with self._lock:
+            self.models[obs.backend].observe(obs)
+            if reservation is not None:
+                self._reservations.pop(reservation, None)
+
+    def release(self, reservation: str) -> Optional[str]:
+        """End a reservation without feedback (failed or abandoned requests).
+
+        Returns the backend it was held on, or ``None`` if it already ended.
+        """
+        with self._lock:
+            held = self._reservations.pop(reservation, None)
+        return None if held is None else held[0]
+
+
+def load_observations(latency_path: Path, power_path: Path) -> List[Observation]:
+    """Join latency rows to the power summary recorded for the same prompt.
+
+    Power summaries are written just before the prompt runs and carry
+    ``prompt=<id>`` in ``notes``; each latency row takes the latest unused
+    power row for its backend and prompt id that precedes it.
+    """
+    latencies = _read_csv(latency_path)
+    powers = _read_csv(power_path)
+
+    pending: Dict[Tuple[str, str], List[Tuple[dt.datetime, Optional[float]]]] = {}
+    for row in powers:
+        prompt_id = _prompt_from_notes(row.get("notes", ""))
+        stamp = _parse_time(row.get("timestamp", ""))
+        if prompt_id is None or stamp is None:
+            continue
+        key = (row.get("backend", ""), prompt_id)
+        pending.setdefault(key, []).append((stamp, _to_float(row.get("energy_joules"))))
+    for entries in pending.values():
+        entries.sort(key=lambda item: item[0])
+
+    observations: List[Observation] = []
+    for row in latencies:
+        if SIMULATED_NOTE in row.get("notes", ""):
+            # Rows produced by the simulated backend must not train the models they came from.
+            continue
+        latency = _to_float(row.get("latency_ms"))
+        stamp = _parse_time(row.get("timestamp", ""))
+        if latency is None or stamp is None:
+            continue
+        backend = row.get("backend", "")
+        energy = _to_float(row.get("energy_joules"))
+        candidates = pending.get((backend, row.get("prompt_id", "")), [])
+        match = None
+        for index, (power_stamp, _) in enumerate(candidates):
+            if power_stamp > stamp:
+                break
+            match = index
+        if match is not None:
+            energy = candidates.pop(match)[1] if energy is None else energy
+        prompt_chars = _to_float(row.get("prompt_length_chars")) or 0.0
+        observations.append(
+            Observation(
+                backend=backend,
+                prompt_tokens=prompt_chars / CHARS_PER_TOKEN,
+                output_tokens=_to_float(row.get("tokens_generated")) or 0.0,
+                latency_ms=latency,
+                energy_joules=energy,
+                suite=row.get("prompt_template", ""),
+                run_id=row.get("run_id", ""),
+            )
+        )
+    return observations
+
+
+def _read_csv(path: Path) -> List[Dict[str, str]]:
+    if not path.exists():
+        return []
+    with path.open(newline="", encoding="utf-8") as handle:
+        return list(csv.DictReader(handle))
+
+
+def _prompt_from_notes(notes: str) -> Optional[str]:
+    for part in notes.replace(";", " ").split():
+        if part.startswith("prompt="):
+            return part[len("prompt="):]
+    return None
+
+
+def _parse_time(value: str) -> Optional[dt.datetime]:
+    try:
+        return dt.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+__all__ = [
+    "BackendCostModel",
+    "EnergyAwareRouter",
+    "FEATURES",
+    "Observation",
+    "OnlineLinearModel",
+    "RESERVATION_TTL_S",
+    "RouteDecision",
+    "estimate_tokens",
+    "load_observations",
+]
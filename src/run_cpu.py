@@ -2,10 +2,10 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
 
-from telemetry import TelemetryLogger
-from workload import configure_prompts, run_prompts
+from runner_daemon import submit
 
 
 def parse_args() -> argparse.Namespace:
@@ -63,26 +63,88 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Skip llama.cpp execution and only exercise telemetry logging",
     )
+    parser.add_argument(
+        "--perf",
+        action="store_true",
+        help="Wrap llama.cpp in perf stat and log hardware counters per prompt",
+    )
+    parser.add_argument(
+        "--energy-budget",
+        type=float,
+        help="Joules each answer may cost; generation stops before overrunning it",
+    )
+    parser.add_argument(
+        "--latency-budget",
+        type=float,
+        help="Milliseconds each answer may take; generation stops before overrunning it",
+    )
+    parser.add_argument(
+        "--allow-unverified-model",
+        action="store_true",
+        help="Run even if the model file does not match config/model_hashes.json",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run the job in a running runner_daemon.py (falls back to running here)",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    if args.daemon:
+        code = submit("run_cpu", [arg for arg in sys.argv[1:] if arg != "--daemon"])
+        if code is not None:
+            raise SystemExit(code)
+        print("⚠️ No runner daemon is running; running here")
+    run(args)
 
-    prompts = configure_prompts(args.prompt_source, args.prompt_file, args.prompt_config)
-    logger = TelemetryLogger()
 
-    run_prompts(
-        prompts=prompts,
-        llama_binary=args.llama_binary,
-        model_path=args.model,
-        backend="cpu",
-        logger=logger,
-        batch_size=args.batch_size,
-        n_predict=args.n_predict,
-        temperature=args.temperature,
+def run(args: argparse.Namespace) -> None:
+    # The harness is imported here so that handing a job to the daemon stays fast.
+    from budget import Budget
+    from llama_sim import DRY_RUN_SPEED, SimulatedLlama
+    from manifest import open_session
+    from perf_counters import PerfCollector
+    from power_capture import SessionPowerCapture
+    from telemetry import TelemetryLogger
+    from workload import configure_prompts, run_prompts
+
+    prompts = configure_prompts(args.prompt_source, args.prompt_file, args.prompt_config)
+    manifest_id = open_session(
+        llama_binaries=[args.llama_binary],
+        models=[args.model],
         dry_run=args.dry_run,
+        allow_unverified=args.allow_unverified_model,
     )
+    logger = TelemetryLogger(manifest_id=manifest_id)
+
+    simulator = None
+    if args.dry_run:
+        simulator = SimulatedLlama.from_telemetry(
+            logger.latency_path, logger.power_path, speed=DRY_RUN_SPEED
+        )
+    with SessionPowerCapture(logger, simulator) as captures:
+        run_prompts(
+            prompts=prompts,
+            llama_binary=args.llama_binary,
+            model_path=args.model,
+            backend="cpu",
+            logger=logger,
+            batch_size=args.batch_size,
+            n_predict=args.n_predict,
+            temperature=args.temperature,
+            dry_run=args.dry_run,
+            perf=PerfCollector() if args.perf else None,
+            simulator=simulator,
+            captures=captures,
+            budget=Budget.from_dict({
+                key: value for key, value in (
+                    ("energy_joules", args.energy_budget), ("latency_ms", args.latency_budget)
+                ) if value is not None
+            }),
+        )
 
 
 if __name__ == "__main__":
@@ -2,14 +2,35 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
 import json
-from dataclasses import dataclass
+import random
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Iterable, List, Optional
 
 import yaml
 
+from budget import Budget, BudgetPlanner
+from dvfs import FrequencySetting, applied, expand_frequency_sweep, recover
+from llama_sim import DRY_RUN_SPEED, SimulatedLlama
+from manifest import open_session
+from metrics import FileExporter
+from perf_counters import PerfCollector
+from power_capture import SessionPowerCapture
+from quantization import (
+    MODEL_HASHES,
+    QualitySettings,
+    evict_from_page_cache,
+    expand_model_sweep,
+    group_by_model,
+    measure_perplexity,
+    quantization_of,
+)
 from telemetry import TelemetryLogger
+from thermal import ThermalMonitor, ThermalPolicy
+from topology import Placement, Topology, expand_placement_sweep, placement_sweep
+from tracing import PROFILERS, TRACER, span
 from workload import configure_prompts, run_prompts
 
 
@@ -30,6 +51,23 @@ class RunSpec:
     temperature: float
     gpu_layers: Optional[int]
     extra_args: List[str]
+    perf_counters: bool = False
+    quantization: Optional[str] = None
+    placement: Optional[Placement] = None
+    frequency: Optional[FrequencySetting] = None
+    budget: Optional[Budget] = None
+
+
+@dataclass
+class SessionOptions:
+    """Session-wide settings from the optional top-level ``session`` block."""
+
+    thermal: ThermalPolicy = field(default_factory=ThermalPolicy)
+    shuffle: bool = False
+    seed: Optional[int] = None
+    quality: Optional[QualitySettings] = None
+    # One power capture per backend for the whole session, sliced per prompt.
+    continuous_power: bool = True
 
 
 def parse_args() -> argparse.Namespace:
@@ -62,7 +100,68 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--dry-run",
         action="store_true",
-        help="Skip llama.cpp invocation; useful for CI validation.",
+        help="Use the simulated llama.cpp backend (llama_sim.py) instead of llama.cpp.",
+    )
+    parser.add_argument(
+        "--sim-speed",
+        type=float,
+        default=DRY_RUN_SPEED,
+        help="With --dry-run, run the simulated backend this many times faster than real time.",
+    )
+    parser.add_argument(
+        "--shuffle",
+        action="store_true",
+        help="Randomize run order so thermal drift does not bias one configuration.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed for --shuffle; recorded so an ordering can be reproduced.",
+    )
+    parser.add_argument(
+        "--no-thermal-wait",
+        action="store_true",
+        help="Start each run immediately instead of waiting for the thermal baseline.",
+    )
+    parser.add_argument(
+        "--perf",
+        action="store_true",
+        help="Record hardware counters for CPU runs with perf stat (Linux only).",
+    )
+    parser.add_argument(
+        "--allow-unverified-model",
+        action="store_true",
+        help="Run even if a model file does not match config/model_hashes.json.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        help="Keep OpenMetrics text for the session in this file (e.g. data/metrics.prom).",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between rewrites of --metrics-file.",
+    )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        type=Path,
+        const=True,
+        help="Record a span trace of the harness (Chrome trace JSON; default data/traces/).",
+    )
+    parser.add_argument(
+        "--profile-stage",
+        action="append",
+        default=[],
+        help="With --trace, also profile every span with this name (can repeat).",
+    )
+    parser.add_argument(
+        "--profiler",
+        choices=PROFILERS,
+        default="cprofile",
+        help="Profiler for --profile-stage: cProfile stats or sampled collapsed stacks.",
     )
     return parser.parse_args()
 
@@ -123,11 +222,72 @@ def load_config(path: Path) -> List[RunSpec]:
                 temperature=temperature,
                 gpu_layers=gpu_layers,
                 extra_args=extra_args,
+                perf_counters=bool(
+                    entry.get("perf_counters", defaults.get("perf_counters", False))
+                ),
+                quantization=quantization_of(model_path),
+                placement=Placement.from_dict(entry.get("placement", defaults.get("placement"))),
+                frequency=FrequencySetting.from_dict(
+                    entry.get("frequency", defaults.get("frequency"))
+                ),
+                budget=Budget.from_dict(entry.get("budget", defaults.get("budget"))),
             )
         )
+
+    sweep = data.get("sweep") or {}
+    placements = sweep.get("placements")
+    if placements == "auto":
+        runs = expand_placement_sweep(runs, placement_sweep(Topology.discover()))
+    elif placements:
+        runs = expand_placement_sweep(runs, [Placement.from_dict(p) for p in placements])
+
+    frequencies = sweep.get("frequencies")
+    if frequencies:
+        runs = expand_frequency_sweep(
+            runs, [FrequencySetting.from_dict(f) or FrequencySetting() for f in frequencies]
+        )
+
+    variants = sweep.get("models")
+    if variants:
+        known = {}
+        if MODEL_HASHES.exists():
+            known = json.loads(MODEL_HASHES.read_text(encoding="utf-8"))
+        runs = expand_model_sweep(runs, [str(v) for v in variants], known)
     return runs
 
 
+def load_session_options(path: Path) -> SessionOptions:
+    data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    session = data.get("session") or {}
+    return SessionOptions(
+        thermal=ThermalPolicy.from_dict(session.get("thermal")),
+        shuffle=bool(session.get("shuffle", False)),
+        seed=session.get("seed"),
+        quality=QualitySettings.from_dict(session.get("quality")),
+        continuous_power=bool(session.get("continuous_power", True)),
+    )
+
+
+def order_runs(runs: List[RunSpec], options: SessionOptions) -> List[RunSpec]:
+    """Return runs in execution order, shuffled when the session asks for it.
+
+    Runs sharing a model stay together so the model is read from disk once;
+    shuffling permutes the model groups and the runs within each group.
+    """
+    groups = group_by_model(runs)
+    if not options.shuffle:
+        return [run for group in groups for run in group]
+    seed = options.seed if options.seed is not None else random.randrange(2**32)
+    rng = random.Random(seed)
+    if len(groups) > 1:
+        rng.shuffle(groups)
+    for group in groups:
+        rng.shuffle(group)
+    ordered = [run for group in groups for run in group]
+    print(f"🔀 Shuffled run order (seed={seed}): {', '.join(run.run_id for run in ordered)}")
+    return ordered
+
+
 def filter_runs(runs: Iterable[RunSpec], args: argparse.Namespace) -> List[RunSpec]:
     selected: List[RunSpec] = []
     allowed_ids = set(args.run_ids or [])
@@ -145,38 +305,159 @@ def filter_runs(runs: Iterable[RunSpec], args: argparse.Namespace) -> List[RunSp
     return selected
 
 
-def execute_runs(runs: Iterable[RunSpec], dry_run: bool = False) -> None:
-    logger = TelemetryLogger()
-    for spec in runs:
-        print(f"\n=== Running {spec.run_id} ({spec.suite}, {spec.backend}) ===")
-        prompts = configure_prompts(spec.prompt_source, spec.prompt_file, spec.prompt_config)
-
-        run_prompts(
-            prompts=prompts,
-            llama_binary=spec.llama_binary,
-            model_path=spec.model_path,
-            backend=spec.backend,
-            logger=logger,
-            batch_size=spec.batch_size,
-            n_predict=spec.n_predict,
-            temperature=spec.temperature,
+def execute_runs(
+    runs: Iterable[RunSpec],
+    dry_run: bool = False,
+    options: Optional[SessionOptions] = None,
+    perf: bool = False,
+    config_path: Optional[Path] = None,
+    allow_unverified: bool = False,
+    sim_speed: float = DRY_RUN_SPEED,
+) -> None:
+    runs = list(runs)
+    options = options or SessionOptions()
+    with span("open_session"):
+        manifest_id = open_session(
+            llama_binaries=[spec.llama_binary for spec in runs],
+            models=[spec.model_path for spec in runs],
+            run_ids=[spec.run_id for spec in runs],
+            config_path=config_path,
             dry_run=dry_run,
-            extra_args=spec.extra_args,
-            run_id=spec.run_id,
+            allow_unverified=allow_unverified,
         )
 
-        print(f"✅ Completed {spec.run_id}")
+    if not dry_run:
+        recover()
+
+    collector = PerfCollector()
+    logger = TelemetryLogger(
+        throttle_temp_c=options.thermal.throttle_temp_c, manifest_id=manifest_id
+    )
+    monitor = ThermalMonitor() if options.thermal.enabled and not dry_run else None
+    simulator = None
+    if dry_run:
+        with span("fit_simulator"):
+            simulator = SimulatedLlama.from_telemetry(
+                logger.latency_path, logger.power_path, speed=sim_speed, seed=options.seed
+            )
+    captures = SessionPowerCapture(logger, simulator) if options.continuous_power else None
+    # One planner for the session, so what one run learns about costs carries to the next.
+    planner = None
+    if any(spec.budget is not None for spec in runs):
+        planner = BudgetPlanner.from_telemetry(logger.latency_path, logger.power_path)
+    sweeping = len({spec.model_path for spec in runs}) > 1
+    try:
+        for index, spec in enumerate(runs):
+            with span("run", run_id=spec.run_id):
+                print(f"\n=== Running {spec.run_id} ({spec.suite}, {spec.backend}) ===")
+                if monitor is not None:
+                    with span("thermal_wait"):
+                        sample = monitor.wait_for_baseline(options.thermal)
+                    if sample.max_temp_c is not None:
+                        print(f"🌡️ Starting at {sample.max_temp_c:.1f}°C")
+                with span("configure_prompts"):
+                    prompts = configure_prompts(
+                        spec.prompt_source, spec.prompt_file, spec.prompt_config
+                    )
+
+                # Dry runs record the requested setting but leave the hardware alone.
+                with applied(None if dry_run else spec.frequency, spec.run_id) as state:
+                    if spec.frequency is not None:
+                        logger.log_run_settings(
+                            spec.run_id, asdict(spec.frequency), state, applied=not dry_run
+                        )
+                    run_prompts(
+                        prompts=prompts,
+                        llama_binary=spec.llama_binary,
+                        model_path=spec.model_path,
+                        backend=spec.backend,
+                        logger=logger,
+                        batch_size=spec.batch_size,
+                        n_predict=spec.n_predict,
+                        temperature=spec.temperature,
+                        dry_run=dry_run,
+                        extra_args=spec.extra_args,
+                        run_id=spec.run_id,
+                        perf=collector if perf or spec.perf_counters else None,
+                        placement=spec.placement,
+                        simulator=simulator,
+                        captures=captures,
+                        budget=spec.budget,
+                        planner=planner,
+                    )
+
+                print(f"✅ Completed {spec.run_id}")
+
+                last_for_model = (
+                    index + 1 == len(runs) or runs[index + 1].model_path != spec.model_path
+                )
+                if last_for_model and not dry_run:
+                    if options.quality is not None and options.quality.enabled:
+                        with span("perplexity", model=spec.model_path.name):
+                            measure_perplexity(
+                                spec.model_path.expanduser(), spec.llama_binary, options.quality,
+                                manifest_id,
+                            )
+                    if sweeping and evict_from_page_cache(spec.model_path.expanduser()):
+                        print(f"🧹 Evicted {spec.model_path.name} from the page cache")
+    finally:
+        # A PowerLog capture outlives this process unless it is stopped.
+        if captures is not None:
+            with span("close_captures"):
+                captures.close()
+        if monitor is not None:
+            monitor.close()
 
 
 def main() -> None:
     args = parse_args()
+    if args.trace:
+        TRACER.enable(
+            None if args.trace is True else args.trace, args.profile_stage, args.profiler
+        )
+    try:
+        run_session(args)
+    finally:
+        TRACER.write()
+
+
+def run_session(args: argparse.Namespace) -> None:
     config_path = args.config
-    runs = load_config(config_path)
+    with span("load_config"):
+        runs = load_config(config_path)
     filtered = filter_runs(runs, args)
     if not filtered:
         raise SystemExit("No runs selected. Adjust your filters or configuration file.")
 
-    execute_runs(filtered, dry_run=args.dry_run)
+    options = load_session_options(config_path)
+    if args.shuffle:
+        options.shuffle = True
+    if args.seed is not None:
+        options.seed = args.seed
+    if args.no_thermal_wait:
+        options.thermal.enabled = False
+    quality = options.quality
+    if not args.dry_run and quality is not None and quality.enabled:
+        if not quality.text_file.exists():
+            raise SystemExit(
+                f"Perplexity text {quality.text_file} not found. Provide the evaluation text "
+                "or set session.quality.enabled: false in the config."
+            )
+
+    exporter = (
+        FileExporter(args.metrics_file, interval_s=args.metrics_interval)
+        if args.metrics_file else contextlib.nullcontext()
+    )
+    with exporter:
+        execute_runs(
+            order_runs(filtered, options),
+            dry_run=args.dry_run,
+            options=options,
+            perf=args.perf,
+            config_path=config_path,
+            allow_unverified=args.allow_unverified_model,
+            sim_speed=args.sim_speed,
+        )
 
 
 if __name__ == "__main__":
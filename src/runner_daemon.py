@@ -0,0 +1,250 @@
+"""Long-lived runner that ``run_cpu.py``/``run_gpu.py`` hand their jobs to.
+
+Each CLI invocation otherwise starts a fresh interpreter and imports the
+whole harness (numpy, the router, the simulator, power capture) before the
+first prompt runs.  The daemon imports all of that once and then runs jobs
+submitted over a local socket::
+
+    python src/runner_daemon.py                  # keep running (Ctrl+C to stop)
+    python src/run_cpu.py --daemon --model ...   # runs inside the daemon
+    python src/runner_daemon.py --stop
+
+A submitted job runs the CLI's ``main()`` in the daemon with the client's
+arguments and working directory, and its output is streamed back; the
+client exits with the job's exit code.  Jobs run one at a time so their
+measurements never overlap, and a client that goes away cancels its job at
+its next line of output.  The socket listens on 127.0.0.1 only and is
+authenticated with a random key kept, with the port, in
+``data/.runner_daemon.json``.  Without a reachable daemon ``--daemon``
+runs the job locally.
+
+This module only needs the standard library, so submitting a job costs
+next to nothing.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from tracing import TRACER
+
+ADDRESS_FILE = Path("data/.runner_daemon.json")
+ENTRY_POINTS = ("run_cpu", "run_gpu")
+# Imported up front so jobs find them warm; pandas is only needed for PowerLog CSVs.
+PRELOAD = ("workload", "power_capture", "telemetry", "manifest", "pandas")
+STOP = "stop"
+
+
+class _ConnectionStream(io.TextIOBase):
+    """A text stream that forwards writes to the submitting client."""
+
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+        # Power capture threads print while the job's main thread does.
+        self._lock = threading.Lock()
+        self.client_left = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        # The first failed write cancels the job; after that output is dropped
+        # so cleanup code that prints (restoring clocks, stopping captures) runs.
+        if text and not self.client_left:
+            with self._lock:
+                try:
+                    self.conn.send(("out", text))
+                except OSError:
+                    self.client_left = True
+                    raise
+        return len(text)
+
+
+def _read_address(path: Path) -> Optional[Dict[str, object]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_address(path: Path, info: Dict[str, object]) -> None:
+    # The file holds the auth key: create it readable by this user only.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(info, handle)
+    os.replace(tmp, path)
+
+
+def _connect(path: Path) -> Optional[Connection]:
+    info = _read_address(path)
+    if info is None:
+        return None
+    try:
+        return Client(
+            (str(info["host"]), int(info["port"])), authkey=bytes.fromhex(str(info["authkey"]))
+        )
+    except (OSError, AuthenticationError, EOFError):
+        # A daemon that died without cleaning up leaves a stale file behind.
+        return None
+
+
+def submit(entry: str, argv: Sequence[str], address_file: Path = ADDRESS_FILE) -> Optional[int]:
+    """Run ``entry``'s ``main()`` with ``argv`` on the daemon and stream its output here.
+
+    Returns the job's exit code, or ``None`` when no daemon is reachable.
+    """
+    conn = _connect(address_file)
+    if conn is None:
+        return None
+    with conn:
+        conn.send({"entry": entry, "argv": list(argv), "cwd": os.getcwd()})
+        while True:
+            try:
+                kind, payload = conn.recv()
+            except EOFError:
+                print("⚠️ Runner daemon went away mid-job", file=sys.stderr)
+                return 1
+            if kind == "out":
+                sys.stdout.write(payload)
+                sys.stdout.flush()
+            else:
+                return int(payload)
+
+
+def _run_job(job: Dict[str, object], conn: Connection) -> int:
+    entry = job.get("entry")
+    stream = _ConnectionStream(conn)
+    if entry not in ENTRY_POINTS:
+        stream.write(f"❌ Unknown entry point '{entry}' (expected one of {ENTRY_POINTS})\n")
+        return 2
+    module = importlib.import_module(str(entry))
+    saved_argv, saved_cwd = sys.argv, os.getcwd()
+    sys.argv = [f"{entry}.py", *job.get("argv", [])]
+    code = 0
+    try:
+        os.chdir(str(job["cwd"]))
+        with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+            module.main()
+    except SystemExit as exc:
+        if isinstance(exc.code, int) or exc.code is None:
+            code = exc.code or 0
+        else:
+            stream.write(f"{exc.code}\n")
+            code = 1
+    except (BrokenPipeError, ConnectionResetError, EOFError):
+        print(f"⚠️ Client left; cancelled {entry}")
+        code = 1
+    except Exception:
+        with contextlib.suppress(OSError):
+            stream.write(traceback.format_exc())
+        code = 1
+    finally:
+        sys.argv = saved_argv
+        os.chdir(saved_cwd)
+        TRACER.reset()
+    return code
+
+
+def serve(port: int = 0, address_file: Path = ADDRESS_FILE) -> None:
+    """Accept and run jobs until stopped."""
+    started = time.perf_counter()
+    for name in PRELOAD + ENTRY_POINTS:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"⚠️ Could not preload {name}: {e}")
+    print(f"🔥 Preloaded the harness in {time.perf_counter() - started:.2f}s")
+
+    authkey = secrets.token_bytes(32)
+    with Listener(("127.0.0.1", port), authkey=authkey) as listener:
+        host, port = listener.address
+        _write_address(address_file, {
+            "host": host, "port": port, "authkey": authkey.hex(), "pid": os.getpid(),
+        })
+        print(f"🛎️ Runner daemon listening on {host}:{port} (address in {address_file})")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError) as e:
+                    print(f"⚠️ Rejected a connection: {e}")
+                    continue
+                with conn:
+                    try:
+                        job = conn.recv()
+                    except EOFError:
+                        continue
+                    if job == STOP:
+                        print("👋 Stopping runner daemon")
+                        break
+                    argv: List[str] = list(job.get("argv", []))
+                    print(f"▶️ {job.get('entry')} {' '.join(argv)}")
+                    code = _run_job(job, conn)
+                    with contextlib.suppress(OSError):
+                        conn.send(("exit", code))
+                    print(f"⏹️ {job.get('entry')} exited with {code}")
+        except KeyboardInterrupt:
+            print("👋 Stopping runner daemon")
+        finally:
+            address_file.unlink(missing_ok=True)
+
+
+def stop(address_file: Path = ADDRESS_FILE) -> bool:
+    conn = _connect(address_file)
+    if conn is None:
+        return False
+    with conn:
+        conn.send(STOP)
+    return True
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run run_cpu.py/run_gpu.py jobs in one process.")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=0,
+        help="Port on 127.0.0.1 to listen on (default: any free port).",
+    )
+    parser.add_argument(
+        "--stop",
+        action="store_true",
+        help="Stop the running daemon.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.stop:
+        print("👋 Stopped runner daemon" if stop() else "No runner daemon is running")
+        return
+    serve(args.port)
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "ADDRESS_FILE",
+    "ENTRY_POINTS",
+    "serve",
+    "stop",
+    "submit",
+]
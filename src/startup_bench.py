@@ -0,0 +1,168 @@
+"""Startup-time budget for the command-line entry points.
+
+Short interactive runs pay interpreter start-up and imports before the first
+prompt; pandas alone costs more than the rest of a CLI.  This benchmark
+imports each entry point in a fresh interpreter, takes the median over a few
+repeats, and fails (exit code 1) when one is over its budget or imports a
+module it should only load on the code path that needs it::
+
+    python src/startup_bench.py              # check every entry point
+    python src/startup_bench.py --repeat 10 run_cpu
+
+An entry over budget also gets its slowest imports listed (from
+``python -X importtime``) to show what to defer.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+SRC = Path(__file__).resolve().parent
+# Never needed just to start a measurement run.
+HEAVY = ("pandas", "polars", "matplotlib", "seaborn", "scipy", "flask", "http.server")
+
+
+@dataclass(frozen=True)
+class EntryBudget:
+    """Import-time ceiling for one entry point and the modules it must not import."""
+
+    module: str
+    import_ms: float
+    lazy: Tuple[str, ...] = HEAVY
+
+
+BUDGETS = (
+    # run_cpu/run_gpu only parse arguments before handing a job to the daemon.
+    EntryBudget("run_cpu", 60.0, HEAVY + ("numpy",)),
+    EntryBudget("run_gpu", 60.0, HEAVY + ("numpy",)),
+    EntryBudget("runner_daemon", 60.0, HEAVY + ("numpy",)),
+    EntryBudget("run_session", 250.0),
+    EntryBudget("workload", 250.0),
+    EntryBudget("interface.bridge", 250.0),
+    EntryBudget("demo_server", 600.0, ("pandas", "polars", "matplotlib", "seaborn", "scipy")),
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000.0
+print(json.dumps({{"ms": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+@dataclass
+class StartupResult:
+    module: str
+    budget_ms: float
+    median_ms: float
+    samples_ms: List[float]
+    eager: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.median_ms <= self.budget_ms and not self.eager
+
+
+def _probe(module: str) -> Dict[str, object]:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        check=True, capture_output=True, text=True, cwd=SRC,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(budget: EntryBudget, repeat: int = 5) -> StartupResult:
+    """Median import time of ``budget.module`` over ``repeat`` fresh interpreters."""
+    samples, modules = [], set()
+    for _ in range(repeat):
+        probe = _probe(budget.module)
+        samples.append(float(probe["ms"]))
+        modules.update(probe["modules"])
+    return StartupResult(
+        module=budget.module,
+        budget_ms=budget.import_ms,
+        median_ms=statistics.median(samples),
+        samples_ms=samples,
+        eager=sorted(name for name in budget.lazy if name in modules),
+    )
+
+
+def slowest_imports(module: str, top: int = 8) -> List[Tuple[str, int]]:
+    """``(module, cumulative_us)`` of the costliest imports under ``python -X importtime``."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True, capture_output=True, text=True, cwd=SRC,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if name != module:
+            rows.append((name, int(parts[1])))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def run_benchmark(modules: Sequence[str] = (), repeat: int = 5) -> List[StartupResult]:
+    selected = [b for b in BUDGETS if not modules or b.module in modules]
+    unknown = set(modules) - {b.module for b in BUDGETS}
+    if unknown:
+        raise ValueError(f"No startup budget for {', '.join(sorted(unknown))}")
+    results = []
+    for budget in selected:
+        result = measure(budget, repeat)
+        results.append(result)
+        mark = "✅" if result.ok else "❌"
+        print(f"{mark} {result.module:<18} {result.median_ms:>7.1f} ms "
+              f"(budget {result.budget_ms:.0f} ms)")
+        if result.eager:
+            print(f"   imports {', '.join(result.eager)} at start-up")
+        if result.median_ms > result.budget_ms:
+            for name, cumulative_us in slowest_imports(result.module):
+                print(f"   {cumulative_us / 1000.0:>7.1f} ms  {name}")
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check CLI start-up against its import budget.")
+    parser.add_argument(
+        "modules",
+        nargs="*",
+        help="Entry points to check (default: all).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Fresh interpreters per entry point; the median is compared with the budget.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    results = run_benchmark(args.modules, args.repeat)
+    if not all(result.ok for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "BUDGETS",
+    "EntryBudget",
+    "StartupResult",
+    "measure",
+    "run_benchmark",
+    "slowest_imports",
+]
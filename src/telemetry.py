@@ -3,13 +3,21 @@ from __future__ import annotations
 
 import csv
 import datetime as dt
+import shutil
 import subprocess
 import tempfile
-import shutil
-import pandas as pd
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from clock import ANCHOR_LOG, raw_trace_name, record_anchor
+from llama_sim import write_power_trace
+from thermal import NVML_THERMAL_REASONS, throttled_powerlog_rows
+from tracing import span, traced
+
+if TYPE_CHECKING:
+    from budget import Budget, BudgetPlan
 
 
 @dataclass
@@ -18,7 +26,16 @@ class TelemetryLogger:
 
     latency_path: Path = Path("data/latency_results.csv")
     power_path: Path = Path("data/power_logs.csv")
+    perf_path: Path = Path("data/perf_counters.csv")
+    marker_path: Path = Path("data/power_markers.csv")
+    phase_path: Path = Path("data/phase_energy.csv")
+    settings_path: Path = Path("data/run_settings.csv")
+    budget_path: Path = Path("data/budget_usage.csv")
+    anchor_path: Path = ANCHOR_LOG
     powerlog_path: Path = Path(r"C:\Program Files\Intel\Power Gadget 3.6\PowerLog3.0.exe")
+    throttle_temp_c: float = 95.0
+    # Id of the session's environment manifest (see ``manifest.py``), stamped on every row.
+    manifest_id: str = ""
 
     _latency_headers: Iterable[str] = field(
         default_factory=lambda: (
@@ -32,6 +49,9 @@ class TelemetryLogger:
             "tokens_generated",
             "energy_joules",
             "notes",
+            "monotonic_ns",
+            "manifest_id",
+            "model",
         )
     )
 
@@ -50,6 +70,7 @@ class TelemetryLogger:
         energy_joules: Optional[float] = None,
         notes: str = "",
         run_id: str = "unknown",
+        model: str = "",
     ) -> None:
         """Record a single latency measurement."""
         record = {
@@ -63,35 +84,187 @@ class TelemetryLogger:
             "tokens_generated": tokens_generated,
             "energy_joules": None if energy_joules is None else round(energy_joules, 6),
             "notes": notes,
+            "monotonic_ns": time.monotonic_ns(),
+            "manifest_id": self.manifest_id,
+            "model": model,
         }
         self._append_row(self.latency_path, self._latency_headers, record)
 
     def log_power_sample(self, sample: Dict[str, float]) -> None:
         """Append a raw power telemetry sample to ``power_logs.csv``."""
+        sample = {**sample, "manifest_id": self.manifest_id}
         headers = tuple(sample.keys())
         self._append_row(self.power_path, headers, sample)
 
+    def log_perf_counters(
+        self,
+        run_id: str,
+        prompt_id: str,
+        counters: Dict[str, Optional[float]],
+    ) -> None:
+        """Append hardware-counter totals for one prompt to ``perf_counters.csv``."""
+        record: Dict[str, object] = {
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "run_id": run_id,
+            "prompt_id": prompt_id,
+            "manifest_id": self.manifest_id,
+        }
+        record.update(counters)
+        self._append_row(self.perf_path, tuple(record.keys()), record)
+
+    def log_marker(
+        self, trace: str, run_id: str, prompt_id: str, event: str, monotonic_ns: int
+    ) -> None:
+        """Append a prompt start/end marker for a session-long power trace."""
+        record = {
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "monotonic_ns": monotonic_ns,
+            "trace": trace,
+            "run_id": run_id,
+            "prompt_id": prompt_id,
+            "event": event,
+            "manifest_id": self.manifest_id,
+        }
+        self._append_row(self.marker_path, tuple(record.keys()), record)
+
+    def log_phase_energy(
+        self,
+        run_id: str,
+        backend: str,
+        prompt_id: str,
+        phase: str,
+        start_ns: int,
+        end_ns: int,
+        tokens: Optional[int],
+        energy_joules: float,
+        scale: float = 1.0,
+    ) -> None:
+        """Append the energy of one phase (load/prefill/decode) of a prompt.
+
+        ``scale`` converts a simulator's compressed time (and the energy measured
+        over it) back to model time; the monotonic stamps stay on the trace's clock.
+        """
+        energy_joules *= scale
+        record = {
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "run_id": run_id,
+            "backend": backend,
+            "prompt_id": prompt_id,
+            "phase": phase,
+            "start_monotonic_ns": start_ns,
+            "end_monotonic_ns": end_ns,
+            "duration_ms": round((end_ns - start_ns) / 1e6 * scale, 3),
+            "tokens": tokens,
+            "energy_joules": round(energy_joules, 6),
+            "j_per_token": round(energy_joules / tokens, 6) if tokens else None,
+            "manifest_id": self.manifest_id,
+        }
+        self._append_row(self.phase_path, tuple(record.keys()), record)
+
+    def log_run_settings(
+        self, run_id: str, requested: Dict[str, object], actual: Dict[str, object], applied: bool
+    ) -> None:
+        """Append the frequency/power-limit settings a run asked for and what the hardware took."""
+        record = {
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "run_id": run_id,
+            **requested,
+            **actual,
+            "applied": applied,
+            "manifest_id": self.manifest_id,
+        }
+        self._append_row(self.settings_path, tuple(record.keys()), record)
+
+    def log_budget_usage(
+        self,
+        run_id: str,
+        prompt_id: str,
+        budget: "Budget",
+        plan: "BudgetPlan",
+        n_predict: int,
+        tokens: Optional[int],
+        energy_joules: Optional[float],
+        latency_ms: float,
+        outcome: str,
+    ) -> None:
+        """Append one budgeted prompt: its budget, the plan chosen for it and what it used."""
+        record = {
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "run_id": run_id,
+            "prompt_id": prompt_id,
+            "backend": plan.backend,
+            "model": plan.model_path.name,
+            "fallback": plan.fallback,
+            "budget_joules": budget.energy_joules,
+            "budget_ms": budget.latency_ms,
+            "n_predict": n_predict,
+            "planned_n_predict": plan.n_predict,
+            "predicted_joules": round(plan.predicted_energy_joules, 6),
+            "predicted_ms": round(plan.predicted_latency_ms, 3),
+            "tokens": tokens,
+            "used_joules": round(energy_joules, 6) if energy_joules is not None else None,
+            "used_ms": round(latency_ms, 3),
+            "outcome": outcome,
+            "caveats": "; ".join(plan.caveats),
+            "manifest_id": self.manifest_id,
+        }
+        self._append_row(self.budget_path, tuple(record.keys()), record)
+
     def _append_row(self, path: Path, headers: Iterable[str], row: Dict[str, object]) -> None:
-        exists = path.exists()
-        with path.open("a", newline="", encoding="utf-8") as handle:
-            writer = csv.DictWriter(handle, fieldnames=headers)
-            if not exists:
-                writer.writeheader()
-            writer.writerow(row)
+        with span("csv_append", file=path.name):
+            fieldnames = self._ensure_header(path, headers)
+            exists = path.exists()
+            with path.open("a", newline="", encoding="utf-8") as handle:
+                writer = csv.DictWriter(handle, fieldnames=fieldnames, restval="")
+                if not exists:
+                    writer.writeheader()
+                writer.writerow(row)
+
+    def _ensure_header(self, path: Path, headers: Iterable[str]) -> List[str]:
+        """Return the column order for ``path``, widening the file if new columns appear.
 
+        Older CSVs predate columns such as ``throttled_fraction``; rather than
+        appending misaligned rows we rewrite the file once with the union header.
+        """
+        headers = list(headers)
+        if not path.exists():
+            return headers
+        with path.open(newline="", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            existing = next(reader, [])
+            missing = [name for name in headers if name not in existing]
+            if not existing or not missing:
+                return existing or headers
+            rows = list(reader)
+        widened = existing + missing
+        with path.open("w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(widened)
+            for row in rows:
+                writer.writerow(row + [""] * (len(widened) - len(row)))
+        return widened
+
+    @traced("powerlog_capture")
     def record_cpu_power(self, duration: int = 5, notes: str = "") -> None:
         """Run Intel PowerLog for a duration and append results to power_logs.csv."""
         tmp_file = Path(tempfile.gettempdir()) / "powerlog_temp.csv"
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        dest_raw = self.power_path.parent / raw_trace_name("cpu", stamp)
 
-        # 1. Launch PowerLog
+        # 1. Launch PowerLog, anchoring its local-time samples to our clocks
         cmd = [str(self.powerlog_path), "-duration", str(duration), "-file", str(tmp_file)]
+        record_anchor(f"{dest_raw.name}:start", self.anchor_path)
         subprocess.run(cmd, check=True)
+        record_anchor(f"{dest_raw.name}:end", self.anchor_path)
 
         # 2. Read the generated CSV
         if not tmp_file.exists():
             print("⚠️ PowerLog did not produce a file")
             return
 
+        # pandas costs more to import than the rest of the CLI; only this path needs it.
+        import pandas as pd
+
         df = pd.read_csv(tmp_file)
 
         # 3. Compute total energy (joules)
@@ -101,19 +274,32 @@ class TelemetryLogger:
         else:
             joules = None
 
-        # 4. Append a summary row
+        # 4. Flag samples taken while the package was throttling
+        throttled = throttled_powerlog_rows(df.to_dict("records"), self.throttle_temp_c)
+        throttled_fraction = sum(throttled) / len(throttled) if throttled else None
+        max_temp = (
+            df["Package Temperature_0(C)"].max()
+            if "Package Temperature_0(C)" in df.columns
+            else None
+        )
+        if throttled_fraction:
+            print(f"⚠️ CPU throttled for {throttled_fraction:.0%} of samples ({notes})")
+
+        # 5. Append a summary row
         self.log_power_sample({
             "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
             "backend": "cpu",
             "energy_joules": joules,
             "notes": notes,
+            "max_temp_c": max_temp,
+            "throttled_fraction": throttled_fraction,
         })
 
-        # 5. Save raw Intel log
-        dest_raw = self.power_path.parent / f"raw_cpu_power_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        # 6. Save raw Intel log
         shutil.move(str(tmp_file), dest_raw)
         print(f"✅ CPU power logged: {joules:.2f} J (raw CSV saved to {dest_raw})")
 
+    @traced("nvml_capture")
     def record_gpu_power(self, duration: int = 5, notes: str = "") -> None:
         """Sample GPU power using pynvml for a duration."""
         try:
@@ -131,45 +317,102 @@ class TelemetryLogger:
 
         # Sample power every 100ms
         samples = []
-        start_time = dt.datetime.now()
-        end_time = start_time + dt.timedelta(seconds=duration)
-        
-        import time
-        while dt.datetime.now() < end_time:
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        dest_raw = self.power_path.parent / raw_trace_name("gpu", stamp)
+        record_anchor(f"{dest_raw.name}:start", self.anchor_path)
+        end_ns = time.monotonic_ns() + int(duration * 1e9)
+
+        while time.monotonic_ns() < end_ns:
             try:
                 # nvmlDeviceGetPowerUsage returns milliwatts
                 power_mw = pynvml.nvmlDeviceGetPowerUsage(handle)
-                samples.append({
+                sample = {
                     "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
-                    "power_w": power_mw / 1000.0
-                })
+                    "monotonic_ns": time.monotonic_ns(),
+                    "power_w": power_mw / 1000.0,
+                    "temperature_c": None,
+                    "throttled": 0,
+                }
+                try:
+                    sample["temperature_c"] = pynvml.nvmlDeviceGetTemperature(
+                        handle, pynvml.NVML_TEMPERATURE_GPU
+                    )
+                    reasons = pynvml.nvmlDeviceGetCurrentClocksThrottleReasons(handle)
+                    sample["throttled"] = int(bool(reasons & NVML_THERMAL_REASONS))
+                except Exception:
+                    pass
+                samples.append(sample)
             except Exception:
                 pass
             time.sleep(0.1)
 
         pynvml.nvmlShutdown()
+        record_anchor(f"{dest_raw.name}:end", self.anchor_path)
 
         if not samples:
             print("⚠️ No GPU power samples collected")
             return
 
         # Compute energy
+        import pandas as pd
+
         df = pd.DataFrame(samples)
         avg_watts = df["power_w"].mean()
         joules = avg_watts * duration
 
+        throttled_fraction = df["throttled"].mean()
+        if throttled_fraction:
+            print(f"⚠️ GPU throttled for {throttled_fraction:.0%} of samples ({notes})")
+
         # Log summary
         self.log_power_sample({
             "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
             "backend": "gpu",
             "energy_joules": joules,
             "notes": notes,
+            "max_temp_c": df["temperature_c"].max(),
+            "throttled_fraction": throttled_fraction,
         })
 
         # Save raw log
-        dest_raw = self.power_path.parent / f"raw_gpu_power_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         df.to_csv(dest_raw, index=False)
         print(f"✅ GPU power logged: {joules:.2f} J (raw CSV saved to {dest_raw})")
 
+    def log_simulated_power(
+        self,
+        backend: str,
+        samples: List[Tuple[int, float]],
+        notes: str = "",
+        scale: float = 1.0,
+    ) -> Optional[float]:
+        """Store a simulated power trace like an NVML capture and log its energy.
+
+        ``samples`` are ``(monotonic_ns, watts)`` pairs from ``llama_sim``; the raw
+        file uses the NVML column layout, named as a simulated trace.  The
+        trace keeps the simulator's compressed time; the logged energy is scaled
+        by ``scale`` (the simulator's ``speed``) back to model time.
+        """
+        if len(samples) < 2:
+            return None
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        dest_raw = self.power_path.parent / raw_trace_name(backend, stamp, simulated=True)
+        record_anchor(f"{dest_raw.name}:start", self.anchor_path)
+        write_power_trace(samples, dest_raw)
+        record_anchor(f"{dest_raw.name}:end", self.anchor_path)
+
+        joules = scale * sum(
+            (t1 - t0) / 1e9 * (w0 + w1) / 2
+            for (t0, w0), (t1, w1) in zip(samples, samples[1:])
+        )
+        self.log_power_sample({
+            "timestamp": dt.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "backend": backend,
+            "energy_joules": joules,
+            "notes": notes,
+            "max_temp_c": None,
+            "throttled_fraction": 0.0,
+        })
+        return joules
+
 
 __all__ = ["TelemetryLogger"]
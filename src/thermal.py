@@ -0,0 +1,227 @@
+"""Thermal baseline and throttling detection for back-to-back benchmark runs.
+
+Sustained inference heats the package, so later runs in a manifest see lower
+clocks than earlier ones.  This module reads CPU temperature/frequency from
+Linux hwmon/cpufreq sysfs and GPU temperature/throttle reasons from NVML so the
+session runner can wait for a steady thermal baseline before each run instead
+of padding every run with a fixed sleep.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# PowerLog column names (Intel Power Gadget 3.x).
+POWERLOG_TEMP_COLUMN = "Package Temperature_0(C)"
+POWERLOG_HOT_COLUMN = "Package Hot_0"
+
+# hwmon chip names that expose the CPU package temperature.
+CPU_HWMON_NAMES = ("coretemp", "k10temp", "zenpower", "cpu_thermal")
+
+# NVML clock throttle reasons: HW slowdown, SW thermal, HW thermal, HW power brake.
+NVML_THERMAL_REASONS = 0x08 | 0x20 | 0x40 | 0x80
+
+
+@dataclass
+class ThermalPolicy:
+    """How long and to what temperature to cool down before a run."""
+
+    enabled: bool = True
+    baseline_c: Optional[float] = None
+    tolerance_c: float = 2.0
+    poll_interval_s: float = 2.0
+    stable_samples: int = 5
+    max_wait_s: float = 300.0
+    throttle_temp_c: float = 95.0
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, object]]) -> "ThermalPolicy":
+        if not data:
+            return cls()
+        known = {name for name in cls.__dataclass_fields__}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown thermal settings: {', '.join(sorted(unknown))}")
+        return cls(**data)  # type: ignore[arg-type]
+
+
+@dataclass
+class ThermalSample:
+    """A single temperature/frequency reading across CPU and GPU."""
+
+    monotonic_s: float
+    cpu_temp_c: Optional[float] = None
+    cpu_freq_mhz: Optional[float] = None
+    gpu_temp_c: Optional[float] = None
+    gpu_clock_mhz: Optional[float] = None
+    gpu_throttled: bool = False
+
+    @property
+    def max_temp_c(self) -> Optional[float]:
+        temps = [t for t in (self.cpu_temp_c, self.gpu_temp_c) if t is not None]
+        return max(temps) if temps else None
+
+
+@dataclass
+class ThermalMonitor:
+    """Read temperatures from sysfs/NVML and wait for a thermal baseline."""
+
+    hwmon_root: Path = Path("/sys/class/hwmon")
+    cpufreq_root: Path = Path("/sys/devices/system/cpu")
+    use_nvml: bool = True
+    _nvml_handle: object = field(default=None, init=False, repr=False)
+    _nvml: object = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if not self.use_nvml:
+            return
+        try:
+            import pynvml
+
+            pynvml.nvmlInit()
+            self._nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+            self._nvml = pynvml
+        except Exception:
+            self._nvml_handle = None
+
+    def close(self) -> None:
+        if self._nvml is not None:
+            try:
+                self._nvml.nvmlShutdown()
+            except Exception:
+                pass
+            self._nvml = None
+            self._nvml_handle = None
+
+    def read(self) -> ThermalSample:
+        sample = ThermalSample(monotonic_s=time.monotonic())
+        sample.cpu_temp_c = self._read_cpu_temp()
+        sample.cpu_freq_mhz = self._read_cpu_freq()
+        if self._nvml_handle is not None:
+            nvml = self._nvml
+            try:
+                sample.gpu_temp_c = float(
+                    nvml.nvmlDeviceGetTemperature(self._nvml_handle, nvml.NVML_TEMPERATURE_GPU)
+                )
+                sample.gpu_clock_mhz = float(
+                    nvml.nvmlDeviceGetClockInfo(self._nvml_handle, nvml.NVML_CLOCK_SM)
+                )
+                reasons = nvml.nvmlDeviceGetCurrentClocksThrottleReasons(self._nvml_handle)
+                sample.gpu_throttled = bool(reasons & NVML_THERMAL_REASONS)
+            except Exception:
+                pass
+        return sample
+
+    def _read_cpu_temp(self) -> Optional[float]:
+        if not self.hwmon_root.exists():
+            return None
+        for chip in sorted(self.hwmon_root.iterdir()):
+            name = _read_text(chip / "name")
+            if name not in CPU_HWMON_NAMES:
+                continue
+            temps = []
+            for temp_file in sorted(chip.glob("temp*_input")):
+                value = _read_text(temp_file)
+                if value is not None:
+                    try:
+                        temps.append(int(value) / 1000.0)
+                    except ValueError:
+                        continue
+            if temps:
+                return max(temps)
+        return None
+
+    def _read_cpu_freq(self) -> Optional[float]:
+        freqs = []
+        for cur in self.cpufreq_root.glob("cpu[0-9]*/cpufreq/scaling_cur_freq"):
+            value = _read_text(cur)
+            if value is not None:
+                try:
+                    freqs.append(int(value) / 1000.0)
+                except ValueError:
+                    continue
+        return sum(freqs) / len(freqs) if freqs else None
+
+    def wait_for_baseline(self, policy: ThermalPolicy) -> ThermalSample:
+        """Block until the package is at or near the baseline, or temperature is steady.
+
+        The wait ends when the hottest sensor is within ``tolerance_c`` of
+        ``baseline_c``, or (without a baseline) when the last ``stable_samples``
+        readings vary by less than ``tolerance_c``.  ``max_wait_s`` bounds the
+        wait so a missing sensor never stalls a session.
+        """
+        start = time.monotonic()
+        history: List[float] = []
+        sample = self.read()
+        while True:
+            temp = sample.max_temp_c
+            if temp is None:
+                return sample
+            history.append(temp)
+            if is_at_baseline(history, policy):
+                return sample
+            if time.monotonic() - start >= policy.max_wait_s:
+                print(f"⚠️ Thermal baseline not reached after {policy.max_wait_s:.0f}s "
+                      f"({temp:.1f}°C)")
+                return sample
+            time.sleep(policy.poll_interval_s)
+            sample = self.read()
+
+
+def is_at_baseline(history: List[float], policy: ThermalPolicy) -> bool:
+    """Return True when the temperature history satisfies the policy."""
+    if not history:
+        return False
+    if policy.baseline_c is not None:
+        return history[-1] <= policy.baseline_c + policy.tolerance_c
+    window = history[-policy.stable_samples:]
+    if len(window) < policy.stable_samples:
+        return False
+    return max(window) - min(window) < policy.tolerance_c
+
+
+def throttled_powerlog_rows(
+    rows: Iterable[Dict[str, object]], throttle_temp_c: float = 95.0
+) -> List[bool]:
+    """Flag PowerLog samples taken while the package was throttling.
+
+    A sample counts as throttled when PROCHOT (``Package Hot_0``) is asserted
+    or the package temperature is at or above ``throttle_temp_c``.
+    """
+    flags: List[bool] = []
+    for row in rows:
+        hot = _to_float(row.get(POWERLOG_HOT_COLUMN))
+        temp = _to_float(row.get(POWERLOG_TEMP_COLUMN))
+        flags.append(
+            (hot is not None and hot >= 1) or (temp is not None and temp >= throttle_temp_c)
+        )
+    return flags
+
+
+def _read_text(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def _to_float(value: object) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        result = float(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return None
+    return None if result != result else result
+
+
+__all__ = [
+    "NVML_THERMAL_REASONS",
+    "ThermalMonitor",
+    "ThermalPolicy",
+    "ThermalSample",
+    "is_at_baseline",
+    "throttled_powerlog_rows",
+]
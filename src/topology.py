@@ -0,0 +1,339 @@
+"""CPU topology discovery and thread placement for inference runs.
+
+``--threads N`` leaves placement to the OS scheduler, so the same run lands on
+P-cores one time and E-cores or SMT siblings the next; on hybrid consumer CPUs
+that swings energy per token more than the thread count does.  A run (or the
+``defaults`` block) can pin llama.cpp instead::
+
+    placement:
+      core_type: performance   # performance | efficiency | any
+      smt: false               # false: one logical CPU per physical core
+      numa_node: 0             # CPUs and memory from one NUMA node
+      threads: 4               # how many of the matching CPUs to use
+      cores: "0-7"             # optional explicit CPU list to choose from
+
+The placement is resolved against the discovered topology and applied to the
+llama.cpp process with ``os.sched_setaffinity`` (``taskset`` where that is
+missing), and with ``numactl`` when a NUMA node is requested.  ``--threads``
+is set to the number of pinned CPUs unless the run passes it explicitly.
+
+A top-level ``sweep: {placements: auto}`` repeats every CPU run over the
+placements :func:`placement_sweep` generates for this machine; ``python
+src/topology.py`` prints the topology and that sweep.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+SYSFS_CPU = Path("/sys/devices/system/cpu")
+SYSFS_NODE = Path("/sys/devices/system/node")
+# Intel hybrid parts expose each core type as its own PMU with a CPU list.
+HYBRID_PMUS = {
+    "performance": Path("/sys/devices/cpu_core/cpus"),
+    "efficiency": Path("/sys/devices/cpu_atom/cpus"),
+}
+CORE_TYPES = ("any", "performance", "efficiency")
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """Expand a kernel CPU list such as ``0-3,8,10-11``."""
+    cpus: List[int] = []
+    for part in filter(None, (p.strip() for p in str(text).split(","))):
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def format_cpu_list(cpus: Sequence[int]) -> str:
+    """Compress CPU ids into kernel CPU-list notation."""
+    ranges: List[str] = []
+    ordered = sorted(set(cpus))
+    start = prev = None
+    for cpu in ordered + [None]:
+        if start is not None and cpu == prev + 1:
+            prev = cpu
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == prev else f"{start}-{prev}")
+        start = prev = cpu
+    return ",".join(ranges)
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+@dataclass(frozen=True)
+class LogicalCpu:
+    """One logical CPU and where it sits in the machine."""
+
+    id: int
+    core: int
+    package: int = 0
+    node: int = 0
+    core_type: str = "performance"
+
+
+@dataclass
+class Topology:
+    """Logical CPUs grouped into physical cores, core types and NUMA nodes."""
+
+    cpus: List[LogicalCpu] = field(default_factory=list)
+
+    @classmethod
+    def discover(cls, cpu_root: Path = SYSFS_CPU, node_root: Path = SYSFS_NODE) -> "Topology":
+        """Read Linux sysfs; elsewhere every CPU is its own core on one node."""
+        online = _read(cpu_root / "online")
+        if online is None:
+            return cls([LogicalCpu(id=i, core=i) for i in range(os.cpu_count() or 1)])
+
+        nodes: Dict[int, int] = {}
+        for node_dir in sorted(node_root.glob("node[0-9]*")):
+            for cpu in parse_cpu_list(_read(node_dir / "cpulist") or ""):
+                nodes[cpu] = int(node_dir.name[4:])
+        types: Dict[int, str] = {}
+        for core_type, path in HYBRID_PMUS.items():
+            for cpu in parse_cpu_list(_read(path) or ""):
+                types[cpu] = core_type
+        capacities = {
+            cpu: int(_read(cpu_root / f"cpu{cpu}" / "cpu_capacity") or 0)
+            for cpu in parse_cpu_list(online)
+        }
+        top_capacity = max(capacities.values(), default=0)
+
+        cpus = []
+        for cpu in parse_cpu_list(online):
+            topo = cpu_root / f"cpu{cpu}" / "topology"
+            core_type = types.get(cpu)
+            if core_type is None:
+                # Big.LITTLE parts without hybrid PMUs report a smaller capacity for LITTLE cores.
+                small = top_capacity and capacities[cpu] < top_capacity
+                core_type = "efficiency" if small else "performance"
+            cpus.append(LogicalCpu(
+                id=cpu,
+                core=int(_read(topo / "core_id") or cpu),
+                package=int(_read(topo / "physical_package_id") or 0),
+                node=nodes.get(cpu, 0),
+                core_type=core_type,
+            ))
+        return cls(cpus)
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted({cpu.node for cpu in self.cpus})
+
+    @property
+    def hybrid(self) -> bool:
+        return len({cpu.core_type for cpu in self.cpus}) > 1
+
+    @property
+    def smt(self) -> bool:
+        return len(self.cores()) < len(self.cpus)
+
+    def cores(self) -> Dict[Tuple[int, int], List[LogicalCpu]]:
+        """Logical CPUs per physical core, keyed by ``(package, core)``."""
+        cores: Dict[Tuple[int, int], List[LogicalCpu]] = {}
+        for cpu in sorted(self.cpus, key=lambda c: c.id):
+            cores.setdefault((cpu.package, cpu.core), []).append(cpu)
+        return cores
+
+    def select(
+        self, core_type: str = "any", smt: bool = True, numa_node: Optional[int] = None
+    ) -> List[int]:
+        """Matching CPU ids, one per physical core first and SMT siblings after."""
+        levels: List[List[int]] = []
+        for siblings in self.cores().values():
+            first = siblings[0]
+            if core_type != "any" and first.core_type != core_type:
+                continue
+            if numa_node is not None and first.node != numa_node:
+                continue
+            for level, cpu in enumerate(siblings if smt else siblings[:1]):
+                while len(levels) <= level:
+                    levels.append([])
+                levels[level].append(cpu.id)
+        return [cpu for level in levels for cpu in level]
+
+    def describe(self) -> str:
+        cores = self.cores()
+        parts = [f"{len(self.cpus)} logical CPUs on {len(cores)} cores"]
+        if self.hybrid:
+            for core_type in CORE_TYPES[1:]:
+                ids = self.select(core_type)
+                parts.append(f"{core_type}: {format_cpu_list(ids)}")
+        if len(self.nodes) > 1:
+            parts.append(f"{len(self.nodes)} NUMA nodes")
+        parts.append("SMT on" if self.smt else "no SMT")
+        return ", ".join(parts)
+
+
+@dataclass
+class Placement:
+    """Where a run's llama.cpp threads may execute (``placement`` block)."""
+
+    core_type: str = "any"
+    smt: bool = True
+    numa_node: Optional[int] = None
+    threads: Optional[int] = None
+    cores: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, object]]) -> Optional["Placement"]:
+        if not data:
+            return None
+        known = set(cls.__dataclass_fields__)
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown placement settings: {', '.join(sorted(unknown))}")
+        placement = cls(**data)  # type: ignore[arg-type]
+        if placement.core_type not in CORE_TYPES:
+            raise ValueError(
+                f"placement.core_type must be one of {', '.join(CORE_TYPES)}, "
+                f"not '{placement.core_type}'"
+            )
+        if placement.cores is not None:
+            placement.cores = str(placement.cores)
+        return placement
+
+    def label(self) -> str:
+        """Short run-id suffix, e.g. ``pcore-nosmt-n0-t4``."""
+        parts = {"performance": ["pcore"], "efficiency": ["ecore"]}.get(self.core_type, [])
+        if self.cores:
+            parts.append("c" + self.cores.replace(",", "_"))
+        if not self.smt:
+            parts.append("nosmt")
+        if self.numa_node is not None:
+            parts.append(f"n{self.numa_node}")
+        if self.threads:
+            parts.append(f"t{self.threads}")
+        return "-".join(parts) or "all"
+
+    def resolve(self, topology: Topology) -> List[int]:
+        """CPU ids this placement pins to on ``topology``."""
+        cpus = topology.select(self.core_type, self.smt, self.numa_node)
+        if self.cores:
+            allowed = set(parse_cpu_list(self.cores))
+            cpus = [cpu for cpu in cpus if cpu in allowed]
+        if self.threads:
+            cpus = cpus[: self.threads]
+        if not cpus or (self.threads and len(cpus) < self.threads):
+            raise ValueError(
+                f"Placement '{self.label()}' needs more CPUs than this machine offers "
+                f"({topology.describe()})"
+            )
+        return sorted(cpus)
+
+
+def pin_prefix(
+    cpus: Sequence[int], numa_node: Optional[int] = None
+) -> Tuple[List[str], Optional[Callable[[], None]]]:
+    """``(command prefix, preexec_fn)`` that run a command on ``cpus``.
+
+    With ``numa_node`` the command's memory is bound to that node as well.
+    """
+    cpu_list = format_cpu_list(cpus)
+    if numa_node is not None:
+        if shutil.which("numactl"):
+            return ["numactl", f"--membind={numa_node}", f"--physcpubind={cpu_list}"], None
+        print("⚠️ numactl not found; pinning CPUs without binding memory to the NUMA node")
+    if hasattr(os, "sched_setaffinity"):
+        return [], lambda: os.sched_setaffinity(0, set(cpus))
+    if shutil.which("taskset"):
+        return ["taskset", "-c", cpu_list], None
+    print("⚠️ CPU affinity is not supported on this platform; running unpinned")
+    return [], None
+
+
+def placement_sweep(
+    topology: Topology, thread_counts: Optional[Sequence[int]] = None
+) -> List[Placement]:
+    """Placements worth comparing on this machine.
+
+    Per core type (on hybrid CPUs), SMT policy (when SMT exists) and NUMA node
+    (when there is more than one), at powers of two up to the available
+    CPUs.  Placements that resolve to the same CPU set are dropped.
+    """
+    core_types = list(CORE_TYPES[1:]) + ["any"] if topology.hybrid else ["any"]
+    smt_options = [False, True] if topology.smt else [True]
+    nodes: List[Optional[int]] = list(topology.nodes) if len(topology.nodes) > 1 else [None]
+
+    placements: List[Placement] = []
+    seen = set()
+    for core_type in core_types:
+        for smt in smt_options:
+            for node in nodes:
+                available = len(topology.select(core_type, smt, node))
+                counts = thread_counts or _doubling(available)
+                for count in counts:
+                    if count > available:
+                        continue
+                    placement = Placement(core_type=core_type, smt=smt, numa_node=node,
+                                          threads=count)
+                    key = tuple(placement.resolve(topology))
+                    if key not in seen:
+                        seen.add(key)
+                        placements.append(placement)
+    return placements
+
+
+def _doubling(limit: int) -> List[int]:
+    counts = []
+    count = 1
+    while count < limit:
+        counts.append(count)
+        count *= 2
+    return counts + [limit] if limit else counts
+
+
+def expand_placement_sweep(runs: Sequence, placements: Sequence[Placement]) -> List:
+    """Repeat every CPU run (a ``RunSpec``-like dataclass) once per placement."""
+    expanded = []
+    for run in runs:
+        if run.backend != "cpu":
+            expanded.append(run)
+            continue
+        for placement in placements:
+            expanded.append(replace(
+                run, run_id=f"{run.run_id}-{placement.label()}", placement=placement
+            ))
+    return expanded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show CPU topology and a placement sweep.")
+    parser.add_argument("--threads", type=int, action="append",
+                        help="Thread counts to sweep (default: powers of two)")
+    args = parser.parse_args()
+    topology = Topology.discover()
+    print(f"🧩 {topology.describe()}")
+    print("sweep:\n  placements:")
+    for placement in placement_sweep(topology, args.threads):
+        cpus = format_cpu_list(placement.resolve(topology))
+        fields = {k: v for k, v in vars(placement).items() if v != getattr(Placement(), k)}
+        body = ", ".join(f"{k}: {str(v).lower() if isinstance(v, bool) else v}"
+                         for k, v in fields.items())
+        print(f"    - {{{body}}}  # {placement.label()}: CPUs {cpus}")
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "LogicalCpu",
+    "Placement",
+    "Topology",
+    "expand_placement_sweep",
+    "format_cpu_list",
+    "parse_cpu_list",
+    "pin_prefix",
+    "placement_sweep",
+]
@@ -0,0 +1,255 @@
+"""Span tracing of the harness itself, written as Chrome trace-event JSON.
+
+A "run" is more than llama.cpp: CSV reopens, imports, PowerLog spawns and
+subprocess setup all sit inside the measured window.  Wrapping pipeline
+stages in :func:`span` records them as nested spans on the monotonic clock::
+
+    with span("measure_prompt", prompt=prompt.id):
+        ...
+
+``run_session.py --trace`` enables the tracer and writes
+``data/traces/session_<timestamp>.json`` (open it in ``chrome://tracing`` or
+Perfetto), and prints how much wall time each stage took excluding its
+children, so harness overhead can be told apart from inference time.
+While tracing is off, :func:`span` returns a shared no-op context manager
+after a single attribute check.
+
+``--profile-stage NAME`` additionally profiles every span called NAME, with
+cProfile (``<trace>.<NAME>.<n>.prof``, for ``pstats``/snakeviz) or, with
+``--profiler sample``, a stack sampler in a background thread
+(``<trace>.<NAME>.<n>.folded``, collapsed stacks for flamegraph tools).
+"""
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import datetime as dt
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+TRACE_DIR = Path("data/traces")
+PROFILERS = ("cprofile", "sample")
+# Category of spans that are the measured work itself rather than harness overhead.
+INFERENCE = "inference"
+SAMPLE_INTERVAL_S = 0.005
+_NOOP = contextlib.nullcontext()
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's Python stack on a timer into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval_s: float = SAMPLE_INTERVAL_S) -> None:
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self, path: Path) -> None:
+        self._done.set()
+        self.join()
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()),
+            encoding="utf-8",
+        )
+
+
+class Tracer:
+    """Collect spans from every thread; off until :meth:`enable` is called."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.path: Optional[Path] = None
+        self.profile_stages: Tuple[str, ...] = ()
+        self.profiler = "cprofile"
+        self._events: List[Dict[str, object]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiling = False
+        self._profile_counts: Counter = Counter()
+        self._stats: Dict[str, List[float]] = {}
+        self._categories: Dict[str, str] = {}
+        self._origin_ns = 0
+
+    def enable(
+        self,
+        path: Optional[Path] = None,
+        profile_stages: Sequence[str] = (),
+        profiler: str = "cprofile",
+    ) -> Path:
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profiler}' (expected one of {PROFILERS})")
+        if path is None:
+            path = TRACE_DIR / f"session_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.profile_stages = tuple(profile_stages)
+        self.profiler = profiler
+        self._origin_ns = time.monotonic_ns()
+        self.enabled = True
+        return path
+
+    def reset(self) -> None:
+        """Disable tracing and drop everything recorded (between daemon jobs)."""
+        self.__init__()
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def _span(self, name: str, category: str, args: Dict[str, object]) -> Iterator[None]:
+        stack = self._stack()
+        stack.append(0.0)  # time spent in child spans, in ns
+        stop_profile = self._start_profile(name)
+        start = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            end = time.monotonic_ns()
+            if stop_profile is not None:
+                stop_profile()
+            children = stack.pop()
+            duration = end - start
+            if stack:
+                stack[-1] += duration
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin_ns) / 1000.0,
+                "dur": duration / 1000.0,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self._lock:
+                self._events.append(event)
+                self._categories[name] = category
+                stats = self._stats.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] += duration - children
+
+    def _start_profile(self, name: str) -> Optional[Callable[[], None]]:
+        """Start profiling a stage listed in ``profile_stages``; returns its stop function."""
+        if name not in self.profile_stages:
+            return None
+        with self._lock:
+            # cProfile cannot nest, and one sampler at a time keeps the output readable.
+            if self._profiling:
+                return None
+            self._profiling = True
+            self._profile_counts[name] += 1
+            index = self._profile_counts[name]
+        stem = self.path.with_suffix("") if self.path else Path(name)
+        if self.profiler == "sample":
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+
+            def stop() -> None:
+                sampler.stop(Path(f"{stem}.{name}.{index}.folded"))
+                self._profiling = False
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+
+            def stop() -> None:
+                profile.disable()
+                profile.dump_stats(f"{stem}.{name}.{index}.prof")
+                self._profiling = False
+        return stop
+
+    def summary(self) -> List[Tuple[str, int, float, float]]:
+        """``(name, count, total_ms, self_ms)`` per span name, by self time."""
+        with self._lock:
+            rows = [(name, int(c), total / 1e6, own / 1e6)
+                    for name, (c, total, own) in self._stats.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def write(self) -> Optional[Path]:
+        """Write the trace file and print the top stages by self time."""
+        if not self.enabled or self.path is None:
+            return None
+        with self._lock:
+            events = list(self._events)
+        names = {
+            thread.ident: thread.name for thread in threading.enumerate() if thread.ident
+        }
+        for tid in {event["tid"] for event in events}:
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                "args": {"name": names.get(tid, str(tid))},
+            })
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8"
+        )
+        summary = self.summary()
+        inference_ms = sum(row[3] for row in summary if self._categories[row[0]] == INFERENCE)
+        harness_ms = sum(row[3] for row in summary) - inference_ms
+        print(f"🧵 Trace written to {self.path}: {harness_ms:.0f} ms harness, "
+              f"{inference_ms:.0f} ms inference; self time by stage:")
+        for name, count, total_ms, self_ms in summary[:10]:
+            print(f"   {name:<24} {count:>6}x {self_ms:>10.1f} ms self {total_ms:>10.1f} ms total")
+        return self.path
+
+
+TRACER = Tracer()
+
+
+def span(name: str, category: str = "harness", **args: object):
+    """Context manager timing one stage on the global tracer (no-op while disabled)."""
+    if not TRACER.enabled:
+        return _NOOP
+    return TRACER._span(name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = "harness") -> Callable:
+    """Decorator form of :func:`span`, named after the function by default."""
+
+    def decorate(func: Callable) -> Callable:
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER._span(label, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+__all__ = [
+    "INFERENCE",
+    "PROFILERS",
+    "StackSampler",
+    "TRACER",
+    "Tracer",
+    "span",
+    "traced",
+]
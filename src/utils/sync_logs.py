@@ -1,17 +1,41 @@
-"""Synchronize CPU and GPU telemetry logs by aligning timestamps."""
+"""Synchronize any number of telemetry streams onto one resampled time grid.
+
+Each stream (PowerLog exports, NVML samples, latency rows, ...) is stamped on
+the shared clock timeline and resampled by integrating, then differencing:
+every numeric column is integrated over time (trapezoids between samples) and
+the integral is differenced at the grid edges.  Power columns therefore keep
+their energy exactly, however coarse the grid, and other columns become
+time-weighted bin averages.  Files are read in chunks so multi-hour captures
+never need to fit in memory; only the per-bin sums of bins that hold samples
+are kept, and only those bins are written, so gaps between captures cost
+nothing.
+"""
 from __future__ import annotations
 
 import argparse
-import datetime as dt
+import glob
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
+from clock import ANCHOR_LOG, NS_PER_MS, StreamAligner, Timeline
+
+# Columns that describe time or running totals rather than a sampled quantity.
+SKIP_COLUMNS = {"RDTSC", "Elapsed Time (sec)", "monotonic_ns", "timestamp", "System Time"}
+SKIP_PREFIXES = ("Cumulative",)
+
 
 def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("cpu_log", type=Path, help="CSV file containing CPU telemetry samples")
-    parser.add_argument("gpu_log", type=Path, help="CSV file containing GPU telemetry samples")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "streams",
+        nargs="+",
+        help="Telemetry CSVs as PATH or NAME=PATH; PATH may be a glob whose files are "
+             "read in order as one stream (e.g. cpu='data/raw_cpu_power_*.csv')",
+    )
     parser.add_argument(
         "--output",
         type=Path,
@@ -24,41 +48,241 @@ def parse_args() -> argparse.Namespace:
         default=200,
         help="Resampling frequency in milliseconds",
     )
+    parser.add_argument(
+        "--max-gap-ms",
+        type=float,
+        default=500.0,
+        help="Do not integrate across sample gaps longer than this",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=200_000,
+        help="Rows read per chunk from each file",
+    )
+    parser.add_argument(
+        "--anchors",
+        type=Path,
+        default=ANCHOR_LOG,
+        help="Clock anchor log written by the telemetry logger",
+    )
+    parser.add_argument(
+        "--utc-offset-hours",
+        type=float,
+        default=None,
+        help="Local UTC offset for PowerLog files recorded without anchors (default: OS timezone)",
+    )
     return parser.parse_args()
 
 
-def parse_timestamp(value: str) -> dt.datetime:
-    return dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+def is_power_column(name: str) -> bool:
+    lowered = name.lower()
+    return "power" in lowered and ("watt" in lowered or lowered.endswith("_w"))
 
 
-def synchronize(cpu_path: Path, gpu_path: Path, output: Path, frequency_ms: int) -> None:
-    cpu = pd.read_csv(cpu_path)
-    gpu = pd.read_csv(gpu_path)
+@dataclass
+class BinAccumulator:
+    """Per-bin integrals of each column and the time each column was covered.
 
-    if "timestamp" not in cpu.columns or "timestamp" not in gpu.columns:
-        raise RuntimeError("Both logs must include a 'timestamp' column")
+    Bins are kept sparse: every run of samples without a gap longer than
+    ``max_gap_ns`` adds one block spanning only its own bins, so memory grows
+    with the time covered by samples, not with the wall-clock span of a stream.
+    """
 
-    cpu["timestamp"] = cpu["timestamp"].apply(parse_timestamp)
-    gpu["timestamp"] = gpu["timestamp"].apply(parse_timestamp)
+    bin_ns: int
+    columns: List[str] = field(default_factory=list)
+    # (first bin index, integral, covered) per block; neighbouring blocks may share an edge bin.
+    blocks: List[Tuple[int, np.ndarray, np.ndarray]] = field(default_factory=list)
 
-    start = min(cpu["timestamp"].min(), gpu["timestamp"].min())
-    end = max(cpu["timestamp"].max(), gpu["timestamp"].max())
+    def add(self, stamps: np.ndarray, values: np.ndarray, max_gap_ns: float) -> None:
+        """Integrate samples ``values[i]`` taken at ``stamps[i]`` into the bins."""
+        if len(stamps) < 2:
+            return
+        # Nothing is integrated across a gap, so split there instead of spanning it.
+        breaks = np.flatnonzero(np.diff(stamps) > max_gap_ns) + 1
+        for lo, hi in zip(np.r_[0, breaks], np.r_[breaks, len(stamps)]):
+            if hi - lo >= 2:
+                self._add_segment(stamps[lo:hi], values[lo:hi])
 
-    index = pd.date_range(start=start, end=end, freq=f"{frequency_ms}L", inclusive="both")
+    def _add_segment(self, stamps: np.ndarray, values: np.ndarray) -> None:
+        seg_dt = np.diff(stamps)
+        left, right = values[:-1], values[1:]
+        valid = (seg_dt > 0)[:, None] & ~np.isnan(left) & ~np.isnan(right)
+        seg_area = np.where(valid, (np.nan_to_num(left) + np.nan_to_num(right)) / 2, 0.0)
+        seg_area *= seg_dt[:, None]
+        seg_cover = valid * seg_dt[:, None]
 
-    cpu = cpu.set_index("timestamp").reindex(index, method="nearest", tolerance=pd.Timedelta(milliseconds=frequency_ms))
-    gpu = gpu.set_index("timestamp").reindex(index, method="nearest", tolerance=pd.Timedelta(milliseconds=frequency_ms))
+        # Cumulative integral at every sample, evaluated at the bin edges in between.
+        cum_area = np.vstack([np.zeros(values.shape[1]), np.cumsum(seg_area, axis=0)])
+        cum_cover = np.vstack([np.zeros(values.shape[1]), np.cumsum(seg_cover, axis=0)])
+        lo = int(stamps[0] // self.bin_ns)
+        hi = int(stamps[-1] // self.bin_ns)
+        edges = np.arange(lo + 1, hi + 1, dtype=np.float64) * self.bin_ns
+        points = np.concatenate([[stamps[0]], edges, [stamps[-1]]])
+        area = np.column_stack([np.interp(points, stamps, cum_area[:, k])
+                                for k in range(values.shape[1])])
+        cover = np.column_stack([np.interp(points, stamps, cum_cover[:, k])
+                                 for k in range(values.shape[1])])
+        self.blocks.append((lo, np.diff(area, axis=0), np.diff(cover, axis=0)))
 
-    merged = pd.concat({"cpu": cpu, "gpu": gpu}, axis=1)
-    merged.index.name = "timestamp"
+    def collect(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(bins, integral, covered)`` for the covered bins only, in bin order."""
+        width = len(self.columns)
+        if not self.blocks:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, width)), np.zeros((0, width))
+        index = np.concatenate([
+            np.arange(first, first + len(integral), dtype=np.int64)
+            for first, integral, _ in self.blocks
+        ])
+        bins, rows = np.unique(index, return_inverse=True)
+        integral = np.zeros((len(bins), width))
+        covered = np.zeros((len(bins), width))
+        np.add.at(integral, rows, np.vstack([block[1] for block in self.blocks]))
+        np.add.at(covered, rows, np.vstack([block[2] for block in self.blocks]))
+        keep = (covered > 0).any(axis=1)
+        return bins[keep], integral[keep], covered[keep]
+
+
+def expand_streams(specs: Sequence[str]) -> Dict[str, List[Path]]:
+    """Turn ``NAME=PATH`` / ``PATH`` arguments (globs allowed) into named file lists."""
+    streams: Dict[str, List[Path]] = {}
+    for spec in specs:
+        name, _, pattern = spec.rpartition("=")
+        files = sorted(Path(p) for p in glob.glob(pattern)) or [Path(pattern)]
+        if not name:
+            name = files[0].stem
+        if name in streams:
+            raise RuntimeError(f"Duplicate stream name '{name}'")
+        streams[name] = files
+    return streams
+
+
+def read_stream(
+    files: Sequence[Path], timeline: Timeline, chunk_rows: int
+) -> Iterator[Tuple[np.ndarray, pd.DataFrame]]:
+    """Yield ``(timeline_ns, numeric columns)`` chunks of one stream, in file order."""
+    for path in files:
+        aligner = StreamAligner(path, timeline)
+        reader = pd.read_csv(
+            path, chunksize=chunk_rows, skipinitialspace=True, dtype=str, keep_default_na=False
+        )
+        for chunk in reader:
+            chunk.columns = [c.strip() for c in chunk.columns]
+            try:
+                stamps = aligner(chunk)
+            except ValueError as exc:
+                raise RuntimeError(str(exc)) from exc
+            keep = [
+                c for c in chunk.columns
+                if c not in SKIP_COLUMNS and not c.startswith(SKIP_PREFIXES)
+            ]
+            numeric = chunk[keep].apply(pd.to_numeric, errors="coerce")
+            numeric = numeric.loc[:, numeric.notna().any()]
+            ok = ~np.isnan(stamps)
+            yield stamps[ok], numeric[ok]
+
+
+def accumulate_stream(
+    files: Sequence[Path],
+    timeline: Timeline,
+    bin_ns: int,
+    max_gap_ns: float,
+    chunk_rows: int,
+) -> BinAccumulator:
+    acc = BinAccumulator(bin_ns)
+    carry: Optional[Tuple[float, np.ndarray]] = None
+    for stamps, numeric in read_stream(files, timeline, chunk_rows):
+        if not acc.columns:
+            acc.columns = list(numeric.columns)
+        numeric = numeric.reindex(columns=acc.columns)
+        order = np.argsort(stamps, kind="stable")
+        stamps, values = stamps[order], numeric.to_numpy(dtype=np.float64)[order]
+        if carry is not None:
+            # Bridge the previous chunk's last sample so no interval is lost.
+            stamps = np.concatenate([[carry[0]], stamps])
+            values = np.vstack([carry[1], values])
+        acc.add(stamps, values, max_gap_ns)
+        if len(stamps):
+            carry = (stamps[-1], values[-1])
+    return acc
+
+
+def to_frame(
+    name: str,
+    columns: Sequence[str],
+    collected: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    bins: np.ndarray,
+) -> pd.DataFrame:
+    """Bin averages (and energy for power columns) of one stream aligned to the rows ``bins``.
+
+    ``collected`` is the stream's :meth:`BinAccumulator.collect`.
+    """
+    own_bins, own_integral, own_covered = collected
+    integral = np.zeros((len(bins), len(columns)))
+    covered = np.zeros((len(bins), len(columns)))
+    rows = np.searchsorted(bins, own_bins)
+    integral[rows] = own_integral
+    covered[rows] = own_covered
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(covered > 0, integral / covered, np.nan)
+    data = {f"{name}.{column}": mean[:, k] for k, column in enumerate(columns)}
+    for k, column in enumerate(columns):
+        if is_power_column(column):
+            # ns * W -> J; gaps contribute nothing rather than a guessed value.
+            energy = np.where(covered[:, k] > 0, integral[:, k] / 1e9, np.nan)
+            data[f"{name}.{column}.energy_j"] = energy
+    return pd.DataFrame(data)
+
+
+def synchronize(
+    streams: Mapping[str, Sequence[Path]],
+    output: Path,
+    frequency_ms: int,
+    timeline: Optional[Timeline] = None,
+    max_gap_ms: float = 500.0,
+    chunk_rows: int = 200_000,
+) -> pd.DataFrame:
+    """Resample every stream onto a shared ``frequency_ms`` grid and write it to ``output``.
+
+    Only bins covered by at least one stream are written; the timestamps show
+    where the gaps are.
+    """
+    timeline = timeline or Timeline.from_file()
+    bin_ns = int(frequency_ms * NS_PER_MS)
+    accumulators = {
+        name: accumulate_stream(files, timeline, bin_ns, max_gap_ms * NS_PER_MS, chunk_rows)
+        for name, files in streams.items()
+    }
+    collected = {name: acc.collect() for name, acc in accumulators.items()}
+    bins = np.unique(np.concatenate(
+        [np.zeros(0, dtype=np.int64)] + [own_bins for own_bins, _, _ in collected.values()]
+    ))
+    if not len(bins):
+        raise RuntimeError("No timestamped samples found in any stream")
+
+    frames = [
+        to_frame(name, accumulators[name].columns, collected[name], bins) for name in streams
+    ]
+    merged = pd.concat(frames, axis=1)
+    merged.insert(0, "timestamp", pd.to_datetime(bins * bin_ns, unit="ns"))
     output.parent.mkdir(parents=True, exist_ok=True)
-    merged.reset_index().to_csv(output, index=False)
-    print(f"✅ Synchronized logs written to {output}")
+    merged.to_csv(output, index=False)
+    print(f"✅ Synchronized {len(streams)} streams ({len(bins)} bins) written to {output}")
+    return merged
 
 
 def main() -> None:
     args = parse_args()
-    synchronize(args.cpu_log, args.gpu_log, args.output, args.frequency_ms)
+    offset = None if args.utc_offset_hours is None else int(args.utc_offset_hours * 3600)
+    timeline = Timeline.from_file(args.anchors, default_utc_offset_s=offset)
+    synchronize(
+        expand_streams(args.streams),
+        args.output,
+        args.frequency_ms,
+        timeline,
+        max_gap_ms=args.max_gap_ms,
+        chunk_rows=args.chunk_rows,
+    )
 
 
 if __name__ == "__main__":
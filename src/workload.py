@@ -2,20 +2,47 @@
 from __future__ import annotations
 
 import json
+import os
+import re
 import subprocess
+import sys
+import tempfile
+import threading
 import time
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
+from budget import Budget, BudgetGuard, BudgetPlanner
+from llama_sim import DRY_RUN_SPEED, Phase, SimResult, SimulatedLlama
+from metrics import record_request
+from perf_counters import PerfCollector
+from power_capture import PhaseWindow, SessionPowerCapture
 from prompt_generator import Prompt, PromptConfigError, generate_prompts
+from router import SIMULATED_NOTE, estimate_tokens
 from telemetry import TelemetryLogger
+from topology import Placement, Topology, format_cpu_list, pin_prefix
+from tracing import INFERENCE, span
+
+# llama.cpp's timing summary on stderr, in both the ``llama_print_timings`` and the
+# newer ``llama_perf_context_print`` formats:
+#   load time =   1234.56 ms
+#   prompt eval time =  45.67 ms /  12 tokens (...)
+#   eval time =  2345.67 ms /  127 runs (...)
+TIMING_RES = {
+    "load": re.compile(r"\bload time\s*=\s*([\d.]+) ms"),
+    "prefill": re.compile(r"\bprompt eval time\s*=\s*([\d.]+) ms\s*/\s*(\d+) tokens"),
+    "decode": re.compile(r"(?<!prompt )\beval time\s*=\s*([\d.]+) ms\s*/\s*(\d+) (?:runs|tokens)"),
+}
+# How often a budgeted llama.cpp run is checked against its budget.
+BUDGET_CHECK_INTERVAL_S = 0.1
 
 
 def load_manual_prompts(path: Path) -> List[Prompt]:
     """Load prompt definitions from a JSON file.
 
     The JSON can either be a list of strings or a list of objects with
-    ``{"id": "...", "text": "...", "template": "..."}``.
+    ``{"id": "...", "text": "...", "template": "..."}``; objects may add a
+    ``budget`` that overrides the run's budget for that prompt.
     """
     if path.suffix == ".jsonl":
         prompts: List[Prompt] = []
@@ -35,7 +62,8 @@ def load_manual_prompts(path: Path) -> List[Prompt]:
                         raise RuntimeError(f"Prompt entry on line {line_num} must include a 'text' field")
                     prompt_id = entry.get("id") or f"manual-{line_num:03d}"
                     template = entry.get("template", "manual")
-                    prompts.append(Prompt(id=prompt_id, text=text, template=template))
+                    prompts.append(Prompt(id=prompt_id, text=text, template=template,
+                                          budget=entry.get("budget")))
                 else:
                     raise RuntimeError(f"JSONL entries must be objects (line {line_num})")
         return prompts
@@ -57,7 +85,8 @@ def load_manual_prompts(path: Path) -> List[Prompt]:
                 raise RuntimeError("Prompt entries must include a 'text' field")
             prompt_id = entry.get("id") or f"manual-{index:03d}"
             template = entry.get("template", "manual")
-            prompts.append(Prompt(id=prompt_id, text=text, template=template))
+            prompts.append(Prompt(id=prompt_id, text=text, template=template,
+                                  budget=entry.get("budget")))
         else:
             raise RuntimeError("Prompt entries must be strings or objects")
     return prompts
@@ -83,8 +112,36 @@ def run_prompts(
     dry_run: bool = False,
     extra_args: Optional[Iterable[str]] = None,
     run_id: str = "unknown",
+    perf: Optional[PerfCollector] = None,
+    simulator: Optional[SimulatedLlama] = None,
+    captures: Optional[SessionPowerCapture] = None,
+    placement: Optional[Placement] = None,
+    budget: Optional[Budget] = None,
+    planner: Optional[BudgetPlanner] = None,
 ) -> None:
-    """Execute prompts sequentially and capture telemetry."""
+    """Execute prompts sequentially and capture telemetry.
+
+    When ``perf`` is given (and ``perf stat`` works on this machine) each CPU
+    invocation is wrapped in ``perf stat`` and its counters are logged per prompt.
+
+    A dry run generates with ``simulator`` (by default one fitted to the
+    logger's history) and logs its synthetic power trace, so every downstream
+    step sees realistic, clearly marked rows.
+
+    With ``captures`` each prompt's energy is sliced from the session-long
+    trace of its backend instead of a separate capture taken per prompt, and
+    split into load/prefill/decode energy at the phase boundaries reported by
+    llama.cpp's timings (or by the simulator).
+
+    ``placement`` pins llama.cpp to the CPUs it resolves to on this machine
+    (see ``topology.py``) and, unless ``--threads`` is given, runs one
+    thread per pinned CPU.
+
+    With a ``budget`` (the run's, or a prompt's own) each prompt's backend,
+    model and ``n_predict`` are planned by ``planner`` to fit it, generation
+    is stopped once the budget would be overrun, and the spend is logged
+    with ``log_budget_usage`` (see ``budget.py``).
+    """
 
     llama_binary = llama_binary.expanduser()
     if not llama_binary.exists() and not dry_run:
@@ -92,73 +149,322 @@ def run_prompts(
             f"llama.cpp binary not found at '{llama_binary}'. Use --dry-run to skip execution."
         )
     model_path = model_path.expanduser()
+    use_perf = perf is not None and backend == "cpu" and not dry_run and perf.available()
+    if dry_run and simulator is None and captures is not None:
+        simulator = captures.simulator
+    if dry_run and simulator is None:
+        simulator = SimulatedLlama.from_telemetry(
+            logger.latency_path, logger.power_path, speed=DRY_RUN_SPEED
+        )
+    extra_args = list(extra_args or [])
+    threads, gpu_layers = _placement_args(extra_args)
+    pin: List[str] = []
+    preexec_fn = None
+    if placement is not None:
+        with span("placement"):
+            pinned = placement.resolve(Topology.discover())
+        if threads is None:
+            threads = len(pinned)
+            extra_args += ["--threads", str(threads)]
+        print(f"📌 Pinning {run_id} to CPUs {format_cpu_list(pinned)} ({placement.label()})")
+        if not dry_run:
+            pin, preexec_fn = pin_prefix(pinned, placement.numa_node)
+    prompts = list(prompts)
+    if planner is None and (budget is not None or any(p.budget for p in prompts)):
+        planner = BudgetPlanner.from_telemetry(logger.latency_path, logger.power_path)
+    # A simulator compresses time; budgets and logged rows are in model time.
+    scale = simulator.speed if dry_run else 1.0
 
     for prompt in prompts:
-        start_time = time.perf_counter()
-        tokens_generated: Optional[int] = None
-        notes = ""
-
-        if backend == "cpu" and not dry_run:
-            try:
-                logger.record_cpu_power(duration=5, notes=f"prompt={prompt.id}")
-            except Exception as e:
-                print(f"⚠️ CPU power logging failed: {e}")
-        elif backend == "gpu" and not dry_run:
-            try:
-                logger.record_gpu_power(duration=5, notes=f"prompt={prompt.id}")
-            except Exception as e:
-                print(f"⚠️ GPU power logging failed: {e}")
-
-        if dry_run:
-            # Simulate work to allow integration testing without llama.cpp.
-            time.sleep(0.05)
-            output_text = ""
-        else:
-            cmd = [
-                str(llama_binary),
-                "--model",
-                str(model_path),
-                "--prompt",
-                prompt.text,
-                "--n-predict",
-                str(n_predict),
-                "--batch-size",
-                str(batch_size),
-                "--temp",
-                str(temperature),
-            ]
-            if extra_args:
-                cmd.extend(extra_args)
-
-            try:
-                result = subprocess.run(
-                    cmd,
-                    check=True,
-                    capture_output=True,
-                    text=True,
-                    encoding="utf-8",
-                    errors="ignore"
+        with span("prompt", prompt=prompt.id, run_id=run_id):
+            start_time = time.perf_counter()
+            tokens_generated: Optional[int] = None
+            notes = ""
+
+            prompt_backend, prompt_model, prompt_n_predict = backend, model_path, n_predict
+            prompt_args, prompt_layers = extra_args, gpu_layers
+            prompt_budget = (
+                budget.merged(prompt.budget) if budget else Budget.from_dict(prompt.budget)
+            )
+            plan = None
+            if prompt_budget is not None:
+                with span("budget_plan"):
+                    plan = planner.plan(
+                        prompt_budget, estimate_tokens(prompt.text), n_predict, backend,
+                        model_path,
+                    )
+                prompt_backend, prompt_n_predict = plan.backend, plan.n_predict
+                prompt_model = plan.model_path.expanduser()
+                if prompt_backend != backend:
+                    # Offload nothing on the CPU, everything on the GPU.
+                    prompt_layers = 0 if prompt_backend == "cpu" else None
+                    prompt_args = extra_args + ["--gpu-layers", "0" if prompt_layers == 0 else "99"]
+                print(
+                    f"💰 {prompt.id}: budget {prompt_budget.label()} -> {prompt_backend}/"
+                    f"{prompt_model.name}, n_predict {prompt_n_predict}"
+                    + (" (fallback)" if plan.fallback else "")
                 )
-                output_text = result.stdout.strip()
-            except subprocess.CalledProcessError as exc:
-                output_text = exc.stdout or ""
-                notes = f"llama.cpp exited with {exc.returncode}"
-
-        latency_ms = (time.perf_counter() - start_time) * 1000.0
-        if output_text:
-            tokens_generated = len(output_text.split())
-
-        logger.log_latency(
-            backend=backend,
-            prompt_id=prompt.id,
-            prompt_template=prompt.template,
-            prompt_length=prompt.length_chars,
-            latency_ms=latency_ms,
-            tokens_generated=tokens_generated,
-            energy_joules=None,  # GPU will add energy later
-            notes=notes,
-            run_id=run_id,
-        )
+                if plan.caveats:
+                    print(f"⚠️ {prompt.id}: cost prediction {'; '.join(plan.caveats)}")
+            capture = captures.capture(prompt_backend) if captures is not None else None
+
+            if captures is None and prompt_backend == "cpu" and not dry_run:
+                try:
+                    logger.record_cpu_power(duration=5, notes=f"prompt={prompt.id}")
+                except Exception as e:
+                    print(f"⚠️ CPU power logging failed: {e}")
+            elif captures is None and prompt_backend == "gpu" and not dry_run:
+                try:
+                    logger.record_gpu_power(duration=5, notes=f"prompt={prompt.id}")
+                except Exception as e:
+                    print(f"⚠️ GPU power logging failed: {e}")
+
+            phases: List[PhaseWindow] = []
+            window_start = time.monotonic_ns()
+            guard = None
+            if plan is not None:
+                guard = BudgetGuard(
+                    prompt_budget, capture.energy_since if capture is not None else None,
+                    plan.watts, scale=scale,
+                )
+            if dry_run:
+                with span("simulate", INFERENCE):
+                    simulated = _simulate(
+                        simulator, prompt.text, prompt_n_predict, prompt_backend, threads,
+                        prompt_layers, guard,
+                    )
+                output_text = simulated.text
+                notes = SIMULATED_NOTE
+                tokens = {"prefill": simulated.prompt_tokens, "decode": simulated.tokens}
+                phases = [
+                    PhaseWindow(p.name, p.start_ns, p.end_ns, tokens.get(p.name))
+                    for p in simulated.phases
+                ]
+                if captures is None:
+                    logger.log_simulated_power(
+                        prompt_backend, simulated.power_samples(), notes=f"prompt={prompt.id}",
+                        scale=scale,
+                    )
+            else:
+                # The simulator's CLI (llama_sim.py) can stand in for llama-cli.
+                launcher = [sys.executable] if llama_binary.suffix == ".py" else []
+                cmd = [
+                    *launcher,
+                    str(llama_binary),
+                    "--model",
+                    str(prompt_model),
+                    "--prompt",
+                    prompt.text,
+                    "--n-predict",
+                    str(prompt_n_predict),
+                    "--batch-size",
+                    str(batch_size),
+                    "--temp",
+                    str(temperature),
+                ]
+                if prompt_args:
+                    cmd.extend(prompt_args)
+                perf_output: Optional[Path] = None
+                if use_perf:
+                    perf_output = Path(tempfile.gettempdir()) / f"perf_{run_id}_{prompt.id}.csv"
+                    cmd = perf.wrap(cmd, perf_output)
+                cmd = pin + cmd
+
+                launched = time.monotonic_ns()
+                try:
+                    with span("llama.cpp", INFERENCE):
+                        if guard is None:
+                            result = subprocess.run(
+                                cmd,
+                                check=True,
+                                capture_output=True,
+                                text=True,
+                                encoding="utf-8",
+                                errors="ignore",
+                                preexec_fn=preexec_fn,
+                            )
+                        else:
+                            result = _run_within_budget(cmd, guard, prompt.text, preexec_fn)
+                    output_text = result.stdout.strip()
+                    phases = llama_phase_windows(
+                        parse_llama_timings(result.stderr or ""), launched, time.monotonic_ns()
+                    )
+                except subprocess.CalledProcessError as exc:
+                    output_text = exc.stdout or ""
+                    notes = f"llama.cpp exited with {exc.returncode}"
+
+                if perf_output is not None:
+                    with span("perf_read"):
+                        counters = perf.read(perf_output)
+                    if counters is not None:
+                        logger.log_perf_counters(run_id, prompt.id, counters.as_record())
+
+            latency_ms = (time.perf_counter() - start_time) * 1000.0 * scale
+            measured = None
+            if capture is not None:
+                measured = captures.measure_prompt(
+                    capture, run_id, prompt.id, window_start, time.monotonic_ns(), phases
+                )
+            if output_text:
+                tokens_generated = len(output_text.split())
+
+            if measured is not None:
+                energy = measured.energy_joules
+            else:
+                energy = simulated.energy_joules * scale if dry_run else None
+
+            if plan is not None:
+                used_joules = energy if energy is not None else guard.spent_joules
+                outcome = guard.outcome(used_joules, latency_ms)
+                planner.observe(
+                    plan, estimate_tokens(prompt.text), tokens_generated or 0, latency_ms,
+                    used_joules,
+                )
+                logger.log_budget_usage(
+                    run_id, prompt.id, prompt_budget, plan, n_predict, tokens_generated,
+                    used_joules, latency_ms, outcome,
+                )
+                spent = f"{used_joules:.1f} J, " if used_joules is not None else ""
+                print(f"💰 {prompt.id}: used {spent}{latency_ms:.0f} ms ({outcome})")
+
+            prefill = next((p for p in phases if p.name == "prefill"), None)
+            decode = next((p for p in phases if p.name == "decode"), None)
+            record_request(
+                prompt_backend, run_id, prompt_model.name, latency_ms / 1000.0, tokens_generated,
+                energy,
+                ttft_s=(prefill.end_ns - window_start) / 1e9 * scale if prefill else None,
+                decode_s=(decode.end_ns - decode.start_ns) / 1e9 * scale if decode else None,
+            )
+
+            logger.log_latency(
+                backend=prompt_backend,
+                prompt_id=prompt.id,
+                prompt_template=prompt.template,
+                prompt_length=prompt.length_chars,
+                latency_ms=latency_ms,
+                tokens_generated=tokens_generated,
+                energy_joules=None,  # GPU will add energy later
+                notes=notes,
+                run_id=run_id,
+                model=prompt_model.name,
+            )
+
+
+def _simulate(
+    simulator: SimulatedLlama,
+    prompt: str,
+    n_predict: int,
+    backend: str,
+    threads: Optional[int],
+    gpu_layers: Optional[int],
+    guard: Optional[BudgetGuard] = None,
+) -> SimResult:
+    """Simulated completion, cut short once ``guard`` says the budget is spent."""
+    if guard is None:
+        return simulator.complete(prompt, n_predict, backend, threads, gpu_layers)
+    result = SimResult("", 0, 0, backend, 0.0)
+    words: List[str] = []
+    stream = simulator.stream(prompt, n_predict, backend, threads, gpu_layers, result)
+    for word in stream:
+        words.append(word)
+        if guard.check(len(words)):
+            stream.close()
+            decode_start = result.phases[-1].end_ns if result.phases else guard.start_ns
+            watts = simulator.profiles[backend].phase_watts("decode")
+            result.phases.append(Phase("decode", decode_start, time.monotonic_ns(), watts))
+            result.text = " ".join(words)
+            break
+    return result
+
+
+def _run_within_budget(
+    cmd: List[str],
+    guard: BudgetGuard,
+    prompt: str,
+    preexec_fn: Optional[Callable[[], None]] = None,
+) -> subprocess.CompletedProcess:
+    """Run llama.cpp, counting streamed tokens, and stop it once ``guard`` says so.
+
+    Raises ``CalledProcessError`` like ``subprocess.run(check=True)`` unless
+    the process was stopped by the guard.
+    """
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=preexec_fn
+    )
+    out: List[bytes] = []
+    err: List[bytes] = []
+
+    def pump(stream, chunks: List[bytes]) -> None:
+        for chunk in iter(lambda: os.read(stream.fileno(), 4096), b""):
+            chunks.append(chunk)
+
+    pumps = [
+        threading.Thread(target=pump, args=(proc.stdout, out), daemon=True),
+        threading.Thread(target=pump, args=(proc.stderr, err), daemon=True),
+    ]
+    for thread in pumps:
+        thread.start()
+    while proc.poll() is None:
+        # llama-cli echoes the prompt before generating.
+        text = b"".join(out).decode("utf-8", errors="ignore").lstrip()
+        if text.startswith(prompt):
+            text = text[len(prompt):]
+        if guard.check(len(text.split())):
+            proc.terminate()
+            break
+        time.sleep(BUDGET_CHECK_INTERVAL_S)
+    proc.wait()
+    for thread in pumps:
+        thread.join()
+    stdout = b"".join(out).decode("utf-8", errors="ignore")
+    stderr = b"".join(err).decode("utf-8", errors="ignore")
+    if proc.returncode and not guard.stopped:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def parse_llama_timings(text: str) -> Dict[str, Tuple[float, Optional[int]]]:
+    """``{phase: (milliseconds, tokens)}`` from llama.cpp's timing summary."""
+    timings: Dict[str, Tuple[float, Optional[int]]] = {}
+    for phase, pattern in TIMING_RES.items():
+        match = pattern.search(text)
+        if match:
+            tokens = int(match.group(2)) if match.lastindex == 2 else None
+            timings[phase] = (float(match.group(1)), tokens)
+    return timings
+
+
+def llama_phase_windows(
+    timings: Dict[str, Tuple[float, Optional[int]]], launched_ns: int, exited_ns: int
+) -> List[PhaseWindow]:
+    """Phase boundaries of one llama-cli run: model loaded, first token, last token.
+
+    llama.cpp reports durations only, so the phases are laid end to end from
+    the moment the process was launched and clipped to its exit.
+    """
+    if not all(phase in timings for phase in ("load", "prefill", "decode")):
+        return []
+    windows = []
+    start = launched_ns
+    for phase in ("load", "prefill", "decode"):
+        ms, tokens = timings[phase]
+        end = min(start + int(ms * 1e6), exited_ns)
+        windows.append(PhaseWindow(phase, start, end, tokens))
+        start = end
+    return windows
+
+
+def _placement_args(args: Iterable[str]) -> Tuple[Optional[int], Optional[int]]:
+    """``(threads, gpu_layers)`` from llama.cpp command-line arguments."""
+    threads: Optional[int] = None
+    gpu_layers: Optional[int] = None
+    args = list(args)
+    for flag, value in zip(args, args[1:]):
+        if flag in ("-t", "--threads"):
+            threads = int(value)
+        elif flag in ("-ngl", "--gpu-layers", "--n-gpu-layers"):
+            gpu_layers = int(value)
+    return threads, gpu_layers
 
 
 def configure_prompts(prompt_source: str, manual_path: Path, config_path: Path) -> List[Prompt]:
@@ -170,7 +476,9 @@ def configure_prompts(prompt_source: str, manual_path: Path, config_path: Path)
 
 __all__ = [
     "configure_prompts",
+    "llama_phase_windows",
     "load_manual_prompts",
+    "parse_llama_timings",
     "run_prompts",
     "select_prompts",
 ]
@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from interface import bridge
+from interface.binary_export import read_binary
+
+
+def _runs(n):
+    rng = np.random.default_rng(3)
+    return [
+        {
+            "run_id": f"{'cpu' if i % 2 else 'gpu'}-t{i // 3}",
+            "prompt_id": f"sd-{i:03d}" if i != 4 else "prompt-ü-4",
+            "backend": "cpu" if i % 2 else "gpu",
+            "latency_ms": 1000.0 + 123.456 * i,
+            "energy_joules": 0.0 if i == 5 else 40.0 + 1.5 * i,
+            "power_trace": rng.uniform(5.0, 120.0, 100).tolist(),
+        }
+        for i in range(n)
+    ]
+
+
+def _export(tmp_path: Path, monkeypatch, runs, page_size):
+    monkeypatch.setattr(bridge, "OUTPUT_FILE", tmp_path / "export.json")
+    monkeypatch.setattr(bridge, "BINARY_OUTPUT_FILE", tmp_path / "export.bin")
+    monkeypatch.setattr(bridge, "PAGED_OUTPUT_DIR", tmp_path / "pages")
+    bridge.write_export({"runs": runs}, "all", page_size)
+    return json.loads((tmp_path / "export.json").read_text())["runs"]
+
+
+def _assert_same(decoded, expected):
+    assert len(decoded) == len(expected)
+    for got, want in zip(decoded, expected):
+        for key in ("run_id", "prompt_id", "backend", "latency_ms", "energy_joules"):
+            assert got[key] == want[key]
+        # Traces are stored as float32.
+        np.testing.assert_allclose(got["power_trace"], want["power_trace"], rtol=1e-6)
+
+
+def test_binary_and_paged_exports_match_the_json_export(tmp_path: Path, monkeypatch):
+    from_json = _export(tmp_path, monkeypatch, _runs(7), page_size=3)
+
+    _assert_same(read_binary(tmp_path / "export.bin"), from_json)
+    _assert_same(read_binary(tmp_path / "pages"), from_json)
+    assert sorted(p.name for p in (tmp_path / "pages").glob("page_*.bin")) == [
+        "page_0000.bin", "page_0001.bin", "page_0002.bin",
+    ]
+
+
+def test_paged_export_drops_pages_past_the_end(tmp_path: Path, monkeypatch):
+    _export(tmp_path, monkeypatch, _runs(7), page_size=3)
+
+    from_json = _export(tmp_path, monkeypatch, _runs(4), page_size=3)
+
+    _assert_same(read_binary(tmp_path / "pages"), from_json)
+    assert not (tmp_path / "pages" / "page_0002.bin").exists()
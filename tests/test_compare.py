@@ -0,0 +1,105 @@
+import csv
+import json
+from pathlib import Path
+
+from analysis.compare import EXIT_NO_OVERLAP, EXIT_PASS, EXIT_REGRESSION, main
+
+FIELDS = ["timestamp", "run_id", "backend", "prompt_id", "prompt_template", "latency_ms",
+          "tokens_generated", "energy_joules", "notes"]
+
+
+def _row(minute, run_id, prompt, latency_ms, energy_joules):
+    return {
+        "timestamp": f"2025-12-08T01:{minute:02d}:00.000",
+        "run_id": run_id,
+        "backend": run_id.split("-")[0],
+        "prompt_id": f"sd-{prompt:03d}",
+        "prompt_template": "short_dialogue",
+        "latency_ms": latency_ms,
+        "tokens_generated": 32,
+        "energy_joules": energy_joules,
+        "notes": "",
+    }
+
+
+def _data_dir(tmp_path: Path, rows) -> Path:
+    with open(tmp_path / "latency_results.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return tmp_path
+
+
+def _compare(tmp_path: Path, *args):
+    out = tmp_path / "verdict.json"
+    code = main(["--data-dir", str(tmp_path), "--output", str(out), "--quiet",
+                 "--resamples", "500", *args])
+    report = json.loads(out.read_text()) if out.exists() else None
+    return code, report
+
+
+def _statuses(report):
+    return {(r["suite"], r["metric"]): r["status"] for r in report["results"]}
+
+
+def test_energy_regression_fails_the_gate(tmp_path: Path):
+    rows = []
+    for prompt in range(8):
+        rows.append(_row(prompt, "cpu-t1", prompt, 1000.0 + 10 * prompt, 50.0 + prompt))
+        # Same latency (within noise), 20% more energy.
+        rows.append(_row(30 + prompt, "cpu-t4", prompt, 1001.0 + 10 * prompt,
+                         (50.0 + prompt) * 1.2))
+    _data_dir(tmp_path, rows)
+
+    code, report = _compare(tmp_path, "--baseline", "cpu-t1", "--candidate", "cpu-t4",
+                            "--metric", "latency_ms", "--metric", "energy_joules")
+
+    assert code == EXIT_REGRESSION
+    assert report["aligned_on"] == ["prompt_template", "prompt_id"]
+    assert report["regressions"] == ["all/energy_joules"]
+    assert _statuses(report)[("all", "latency_ms")] == "ok"
+
+
+def test_configs_are_paired_with_themselves(tmp_path: Path):
+    rows = []
+    for prompt in range(6):
+        # gpu-a is cheap and gpu-b expensive; the candidate session drops gpu-b's
+        # rows for half the prompts, which would shift a config-blind average.
+        rows.append(_row(prompt, "gpu-a", prompt, 500.0, 10.0))
+        rows.append(_row(prompt, "gpu-b", prompt, 2000.0, 80.0))
+        rows.append(_row(30 + prompt, "gpu-a", prompt, 500.0, 10.0))
+        if prompt % 2:
+            rows.append(_row(30 + prompt, "gpu-b", prompt, 2000.0, 80.0))
+    _data_dir(tmp_path, rows)
+
+    code, report = _compare(tmp_path, "--baseline", "run_id=gpu-*,until=2025-12-08T01:30",
+                            "--candidate", "run_id=gpu-*,since=2025-12-08T01:30")
+
+    assert code == EXIT_PASS
+    assert report["aligned_on"] == ["prompt_template", "prompt_id", "run_id"]
+    assert report["prompts_compared"] == 9
+    assert not report["regressions"]
+
+
+def test_too_few_pairs_is_insufficient_not_a_regression(tmp_path: Path):
+    rows = []
+    for prompt in range(3):
+        rows.append(_row(prompt, "cpu-t1", prompt, 1000.0, 50.0))
+        rows.append(_row(30 + prompt, "cpu-t4", prompt, 3000.0, 150.0))
+    _data_dir(tmp_path, rows)
+
+    code, report = _compare(tmp_path, "--baseline", "cpu-t1", "--candidate", "cpu-t4")
+
+    assert code == EXIT_PASS
+    assert set(_statuses(report).values()) == {"insufficient_data"}
+
+
+def test_several_unshared_configs_per_side_are_not_pooled(tmp_path: Path):
+    rows = [_row(p, run_id, p, 1000.0, 50.0)
+            for run_id in ("cpu-t1", "cpu-t2", "gpu-a", "gpu-b") for p in range(6)]
+    _data_dir(tmp_path, rows)
+
+    code, report = _compare(tmp_path, "--baseline", "run_id=cpu-*", "--candidate", "run_id=gpu-*")
+
+    assert code == EXIT_NO_OVERLAP
+    assert report is None
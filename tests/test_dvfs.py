@@ -0,0 +1,145 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from dvfs import CpuFreq, FrequencySetting, GpuClocks, applied, recover
+
+
+def _sysfs(root: Path, cpus: int = 2) -> Path:
+    for cpu in range(cpus):
+        policy = root / f"cpu{cpu}" / "cpufreq"
+        policy.mkdir(parents=True)
+        for name, value in {
+            "scaling_governor": "performance",
+            "scaling_available_governors": "performance powersave",
+            "scaling_max_freq": "4000000",
+            "cpuinfo_min_freq": "800000",
+            "cpuinfo_max_freq": "4000000",
+        }.items():
+            (policy / name).write_text(value + "\n", encoding="utf-8")
+    return root
+
+
+def _read(root: Path, name: str) -> set:
+    return {p.read_text().strip() for p in root.glob(f"cpu*/cpufreq/{name}")}
+
+
+class FakeNvml:
+    """The pynvml calls GpuClocks makes, against one fake GPU."""
+
+    def __init__(self, limit_mw: int = 200_000, constraints=(100_000, 250_000)) -> None:
+        self.limit_mw = limit_mw
+        self.constraints = constraints
+        self.locked = None
+        self.resets = 0
+        self.shutdown = False
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        self.shutdown = True
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        return index
+
+    def nvmlDeviceGetPowerManagementLimit(self, handle):
+        return self.limit_mw
+
+    def nvmlDeviceGetPowerManagementLimitConstraints(self, handle):
+        return self.constraints
+
+    def nvmlDeviceSetPowerManagementLimit(self, handle, milliwatts):
+        self.limit_mw = milliwatts
+
+    def nvmlDeviceSetGpuLockedClocks(self, handle, low, high):
+        self.locked = (low, high)
+
+    def nvmlDeviceResetGpuLockedClocks(self, handle):
+        self.locked = None
+        self.resets += 1
+
+
+def test_cpu_settings_are_restored_when_the_run_fails(tmp_path: Path):
+    root = _sysfs(tmp_path / "cpu")
+    journal = tmp_path / ".dvfs_restore.json"
+    setting = FrequencySetting(cpu_governor="powersave", cpu_max_mhz=2000)
+
+    with pytest.raises(RuntimeError):
+        with applied(setting, "r1", cpu=CpuFreq(root), journal=journal) as state:
+            assert state == {"cpu_governor_actual": "powersave", "cpu_max_mhz_actual": 2000}
+            assert json.loads(journal.read_text())["run_id"] == "r1"
+            raise RuntimeError("prompt failed")
+
+    assert _read(root, "scaling_governor") == {"performance"}
+    assert _read(root, "scaling_max_freq") == {"4000000"}
+    assert not journal.exists()
+
+
+def test_cpu_max_frequency_is_clamped_to_cpuinfo_limits(tmp_path: Path):
+    root = _sysfs(tmp_path / "cpu")
+    cpu = CpuFreq(root)
+
+    cpu.apply(FrequencySetting(cpu_max_mhz=100))
+    assert _read(root, "scaling_max_freq") == {"800000"}
+
+    cpu.apply(FrequencySetting(cpu_max_mhz=9000))
+    assert _read(root, "scaling_max_freq") == {"4000000"}
+
+
+def test_unavailable_governor_is_rejected(tmp_path: Path):
+    root = _sysfs(tmp_path / "cpu")
+    journal = tmp_path / ".dvfs_restore.json"
+
+    with pytest.raises(ValueError, match="not available"):
+        with applied(FrequencySetting(cpu_governor="ondemand"), cpu=CpuFreq(root),
+                     journal=journal):
+            pass
+
+    assert _read(root, "scaling_governor") == {"performance"}
+    assert not journal.exists()
+
+
+def test_recover_restores_a_left_over_journal(tmp_path: Path):
+    root = _sysfs(tmp_path / "cpu")
+    journal = tmp_path / ".dvfs_restore.json"
+    cpu = CpuFreq(root)
+    nvml = FakeNvml()
+    gpu = GpuClocks(nvml)
+    journal.write_text(json.dumps({
+        "run_id": "crashed", "cpu": cpu.snapshot(), "cpu_root": str(root), "gpu": gpu.snapshot(),
+    }))
+    cpu.apply(FrequencySetting(cpu_governor="powersave", cpu_max_mhz=1200))
+    gpu.apply(FrequencySetting(gpu_power_limit_w=120, gpu_clocks_mhz=[1200, 1200]))
+
+    assert recover(journal, gpu=gpu)
+
+    assert _read(root, "scaling_governor") == {"performance"}
+    assert _read(root, "scaling_max_freq") == {"4000000"}
+    assert nvml.limit_mw == 200_000 and nvml.locked is None
+    assert not journal.exists()
+    assert not recover(journal)
+
+
+def test_gpu_power_limit_outside_the_allowed_range_is_rejected():
+    nvml = FakeNvml(constraints=(100_000, 250_000))
+
+    with pytest.raises(ValueError, match="outside 100-250 W"):
+        GpuClocks(nvml).apply(FrequencySetting(gpu_power_limit_w=300))
+
+    assert nvml.limit_mw == 200_000
+
+
+def test_gpu_limit_and_clock_lock_are_reset_after_the_run(tmp_path: Path):
+    nvml = FakeNvml()
+    setting = FrequencySetting.from_dict({"gpu_power_limit_w": 150, "gpu_clocks_mhz": 1400})
+
+    with applied(setting, "r2", gpu=GpuClocks(nvml), journal=tmp_path / "j.json") as state:
+        assert nvml.limit_mw == 150_000 and nvml.locked == (1400, 1400)
+        assert state == {"gpu_power_limit_w_actual": 150.0}
+
+    assert nvml.limit_mw == 200_000
+    assert nvml.locked is None and nvml.resets == 1
+    # A GpuClocks passed in is the caller's to close.
+    assert not nvml.shutdown
@@ -0,0 +1,101 @@
+from pathlib import Path
+
+from router import EnergyAwareRouter, Observation
+
+
+def _observations(backend, latency_per_token, joules_per_token):
+    return [
+        Observation(
+            backend=backend,
+            prompt_tokens=prompt,
+            output_tokens=output,
+            latency_ms=500.0 + 2.0 * prompt + latency_per_token * output,
+            energy_joules=20.0 + 0.1 * prompt + joules_per_token * output,
+        )
+        for prompt in (16, 64, 256)
+        for output in (32, 128, 256)
+    ]
+
+
+def _router(**per_backend):
+    router = EnergyAwareRouter()
+    for name, (latency_per_token, joules_per_token) in per_backend.items():
+        router.models[name].fit(_observations(name, latency_per_token, joules_per_token))
+    return router
+
+
+def test_unfitted_backend_is_not_chosen_over_a_fitted_one():
+    router = _router(gpu=(30.0, 0.5))
+
+    decision = router.route(64, 128)
+
+    assert decision.backend == "gpu"
+    assert decision.candidates["cpu"]["fitted"] is False
+    assert decision.candidates["cpu"]["energy_joules"] == 0.0
+
+
+def test_unfitted_backend_is_not_chosen_when_slo_is_missed():
+    router = _router(cpu=(60.0, 0.8))
+
+    decision = router.route(64, 128, slo_ms=1.0)
+
+    assert decision.backend == "cpu"
+    assert not decision.meets_slo
+
+
+def test_router_without_history_still_routes(tmp_path: Path):
+    router = EnergyAwareRouter.from_telemetry(
+        tmp_path / "latency_results.csv", tmp_path / "power_logs.csv"
+    )
+
+    decision = router.route(64, 128)
+
+    assert decision.backend in router.models
+    assert not any(c["fitted"] for c in decision.candidates.values())
+
+
+def test_route_reserves_only_on_request():
+    router = _router(cpu=(60.0, 0.8), gpu=(30.0, 0.5))
+
+    assert router.route(64, 128).reservation is None
+    assert router.in_flight == {"cpu": 0, "gpu": 0}
+
+    decision = router.route(64, 128, reserve=True)
+    assert router.in_flight[decision.backend] == 1
+    assert router.release(decision.reservation) == decision.backend
+    assert router.release(decision.reservation) is None
+    assert router.in_flight[decision.backend] == 0
+
+
+def test_feedback_ends_reservation():
+    router = _router(cpu=(60.0, 0.8), gpu=(30.0, 0.5))
+    decision = router.route(64, 128, reserve=True)
+
+    router.observe(
+        Observation(decision.backend, 64, 128, latency_ms=4000.0, energy_joules=80.0),
+        decision.reservation,
+    )
+
+    assert router.in_flight[decision.backend] == 0
+
+
+def test_unreleased_reservations_expire():
+    router = _router(cpu=(60.0, 0.8), gpu=(30.0, 0.5))
+    router.reservation_ttl_s = 0.0
+
+    router.route(64, 128, reserve=True)
+
+    assert sum(router.in_flight.values()) == 0
+
+
+def test_caveats_flag_extrapolation_and_clipped_slopes():
+    router = _router(cpu=(-5.0, -0.2), gpu=(30.0, 0.5))
+
+    inside = router.route(64, 128).candidates
+    outside = router.route(64, 512).candidates
+
+    assert inside["gpu"]["caveats"] == []
+    assert outside["gpu"]["caveats"] == ["output_tokens outside fitted range 32-256"]
+    assert router.models["cpu"].flat_in_output()
+    assert "latency ignores output_tokens (negative slope clipped)" in inside["cpu"]["caveats"]
+    assert router.models["cpu"].predict(64, 0) == router.models["cpu"].predict(64, 512)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from analysis.stats import MIN_SAMPLES, bootstrap_summary, holm, paired_comparisons
+
+
+def test_holm_adjusts_in_rank_order_and_keeps_nan():
+    adjusted = holm([0.01, 0.04, 0.03, np.nan, 0.005])
+
+    # Ranked 0.005*4, 0.01*3, 0.03*2, 0.04*1, made monotone.
+    np.testing.assert_allclose(adjusted, [0.03, 0.06, 0.06, np.nan, 0.02])
+    assert holm([0.6, 0.7]).tolist() == [1.0, 1.0]
+    assert np.isnan(holm([np.nan, np.nan])).all()
+
+
+def test_bootstrap_ci_brackets_the_mean_at_the_normal_width():
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({"backend": "gpu", "latency_ms": rng.normal(1000.0, 50.0, 400)})
+
+    row = bootstrap_summary(df, by=["backend"], n_resamples=4000, seed=1).iloc[0]
+
+    half_width = (row["latency_ms_ci_high"] - row["latency_ms_ci_low"]) / 2
+    expected = 1.96 * df["latency_ms"].std() / np.sqrt(len(df))
+    assert row["latency_ms_ci_low"] < row["latency_ms_mean"] < row["latency_ms_ci_high"]
+    assert abs(half_width / expected - 1) < 0.15
+    assert row["latency_ms_n"] == 400
+    assert not row["underpowered"]
+
+
+def test_small_or_noisy_groups_are_underpowered():
+    rng = np.random.default_rng(5)
+    df = pd.concat([
+        pd.DataFrame({"run_id": "few", "energy_joules": [50.0, 51.0, 49.0]}),
+        pd.DataFrame({"run_id": "noisy", "energy_joules": rng.uniform(1.0, 200.0, 12)}),
+        pd.DataFrame({"run_id": "steady", "energy_joules": rng.normal(50.0, 0.5, 30)}),
+    ])
+
+    summary = bootstrap_summary(df, by=["run_id"], seed=2).set_index("run_id")
+
+    assert summary.loc["few", "energy_joules_n"] < MIN_SAMPLES
+    assert summary["underpowered"].to_dict() == {"few": True, "noisy": True, "steady": False}
+
+
+def test_paired_comparisons_flag_few_pairs_and_adjust_p_values():
+    rng = np.random.default_rng(9)
+    rows = []
+    for prompt in range(12):
+        base = rng.uniform(800.0, 1200.0)
+        rows += [
+            {"run_id": "a", "prompt_template": "qa", "prompt_id": prompt, "latency_ms": base},
+            {"run_id": "b", "prompt_template": "qa", "prompt_id": prompt,
+             "latency_ms": base * 1.3 + rng.normal(0, 5)},
+        ]
+        if prompt < 3:
+            rows.append({"run_id": "c", "prompt_template": "qa", "prompt_id": prompt,
+                         "latency_ms": base})
+    df = pd.DataFrame(rows)
+
+    result = paired_comparisons(df, n_resamples=4000, seed=3).set_index(["config_a", "config_b"])
+
+    a_b = result.loc[("a", "b")]
+    assert a_b["n_pairs"] == 12 and a_b["significant"] and not a_b["underpowered"]
+    assert 0.25 < a_b["rel_diff"] < 0.35
+    assert result.loc[("a", "c"), "n_pairs"] == 3
+    assert result.loc[("a", "c"), "underpowered"]
+    assert (result["p_adjusted"] >= result["p_value"]).all()
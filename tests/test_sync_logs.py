@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from clock import Timeline
+from utils.sync_logs import synchronize
+
+START = np.datetime64("2025-12-08T01:00:00", "ns").astype(np.int64)
+MAX_GAP_NS = 500e6
+
+
+def _write_stream(path: Path, stamps_ns: np.ndarray, watts: np.ndarray) -> None:
+    pd.DataFrame({
+        "timestamp": pd.to_datetime(stamps_ns, unit="ns").strftime("%Y-%m-%dT%H:%M:%S.%f"),
+        "power_w": watts,
+    }).to_csv(path, index=False)
+
+
+def _trapezoid_joules(stamps_ns: np.ndarray, watts: np.ndarray) -> float:
+    dt = np.diff(stamps_ns)
+    usable = dt <= MAX_GAP_NS
+    return float(np.sum(((watts[1:] + watts[:-1]) / 2 * dt)[usable]) / 1e9)
+
+
+def _capture(rng, start_ns, seconds, interval_ms):
+    n = int(seconds * 1000 / interval_ms)
+    jitter = rng.uniform(-0.2, 0.2, n) * interval_ms * 1e6
+    stamps = start_ns + np.arange(n) * interval_ms * 1e6 + jitter
+    return np.sort(stamps).astype(np.int64), rng.uniform(5.0, 60.0, n)
+
+
+def test_binned_energy_matches_each_streams_trapezoid_total(tmp_path: Path):
+    rng = np.random.default_rng(7)
+    # cpu: two captures eight hours apart, split over two files; gpu: one capture.
+    cpu_a = _capture(rng, START, 30, 100)
+    cpu_b = _capture(rng, START + 8 * 3600 * 10**9, 20, 100)
+    gpu = _capture(rng, START + 5 * 10**9, 40, 73)
+    _write_stream(tmp_path / "cpu_1.csv", *cpu_a)
+    _write_stream(tmp_path / "cpu_2.csv", *cpu_b)
+    _write_stream(tmp_path / "gpu.csv", *gpu)
+    streams = {
+        "cpu": [tmp_path / "cpu_1.csv", tmp_path / "cpu_2.csv"],
+        "gpu": [tmp_path / "gpu.csv"],
+    }
+
+    merged = synchronize(
+        streams, tmp_path / "out.csv", frequency_ms=200, timeline=Timeline(),
+        max_gap_ms=MAX_GAP_NS / 1e6, chunk_rows=64,
+    )
+
+    # Timeline stamps are float64 nanoseconds (~256 ns resolution today), hence rtol.
+    cpu_stamps = np.concatenate([cpu_a[0], cpu_b[0]])
+    cpu_watts = np.concatenate([cpu_a[1], cpu_b[1]])
+    assert np.isclose(merged["cpu.power_w.energy_j"].sum(),
+                      _trapezoid_joules(cpu_stamps, cpu_watts), rtol=1e-6)
+    assert np.isclose(merged["gpu.power_w.energy_j"].sum(), _trapezoid_joules(*gpu), rtol=1e-6)
+    # Only covered bins are written: 45 s + 20 s of samples, not the 8 h between captures.
+    assert len(merged) <= (45 + 20) * 5 + 2
+    assert merged["timestamp"].is_monotonic_increasing